@@ -1,109 +1,44 @@
-from typing import List, Literal, Optional
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
-import os
-import httpx
+from typing import List, Optional
+from fastapi import FastAPI, Header, HTTPException
 
+from .models import ChatMessage, ChatRequest, ChatResponse, RagChunk
+from .retrieval import multi_retrieve, retrieval_deadline
+from .context import pack_context
+from .retrievers import DEADLINE_HEADER, close_retriever
+from .sessions import ChatSession, get_session_store, new_session_id
 
-# ----- Types -----
 
-Role = Literal["system", "user", "assistant"]
-
-
-class ChatMessage(BaseModel):
-    role: Role
-    content: str
-
-
-class ChatRequest(BaseModel):
-    student_id: str
-    course_id: str
-    messages: List[ChatMessage]
-    top_k: int = 6
-
-
-class RagChunk(BaseModel):
-    id: str
-    score: float
-    course_id: str
-    source: Optional[str] = None
-    chunk_index: Optional[int] = None
-    title: Optional[str] = None
-    content: str
-    metadata: Optional[dict] = None
-
-
-class ChatResponse(BaseModel):
-    answer: str
-    chunks: List[RagChunk]
-
-
-# ----- Config -----
-
-# Base URL of the search-service in local dev.
-# For now we assume search-service runs on http://localhost:8000
-SEARCH_SERVICE_URL = os.getenv("SEARCH_SERVICE_URL", "http://localhost:8000")
+# ----- App -----
 
 app = FastAPI(title="CourseLLM RAG Tutor Service")
 
 
-# ----- Helpers -----
-
-async def retrieve_chunks(course_id: str, query: str, top_k: int) -> List[RagChunk]:
-    """
-    Call the search-service RAG endpoint:
-      POST /v1/courses/{course_id}/documents:ragSearch
+@app.on_event("shutdown")
+async def shutdown():
+    await close_retriever()
 
-    and convert the response into RagChunk objects.
-    """
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.post(
-            f"{SEARCH_SERVICE_URL}/v1/courses/{course_id}/documents:ragSearch",
-            json={
-                "query": query,
-                "page_size": top_k,
-                "mode": "rag",
-            },
-        )
-
-    if resp.status_code != 200:
-        raise HTTPException(
-            status_code=502,
-            detail=f"search-service error {resp.status_code}: {resp.text}",
-        )
-
-    data = resp.json()
-    chunks: List[RagChunk] = []
-
-    for item in data.get("results", []):
-        chunks.append(
-            RagChunk(
-                id=item["id"],
-                score=item["score"],
-                course_id=item["course_id"],
-                source=item.get("source"),
-                chunk_index=item.get("chunk_index"),
-                title=item.get("title"),
-                content=item["content"],
-                metadata=item.get("metadata"),
-            )
-        )
-
-    return chunks
 
+# ----- Helpers -----
 
 async def call_llm_with_rag(question: str, chunks: List[RagChunk], history: List[ChatMessage]) -> str:
     """
     TEMP STUB: Build a simple text answer using retrieved chunks.
     Later: replace this with a real LLM call (DSPy/Genkit/OpenAI/etc).
+
+    The chunks are packed into token-budgeted passages first (see
+    app/context.py), so the prompt never grows with top_k alone.
     """
     # Keep last few user/assistant messages for context
     history_text = "\n".join(f"{m.role.upper()}: {m.content}" for m in history[-6:])
 
-    # Short preview of the retrieved content
+    # Merge neighbours, drop duplicates and fit the token budget
+    passages = pack_context(chunks)
+    context_tokens = sum(p.tokens for p in passages)
+
+    # Short preview of the packed content
     context_preview = "\n\n".join(
-        f"[chunk {i+1}, score={c.score:.3f}] {c.content[:200]}"
-        for i, c in enumerate(chunks)
+        f"[passage {i+1}, source={p.source}, chunks={len(p.chunk_ids)}, score={p.score:.3f}] {p.content[:200]}"
+        for i, p in enumerate(passages)
     )
 
     # Very dumb answer — but enough to exercise the pipeline
@@ -111,7 +46,7 @@ async def call_llm_with_rag(question: str, chunks: List[RagChunk], history: List
         "RAG STUB ANSWER\n\n"
         f"Question: {question}\n\n"
         f"History (last turns):\n{history_text}\n\n"
-        f"Using {len(chunks)} retrieved chunks.\n"
+        f"Using {len(chunks)} retrieved chunks in {len(passages)} passages (~{context_tokens} tokens).\n"
         f"Context preview:\n{context_preview}"
     )
 
@@ -119,14 +54,27 @@ async def call_llm_with_rag(question: str, chunks: List[RagChunk], history: List
 # ----- API -----
 
 @app.post("/v1/courses/{course_id}/rag:chat", response_model=ChatResponse)
-async def rag_chat(course_id: str, req: ChatRequest):
+async def rag_chat(
+    course_id: str,
+    req: ChatRequest,
+    deadline_ms: Optional[float] = Header(default=None, alias=DEADLINE_HEADER),
+):
     """
     Main RAG chat endpoint.
 
-    1. Take the last user message as the query.
-    2. Retrieve chunks from search-service.
+    1. Derive retrieval queries from the recent conversation.
+    2. Retrieve chunks from search-service concurrently and fuse them.
     3. Call the (stub) LLM with the retrieved context.
     4. Return the answer + the chunks (for UI 'sources').
+
+    Turns without `session_id` start a server-side session with their
+    messages; the response carries its id. Turns with it send only their
+    new messages, which are appended to the stored conversation, and reuse
+    the session's cached retrievals. Unknown or expired sessions get a 404,
+    after which the client resends the whole conversation without an id.
+
+    Retrieval runs under one deadline (the caller's X-Request-Deadline-Ms,
+    capped by RAG_RETRIEVAL_TIMEOUT_MS) that is propagated to search-service.
     """
     # Sanity checks
     if course_id != req.course_id:
@@ -136,13 +84,34 @@ async def rag_chat(course_id: str, req: ChatRequest):
     if not last_user:
         raise HTTPException(status_code=400, detail="At least one user message is required")
 
+    store = get_session_store()
+    if req.session_id is None:
+        session = ChatSession(session_id=new_session_id(), student_id=req.student_id, course_id=course_id)
+    else:
+        session = store.get(req.session_id)
+        # Sessions of other students or courses are reported as unknown too
+        if session is None or session.student_id != req.student_id or session.course_id != course_id:
+            raise HTTPException(status_code=404, detail="Unknown or expired chat session")
+
+    # The stored conversation only changes once the turn succeeded
+    messages = session.messages + req.messages
+
     # 1) Retrieve relevant chunks
-    chunks = await retrieve_chunks(course_id=course_id, query=last_user.content, top_k=req.top_k)
+    chunks = await multi_retrieve(
+        course_id=course_id,
+        messages=messages,
+        top_k=req.top_k,
+        deadline=retrieval_deadline(deadline_ms),
+        session=session,
+    )
 
     # 2) Call LLM (stub)
-    answer = await call_llm_with_rag(last_user.content, chunks, req.messages)
+    answer = await call_llm_with_rag(last_user.content, chunks, messages)
+
+    session.append(req.messages + [ChatMessage(role="assistant", content=answer)])
+    store.save(session)
 
-    return ChatResponse(answer=answer, chunks=chunks)
+    return ChatResponse(answer=answer, chunks=chunks, session_id=session.session_id)
 
 
 if __name__ == "__main__":
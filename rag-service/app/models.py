@@ -0,0 +1,38 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel
+
+
+Role = Literal["system", "user", "assistant"]
+
+
+class ChatMessage(BaseModel):
+    role: Role
+    content: str
+
+
+class ChatRequest(BaseModel):
+    student_id: str
+    course_id: str
+    # The whole conversation, or with session_id only this turn's new messages
+    messages: List[ChatMessage]
+    top_k: int = 6
+    # Server-side session from an earlier response (see app/sessions.py)
+    session_id: Optional[str] = None
+
+
+class RagChunk(BaseModel):
+    id: str
+    score: float
+    course_id: str
+    source: Optional[str] = None
+    chunk_index: Optional[int] = None
+    title: Optional[str] = None
+    content: str
+    metadata: Optional[dict] = None
+
+
+class ChatResponse(BaseModel):
+    answer: str
+    chunks: List[RagChunk]
+    # Send back with the next turn's new messages
+    session_id: Optional[str] = None
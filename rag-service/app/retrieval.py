@@ -0,0 +1,184 @@
+"""
+Retrieval helpers for the RAG service.
+
+Turns the recent conversation into a handful of retrieval queries, runs them
+concurrently through the configured retriever and fuses the hits into a
+single list.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .models import ChatMessage, RagChunk
+from .retrievers import get_retriever
+from .sessions import ChatSession
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on keywords kept for the keyword-extracted query
+MAX_KEYWORDS = int(os.getenv("RAG_MAX_QUERY_KEYWORDS", "12"))
+
+# Longest query search-service accepts (its MAX_QUERY_LENGTH)
+MAX_QUERY_CHARS = int(os.getenv("RAG_MAX_QUERY_CHARS", "16000"))
+
+# Time budget for all retrieval of one chat turn (milliseconds)
+RETRIEVAL_TIMEOUT_MS = float(os.getenv("RAG_RETRIEVAL_TIMEOUT_MS", "10000"))
+
+# User turns the keyword query is extracted from
+KEYWORD_TURNS = 3
+
+# Reciprocal rank fusion constant (standard value from the RRF paper)
+RRF_K = 60
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+
+# Small English stopword list for keyword extraction. search-service does
+# its own stopword removal, so this only needs to catch conversational filler.
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because
+been before being below between both but by can could did do does doing down
+during each else few for from further had has have having he her here hers
+him his how i if in into is it its itself just let me more most my no nor not
+now of off on once only or other our ours out over own please same she should
+so some such tell than that the their theirs them then there these they this
+those through to too under until up very was we were what when where which
+while who whom why will with would you your yours explain mean means okay ok
+thanks thank yes
+""".split())
+
+
+# ----- Query planning -----
+
+def extract_keywords(text: str, limit: int = MAX_KEYWORDS) -> List[str]:
+    """Return the most frequent non-stopword terms of `text`, first-seen order on ties."""
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    words = [w for w in words if len(w) > 2 and w not in _STOPWORDS]
+    counts = Counter(words)
+    first_seen = {w: i for i, w in reversed(list(enumerate(words)))}
+    ranked = sorted(counts, key=lambda w: (-counts[w], first_seen[w]))
+    return ranked[:limit]
+
+
+def build_retrieval_queries(messages: List[ChatMessage]) -> List[str]:
+    """
+    Derive retrieval queries from the recent conversation:
+
+      1. the last user turn as-is,
+      2. the last user turn prefixed by the previous user turn, so short
+         follow-ups ("and why is that?") carry their subject along,
+      3. a keyword query extracted from the last few user turns (assistant
+         turns are left out: generated text would steer retrieval).
+
+    Queries longer than MAX_QUERY_CHARS keep their end, where the latest
+    turn is. Empty and duplicate queries are dropped; the last turn always
+    comes first.
+    """
+    user_turns = [m.content for m in messages if m.role == "user" and m.content.strip()]
+    if not user_turns:
+        return []
+
+    last = user_turns[-1]
+    queries = [last]
+
+    if len(user_turns) > 1:
+        queries.append(f"{user_turns[-2]} {last}")
+
+    keywords = extract_keywords(" ".join(user_turns[-KEYWORD_TURNS:]))
+    if keywords:
+        queries.append(" ".join(keywords))
+
+    unique: List[str] = []
+    for q in queries:
+        q = q[-MAX_QUERY_CHARS:]
+        if q not in unique:
+            unique.append(q)
+    return unique
+
+
+# ----- Fusion -----
+
+def fuse_results(result_lists: List[List[RagChunk]], top_k: int) -> List[RagChunk]:
+    """
+    Merge several ranked lists with reciprocal rank fusion, deduplicating by
+    chunk id. BM25 scores from different queries are not comparable, so
+    ordering uses ranks only; each chunk keeps its best raw score.
+    """
+    fused: Dict[str, float] = {}
+    best: Dict[str, RagChunk] = {}
+
+    for results in result_lists:
+        for rank, chunk in enumerate(results):
+            fused[chunk.id] = fused.get(chunk.id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            if chunk.id not in best or chunk.score > best[chunk.id].score:
+                best[chunk.id] = chunk
+
+    ordered = sorted(fused, key=lambda cid: fused[cid], reverse=True)
+    return [best[cid] for cid in ordered[:top_k]]
+
+
+def retrieval_deadline(budget_ms: Optional[float] = None) -> float:
+    """
+    Absolute monotonic deadline for one chat turn's retrieval: the caller's
+    remaining budget if it sent one, capped at RAG_RETRIEVAL_TIMEOUT_MS.
+    """
+    budget = RETRIEVAL_TIMEOUT_MS if budget_ms is None else min(budget_ms, RETRIEVAL_TIMEOUT_MS)
+    return time.monotonic() + max(budget, 0.0) / 1000.0
+
+
+async def multi_retrieve(
+    course_id: str,
+    messages: List[ChatMessage],
+    top_k: int,
+    deadline: Optional[float] = None,
+    session: Optional[ChatSession] = None,
+) -> List[RagChunk]:
+    """
+    Run every query from `build_retrieval_queries` concurrently and fuse
+    the results. Latency is that of the slowest single query rather than
+    the sum.
+
+    All queries share `deadline`. Queries that fail or time out are dropped
+    as long as at least one succeeds; otherwise the first error is raised.
+
+    With a `session`, queries retrieved earlier in the conversation reuse
+    their cached results and new results are cached for later turns.
+    """
+    queries = build_retrieval_queries(messages)
+    if not queries:
+        return []
+
+    if deadline is None:
+        deadline = retrieval_deadline()
+
+    results: Dict[str, List[RagChunk]] = {}
+    if session is not None:
+        for q in queries:
+            cached = session.cached_retrieval(q, top_k)
+            if cached is not None:
+                results[q] = cached
+    missing = [q for q in queries if q not in results]
+
+    retriever = get_retriever()
+    outcomes = await asyncio.gather(
+        *(retriever.retrieve(course_id, q, top_k, deadline=deadline) for q in missing),
+        return_exceptions=True,
+    )
+
+    for q, outcome in zip(missing, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.warning("Retrieval query dropped (%d chars): %r", len(q), outcome)
+        else:
+            results[q] = outcome
+            if session is not None:
+                session.cache_retrieval(q, top_k, outcome)
+
+    result_lists = [results[q] for q in queries if q in results]
+    if not result_lists:
+        raise outcomes[0]
+
+    return fuse_results(result_lists, top_k)
@@ -0,0 +1,384 @@
+"""
+Pluggable retrievers for the RAG service.
+
+- `HttpRetriever` calls search-service's ragSearch endpoint over HTTP.
+- `EmbeddedRetriever` loads search-service's on-disk `BM25Index` snapshots
+  into this process and searches them directly, with no network hop or
+  JSON round trip. Useful when both services run side by side.
+
+Select one with RAG_RETRIEVER=http|embedded. Embedded mode also needs
+search-service's requirements (bm25s, PyStemmer) installed here.
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import List, Optional, Tuple
+
+import httpx
+import msgpack
+from fastapi import HTTPException
+
+from .models import RagChunk
+
+
+# Base URL of the search-service in local dev.
+# For now we assume search-service runs on http://localhost:8000
+SEARCH_SERVICE_URL = os.getenv("SEARCH_SERVICE_URL", "http://localhost:8000")
+
+# Optional second search-service replica for hedged requests
+SEARCH_SERVICE_HEDGE_URL = os.getenv("SEARCH_SERVICE_HEDGE_URL", "")
+
+# Hedge after the observed p95 latency, but never sooner than this
+HEDGE_MIN_DELAY_MS = float(os.getenv("RAG_HEDGE_MIN_DELAY_MS", "20"))
+# Hedge delay used until enough latencies have been observed
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("RAG_HEDGE_DEFAULT_DELAY_MS", "100"))
+
+# Remaining time budget sent to search-service (milliseconds, relative)
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# ragSearch responses are requested as MessagePack. Compression only pays
+# off across a real network: e.g. "zstd, gzip" (zstd needs `zstandard`)
+MSGPACK = "application/msgpack"
+SEARCH_ACCEPT_ENCODING = os.getenv("SEARCH_ACCEPT_ENCODING", "identity")
+
+RAG_RETRIEVER = os.getenv("RAG_RETRIEVER", "http")
+
+# Embedded mode: search-service checkout and its SEARCH_SNAPSHOT_DIR
+SEARCH_SERVICE_PATH = os.getenv(
+    "SEARCH_SERVICE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "search-service"),
+)
+SEARCH_SNAPSHOT_DIR = os.getenv("SEARCH_SNAPSHOT_DIR", "")
+# Course indexes kept loaded in embedded mode (least recently used dropped first)
+EMBEDDED_MAX_COURSES = int(os.getenv("RAG_EMBEDDED_MAX_COURSES", "32"))
+
+
+class Retriever(ABC):
+    """
+    Interface: fetch the top_k chunks of a course for one query.
+
+    `deadline` is an absolute `time.monotonic()` value by which the call
+    must finish, or None for the retriever's own default.
+    """
+
+    @abstractmethod
+    async def retrieve(
+        self, course_id: str, query: str, top_k: int, deadline: Optional[float] = None
+    ) -> List[RagChunk]:
+        ...
+
+    async def aclose(self) -> None:
+        """Release any resources held by the retriever."""
+
+
+class LatencyTracker:
+    """Rolling window of request latencies for percentile estimates."""
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = 256):
+        self._samples: deque = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-quantile in seconds, or None while the window is too small."""
+        if len(self._samples) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SearchServiceError(HTTPException):
+    """search-service answered with an error status; reported to our caller as 502."""
+
+    def __init__(self, upstream_status: int, text: str):
+        super().__init__(status_code=502, detail=f"search-service error {upstream_status}: {text}")
+        self.upstream_status = upstream_status
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    True for failures another replica might not have: timeouts, connection
+    errors and 5xx answers. Client errors (4xx, e.g. 429) are not retried.
+    """
+    if isinstance(error, SearchServiceError):
+        return error.upstream_status >= 500
+    if isinstance(error, HTTPException):
+        return error.status_code == 504
+    return isinstance(error, httpx.TransportError)
+
+
+class HttpRetriever(Retriever):
+    """
+    Retrieves through search-service's HTTP API over one shared connection pool.
+
+    The caller's remaining time budget is forwarded in X-Request-Deadline-Ms
+    and used as the request timeout. Responses are requested as MessagePack
+    (JSON is still understood). With a `hedge_url`, a duplicate request
+    goes to the second replica once the primary has been outstanding for
+    longer than the observed p95 latency, or as soon as it fails in a way
+    `is_retryable` accepts; whichever answers first wins. Client errors are
+    raised right away, without a hedge.
+    """
+
+    def __init__(
+        self,
+        base_url: str = SEARCH_SERVICE_URL,
+        hedge_url: str = SEARCH_SERVICE_HEDGE_URL,
+        timeout: float = 10.0,
+    ):
+        self.base_url = base_url
+        self.hedge_url = hedge_url or None
+        self.timeout = timeout
+        self.latency = LatencyTracker()
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    def _hedge_delay(self) -> float:
+        p95 = self.latency.percentile(0.95)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY_MS / 1000.0
+        return max(p95, HEDGE_MIN_DELAY_MS / 1000.0)
+
+    async def retrieve(
+        self, course_id: str, query: str, top_k: int, deadline: Optional[float] = None
+    ) -> List[RagChunk]:
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+
+        if self.hedge_url is None:
+            return await self._request(self.base_url, course_id, query, top_k, deadline)
+
+        primary = asyncio.create_task(self._request(self.base_url, course_id, query, top_k, deadline))
+        delay = min(self._hedge_delay(), max(0.0, deadline - time.monotonic()))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if primary in done:
+            if primary.exception() is None:
+                return primary.result()
+            if not is_retryable(primary.exception()):
+                raise primary.exception()
+        if time.monotonic() >= deadline:
+            primary.cancel()
+            raise HTTPException(status_code=504, detail="search-service deadline exceeded")
+
+        # Primary is slow (or failed retryably): race a duplicate on the replica
+        self.hedges_sent += 1
+        hedge = asyncio.create_task(self._request(self.hedge_url, course_id, query, top_k, deadline))
+        pending = {hedge} if primary in done else {primary, hedge}
+        error: Optional[BaseException] = primary.exception() if primary in done else None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+                    if not is_retryable(error):
+                        raise error
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def _request(
+        self, base_url: str, course_id: str, query: str, top_k: int, deadline: float
+    ) -> List[RagChunk]:
+        """
+        Call the search-service RAG endpoint:
+          POST /v1/courses/{course_id}/documents:ragSearch
+
+        and convert the response into RagChunk objects.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise HTTPException(status_code=504, detail="search-service deadline exceeded")
+
+        started = time.monotonic()
+        try:
+            resp = await self.client.post(
+                f"{base_url}/v1/courses/{course_id}/documents:ragSearch",
+                json={
+                    "query": query,
+                    "page_size": top_k,
+                    "mode": "lexical",
+                },
+                headers={
+                    DEADLINE_HEADER: str(int(remaining * 1000)),
+                    "Accept": MSGPACK,
+                    "Accept-Encoding": SEARCH_ACCEPT_ENCODING,
+                },
+                timeout=remaining,
+            )
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="search-service deadline exceeded")
+
+        if resp.status_code != 200:
+            raise SearchServiceError(resp.status_code, resp.text)
+        self.latency.record(time.monotonic() - started)
+
+        if resp.headers.get("content-type", "").startswith(MSGPACK):
+            data = msgpack.unpackb(resp.content)
+        else:
+            data = resp.json()
+        chunks: List[RagChunk] = []
+
+        for item in data.get("results", []):
+            chunks.append(
+                RagChunk(
+                    id=item["id"],
+                    score=item["score"],
+                    course_id=item["course_id"],
+                    source=item.get("source"),
+                    chunk_index=item.get("chunk_index"),
+                    title=item.get("title"),
+                    content=item["content"],
+                    metadata=item.get("metadata"),
+                )
+            )
+
+        return chunks
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _load_search_index_module(service_path: str):
+    """
+    Import search-service's `app.index` under a private package name.
+
+    Both services name their package `app`, so it cannot simply go on
+    sys.path next to ours.
+    """
+    name = "search_service_app"
+    if f"{name}.index" in sys.modules:
+        return sys.modules[f"{name}.index"]
+
+    pkg_dir = os.path.join(service_path, "app")
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(pkg_dir, "__init__.py"), submodule_search_locations=[pkg_dir]
+    )
+    if spec is None or spec.loader is None:
+        raise RuntimeError(f"search-service package not found under {service_path}")
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[name] = package
+    spec.loader.exec_module(package)
+    return importlib.import_module(f"{name}.index")
+
+
+class EmbeddedRetriever(Retriever):
+    """
+    Searches search-service snapshots in-process.
+
+    Snapshots are loaded on first use per course and reloaded when
+    search-service rewrites them (detected by directory inode and mtime).
+    At most `max_courses` indexes stay loaded; the least recently used one
+    is dropped (and reloaded from its snapshot on its next query).
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: str = SEARCH_SNAPSHOT_DIR,
+        service_path: str = SEARCH_SERVICE_PATH,
+        max_courses: int = EMBEDDED_MAX_COURSES,
+    ):
+        if not snapshot_dir:
+            raise RuntimeError("SEARCH_SNAPSHOT_DIR must be set for RAG_RETRIEVER=embedded")
+        self.snapshot_dir = snapshot_dir
+        self.max_courses = max_courses
+        self._index_module = _load_search_index_module(service_path)
+        self._lock = Lock()
+        # course_id -> (snapshot version, BM25Index), least recently used first
+        self._indices: "OrderedDict[str, Tuple[Tuple[int, int], object]]" = OrderedDict()
+
+    def _get_index(self, course_id: str):
+        path = self._index_module.snapshot_path(self.snapshot_dir, course_id)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        version = (st.st_ino, st.st_mtime_ns)
+
+        with self._lock:
+            cached = self._indices.get(course_id)
+            if cached is not None and cached[0] == version:
+                self._indices.move_to_end(course_id)
+                return cached[1]
+
+        index = self._index_module.BM25Index.load_snapshot(path)
+        with self._lock:
+            self._indices[course_id] = (version, index)
+            self._indices.move_to_end(course_id)
+            while len(self._indices) > self.max_courses:
+                self._indices.popitem(last=False)
+        return index
+
+    def _search(self, course_id: str, query: str, top_k: int, deadline: Optional[float]) -> List[RagChunk]:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise HTTPException(status_code=504, detail="retrieval deadline exceeded")
+        index = self._get_index(course_id)
+        if index is None:
+            return []
+
+        # Documents were validated when search-service stored them
+        return [
+            RagChunk.model_construct(
+                id=doc.id,
+                score=score,
+                course_id=doc.course_id,
+                source=doc.source,
+                chunk_index=doc.chunk_index,
+                title=doc.title,
+                content=doc.content,
+                metadata=doc.metadata,
+            )
+            for doc, score in index.search(query, k=top_k)
+        ]
+
+    async def retrieve(
+        self, course_id: str, query: str, top_k: int, deadline: Optional[float] = None
+    ) -> List[RagChunk]:
+        # BM25 scoring is CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(self._search, course_id, query, top_k, deadline)
+
+
+_retriever: Optional[Retriever] = None
+
+
+def get_retriever() -> Retriever:
+    """Return the process-wide retriever selected by RAG_RETRIEVER."""
+    global _retriever
+    if _retriever is None:
+        if RAG_RETRIEVER == "embedded":
+            _retriever = EmbeddedRetriever()
+        elif RAG_RETRIEVER == "http":
+            _retriever = HttpRetriever()
+        else:
+            raise RuntimeError(f"Unknown RAG_RETRIEVER {RAG_RETRIEVER!r} (expected 'http' or 'embedded')")
+    return _retriever
+
+
+async def close_retriever() -> None:
+    global _retriever
+    if _retriever is not None:
+        await _retriever.aclose()
+        _retriever = None
@@ -0,0 +1,187 @@
+"""
+Server-side chat sessions for the RAG service.
+
+Without a session, clients resend the whole conversation on every turn, so
+request size and parsing cost grow with its length. A session keeps the
+conversation server side, keyed by session id: a turn without `session_id`
+starts one and the response carries its id; later turns send that id with
+only their new messages. Each session also caches the chunks retrieved per
+query, so follow-up turns that repeat a retrieval query (e.g. the keyword
+query of an ongoing topic) skip the search-service round trip.
+
+Sessions live in a `SessionStore`, selected with RAG_SESSION_BACKEND. The
+built-in "memory" store keeps at most RAG_SESSION_MAX_SESSIONS sessions
+(least recently used evicted first) and drops sessions idle for longer than
+RAG_SESSION_TTL_SECONDS, which also bounds how stale cached retrievals get.
+Each session keeps at most RAG_SESSION_MAX_MESSAGES turns and
+RAG_SESSION_MAX_CHARS characters of them, dropping the oldest turns first,
+so a few long conversations cannot take up unbounded memory.
+It is per process: with several replicas, route a session to one replica or
+plug in a shared store implementing the same interface.
+"""
+
+import os
+import secrets
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .models import ChatMessage, RagChunk
+
+
+RAG_SESSION_BACKEND = os.getenv("RAG_SESSION_BACKEND", "memory")
+MAX_SESSIONS = int(os.getenv("RAG_SESSION_MAX_SESSIONS", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("RAG_SESSION_TTL_SECONDS", "1800"))
+
+# Non-system messages kept per session (system messages are always kept)
+MAX_SESSION_MESSAGES = int(os.getenv("RAG_SESSION_MAX_MESSAGES", "50"))
+# Characters of message content kept per session (the latest message always is)
+MAX_SESSION_CHARS = int(os.getenv("RAG_SESSION_MAX_CHARS", "100000"))
+# Retrieval queries whose results are cached per session
+MAX_CACHED_RETRIEVALS = int(os.getenv("RAG_SESSION_MAX_CACHED_RETRIEVALS", "32"))
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+@dataclass
+class ChatSession:
+    """Conversation so far and cached retrievals of one student's chat in one course."""
+    session_id: str
+    student_id: str
+    course_id: str
+    messages: List[ChatMessage] = field(default_factory=list)
+    # (query, top_k) -> retrieved chunks, least recently used first
+    retrievals: "OrderedDict[tuple[str, int], List[RagChunk]]" = field(default_factory=OrderedDict)
+
+    def append(
+        self,
+        messages: List[ChatMessage],
+        max_messages: int = MAX_SESSION_MESSAGES,
+        max_chars: int = MAX_SESSION_CHARS,
+    ):
+        """
+        Add messages, keeping the system messages and the last `max_messages`
+        others, fewer if they hold more than `max_chars` characters in total
+        (system messages included). The oldest are dropped first.
+        """
+        self.messages.extend(messages)
+        turns = [m for m in self.messages if m.role != "system"][-max_messages:]
+        budget = max_chars - sum(len(m.content) for m in self.messages if m.role == "system")
+        kept = 0
+        for i in range(len(turns) - 1, -1, -1):
+            budget -= len(turns[i].content)
+            if budget < 0 and kept:
+                turns = turns[i + 1:]
+                break
+            kept += 1
+        keep = {id(m) for m in turns}
+        self.messages = [m for m in self.messages if m.role == "system" or id(m) in keep]
+
+    def cached_retrieval(self, query: str, top_k: int) -> Optional[List[RagChunk]]:
+        chunks = self.retrievals.get((query, top_k))
+        if chunks is not None:
+            self.retrievals.move_to_end((query, top_k))
+        return chunks
+
+    def cache_retrieval(self, query: str, top_k: int, chunks: List[RagChunk]):
+        self.retrievals[(query, top_k)] = chunks
+        self.retrievals.move_to_end((query, top_k))
+        while len(self.retrievals) > MAX_CACHED_RETRIEVALS:
+            self.retrievals.popitem(last=False)
+
+
+class SessionStore(ABC):
+    """
+    Interface: chat sessions by id.
+
+    `get` returns None for unknown and expired sessions. Callers `save` a
+    session after changing it; stores that keep copies (e.g. a shared cache)
+    must not assume in-place changes are visible without it.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        ...
+
+    @abstractmethod
+    def save(self, session: ChatSession) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Bounded LRU of sessions in this process, expiring after `ttl_seconds` idle.
+
+    Only used from the event loop, so it takes no locks.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.evicted = 0
+        self.expired = 0
+        # session id -> (expiry, session); every access pushes the expiry
+        # back by the same TTL, so the order is both LRU and expiry order
+        self._sessions: "OrderedDict[str, tuple[float, ChatSession]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        now = time.monotonic()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, session = entry
+        if expires_at <= now:
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        self._touch(session, now)
+        return session
+
+    def save(self, session: ChatSession) -> None:
+        now = time.monotonic()
+        self._touch(session, now)
+        self._evict(now)
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def _touch(self, session: ChatSession, now: float):
+        self._sessions[session.session_id] = (now + self.ttl_seconds, session)
+        self._sessions.move_to_end(session.session_id)
+
+    def _evict(self, now: float):
+        """Drop expired sessions, then the least recently used beyond capacity."""
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at <= now:
+                self.expired += 1
+            elif len(self._sessions) > self.max_sessions:
+                self.evicted += 1
+            else:
+                break
+            del self._sessions[session_id]
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store selected by RAG_SESSION_BACKEND."""
+    global _store
+    if _store is None:
+        if RAG_SESSION_BACKEND == "memory":
+            _store = InMemorySessionStore()
+        else:
+            raise RuntimeError(f"Unknown RAG_SESSION_BACKEND {RAG_SESSION_BACKEND!r} (expected 'memory')")
+    return _store
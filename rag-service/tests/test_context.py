@@ -0,0 +1,52 @@
+from app.context import dedupe_passages, estimate_tokens, merge_adjacent, pack_context
+from app.models import RagChunk
+
+
+def _chunk(chunk_id, content, source=None, index=None, score=1.0):
+    return RagChunk(id=chunk_id, score=score, course_id="cs101", source=source, chunk_index=index, content=content)
+
+
+def test_token_estimate_counts_words_punctuation_and_long_words():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a base case.") == 4
+    assert estimate_tokens("internationalization") == 1 + 20 // 8
+
+
+def test_adjacent_chunks_merge_without_their_overlap():
+    overlap = "the recursion reaches its base case "
+    passages = merge_adjacent([
+        _chunk("c2", overlap + "and returns.", "lec.pdf", 2, score=0.5),
+        _chunk("c1", "Each call pushes a frame until " + overlap, "lec.pdf", 1, score=1.0),
+        _chunk("c1-again", "duplicate", "lec.pdf", 1),
+        _chunk("c5", "unrelated later slide", "lec.pdf", 5),
+        _chunk("loose", "no position"),
+    ])
+
+    by_ids = {tuple(p.chunk_ids): p for p in passages}
+    assert set(by_ids) == {("loose",), ("c1", "c2"), ("c5",)}
+    merged = by_ids[("c1", "c2")]
+    assert merged.content == "Each call pushes a frame until " + overlap + "and returns."
+    assert (merged.first_index, merged.last_index, merged.score) == (1, 2, 1.5)
+
+
+def test_contained_passages_are_dropped():
+    passages = merge_adjacent([
+        _chunk("long", "Heaps keep the  smallest key at the root.", score=2.0),
+        _chunk("short", "heaps keep the smallest key", score=1.0),
+        _chunk("other", "Tries store strings by prefix.", score=0.5),
+    ])
+    assert [p.chunk_ids for p in dedupe_passages(passages)] == [["long"], ["other"]]
+
+
+def test_packing_fits_the_budget_by_score_density():
+    dense = _chunk("dense", "base case", score=1.0)  # 2 tokens
+    bulky = _chunk("bulky", " ".join(["word"] * 50), score=3.0)  # 50 tokens
+    small = _chunk("small", "stack frame grows", score=0.5)  # 3 tokens
+
+    packed = pack_context([dense, bulky, small], token_budget=10)
+    assert [p.chunk_ids for p in packed] == [["dense"], ["small"]]
+    assert sum(p.tokens for p in packed) <= 10
+
+    # Returned by score once packed
+    packed = pack_context([dense, bulky, small], token_budget=100)
+    assert [p.chunk_ids[0] for p in packed] == ["bulky", "dense", "small"]
@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import retrievers
+from app.retrievers import HttpRetriever, SearchServiceError
+
+HIT = {"results": [{"id": "c1", "score": 1.0, "course_id": "cs101", "content": "base case"}]}
+
+
+def _retrieve(monkeypatch, behaviour, calls):
+    """Run one hedged retrieval; `behaviour[host]` is (delay seconds, status), hosts called go to `calls`."""
+    monkeypatch.setattr(retrievers, "HEDGE_DEFAULT_DELAY_MS", 20)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        delay, status = behaviour[request.url.host]
+        await asyncio.sleep(delay)
+        return httpx.Response(status, json=HIT if status == 200 else {"detail": "nope"})
+
+    async def run():
+        retriever = HttpRetriever(base_url="http://primary", hedge_url="http://replica", timeout=5)
+        retriever._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return retriever, await retriever.retrieve("cs101", "recursion", 5)
+        finally:
+            await retriever.aclose()
+
+    return asyncio.run(run())
+
+
+def test_slow_primary_is_hedged_and_replica_wins(monkeypatch):
+    calls = []
+    retriever, chunks = _retrieve(monkeypatch, {"primary": (1.0, 200), "replica": (0.0, 200)}, calls)
+    assert calls == ["primary", "replica"]
+    assert [c.id for c in chunks] == ["c1"]
+    assert (retriever.hedges_sent, retriever.hedges_won) == (1, 1)
+
+
+def test_server_errors_are_hedged(monkeypatch):
+    calls = []
+    retriever, chunks = _retrieve(monkeypatch, {"primary": (0.0, 503), "replica": (0.0, 200)}, calls)
+    assert calls == ["primary", "replica"] and [c.id for c in chunks] == ["c1"]
+
+
+@pytest.mark.parametrize("status", [404, 429])
+def test_client_errors_are_raised_without_hedging(monkeypatch, status):
+    calls = []
+    with pytest.raises(SearchServiceError) as raised:
+        _retrieve(monkeypatch, {"primary": (0.0, status), "replica": (0.0, 200)}, calls)
+    assert raised.value.upstream_status == status and raised.value.status_code == 502
+    assert calls == ["primary"]
@@ -0,0 +1,68 @@
+import asyncio
+
+from app import retrieval
+from app.models import ChatMessage, RagChunk
+from app.retrieval import build_retrieval_queries, extract_keywords, fuse_results, multi_retrieve
+
+
+def _msg(role, content):
+    return ChatMessage(role=role, content=content)
+
+
+def _chunk(chunk_id, score=1.0):
+    return RagChunk(id=chunk_id, score=score, course_id="cs101", content=chunk_id)
+
+
+def test_keywords_drop_stopwords_and_rank_by_frequency():
+    assert extract_keywords("What is recursion? Recursion needs a base case, thanks") == [
+        "recursion", "needs", "base", "case"
+    ]
+    assert extract_keywords("the and of", limit=3) == []
+
+
+def test_queries_come_from_user_turns_only():
+    messages = [
+        _msg("system", "You are a tutor for data structures"),
+        _msg("user", "Explain binary heaps"),
+        _msg("assistant", "RAG STUB ANSWER history context preview"),
+        _msg("user", "and their insertion cost?"),
+    ]
+    queries = build_retrieval_queries(messages)
+
+    assert queries[0] == "and their insertion cost?"
+    assert queries[1] == "Explain binary heaps and their insertion cost?"
+    assert queries[2] == "binary heaps insertion cost"
+    assert build_retrieval_queries([_msg("assistant", "hello")]) == []
+    # Duplicates collapse: a single turn is its own keyword query
+    assert build_retrieval_queries([_msg("user", "recursion")]) == ["recursion"]
+
+
+def test_long_queries_keep_their_end(monkeypatch):
+    monkeypatch.setattr(retrieval, "MAX_QUERY_CHARS", 10)
+    assert build_retrieval_queries([_msg("user", "x" * 50 + " recursion")])[0] == " recursion"
+
+
+def test_rrf_ranks_chunks_found_by_several_queries_first():
+    fused = fuse_results(
+        [
+            [_chunk("a", 9.0), _chunk("b", 5.0)],
+            [_chunk("b", 7.0), _chunk("c", 1.0)],
+            [_chunk("c", 2.0), _chunk("b", 1.0)],
+        ],
+        top_k=2,
+    )
+    assert [c.id for c in fused] == ["b", "c"]
+    assert fused[0].score == 7.0  # best raw score kept
+
+
+def test_failed_queries_are_dropped_unless_all_fail(monkeypatch):
+    class Retriever:
+        async def retrieve(self, course_id, query, top_k, deadline=None):
+            if query.startswith("Explain"):
+                raise RuntimeError("search-service down")
+            return [_chunk(query)]
+
+    monkeypatch.setattr(retrieval, "get_retriever", lambda: Retriever())
+    messages = [_msg("user", "Explain heaps"), _msg("user", "insertion cost")]
+    chunks = asyncio.run(multi_retrieve("cs101", messages, top_k=5))
+    assert [c.id for c in chunks] == ["insertion cost", "heaps insertion cost"]
@@ -0,0 +1,84 @@
+import asyncio
+import importlib
+
+import httpx
+import pytest
+
+from app.retrievers import SEARCH_SERVICE_PATH, EmbeddedRetriever, HttpRetriever, Retriever, _load_search_index_module
+
+
+@pytest.fixture()
+def search_app():
+    """search-service's real FastAPI app, with auth overridden."""
+    _load_search_index_module(SEARCH_SERVICE_PATH)
+    main = importlib.import_module("search_service_app.main")
+    auth = importlib.import_module("search_service_app.auth")
+    roles = importlib.import_module("search_service_app.roles")
+
+    main.app.dependency_overrides[auth.get_current_user] = lambda: {"uid": "rag", "role": "student"}
+    main.app.dependency_overrides[roles.is_teacher] = lambda: {"uid": "rag", "role": "teacher"}
+    main.course_indices.clear()
+    main.store.clear()
+    main.search_admission.reset()
+    yield main.app
+    main.app.dependency_overrides.clear()
+
+
+def test_http_retriever_round_trips_through_search_service(search_app):
+    async def run():
+        transport = httpx.ASGITransport(app=search_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://search") as client:
+            r = await client.post(
+                "/v1/courses/cs101/documents:batchCreate",
+                json={"documents": [
+                    {"id": "c1", "course_id": "cs101", "source": "lec1.pdf", "chunk_index": 0,
+                     "content": "recursion needs a base case"},
+                    {"id": "c2", "course_id": "cs101", "content": "hash tables give constant time lookups"},
+                ]},
+            )
+            assert r.status_code == 200
+
+            retriever = HttpRetriever(base_url="http://search")
+            retriever._client = client
+            return await retriever.retrieve("cs101", "what is a base case in recursion", top_k=5)
+
+    chunks = asyncio.run(run())
+    assert chunks[0].id == "c1"
+    assert (chunks[0].source, chunks[0].chunk_index, chunks[0].content) == ("lec1.pdf", 0, "recursion needs a base case")
+
+
+def test_embedded_retriever_reloads_rewritten_snapshots(tmp_path):
+    index_module = _load_search_index_module(SEARCH_SERVICE_PATH)
+    models = importlib.import_module("search_service_app.models")
+    path = index_module.snapshot_path(str(tmp_path), "cs101")
+
+    def write(*contents):
+        index = index_module.BM25Index()
+        index.upsert_many([
+            models.DocumentChunk(id=f"d{i}", course_id="cs101", content=content) for i, content in enumerate(contents)
+        ])
+        index.save_snapshot(path)
+
+    retriever = EmbeddedRetriever(snapshot_dir=str(tmp_path), max_courses=1)
+    assert asyncio.run(retriever.retrieve("cs999", "anything", top_k=3)) == []
+
+    write("recursion needs a base case", "hash tables")
+    assert asyncio.run(retriever.retrieve("cs101", "recursion", top_k=1))[0].id == "d0"
+
+    write("hash tables", "tail recursion")
+    assert asyncio.run(retriever.retrieve("cs101", "recursion", top_k=1))[0].id == "d1"
+
+    # Only max_courses indexes stay loaded
+    other = index_module.BM25Index()
+    other.upsert(models.DocumentChunk(id="o1", course_id="cs102", content="graphs"))
+    other.save_snapshot(index_module.snapshot_path(str(tmp_path), "cs102"))
+    assert asyncio.run(retriever.retrieve("cs102", "graphs", top_k=1))[0].id == "o1"
+    assert list(retriever._indices) == ["cs102"]
+
+
+def test_retrievers_must_implement_retrieve():
+    class Incomplete(Retriever):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
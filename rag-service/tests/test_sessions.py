@@ -0,0 +1,153 @@
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import retrieval, sessions
+from app.main import app
+from app.models import ChatMessage, RagChunk
+from app.sessions import ChatSession, InMemorySessionStore, SessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(sessions, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _session(session_id, student_id="s1"):
+    return ChatSession(session_id=session_id, student_id=student_id, course_id="cs101")
+
+
+def _msg(role, content):
+    return ChatMessage(role=role, content=content)
+
+
+def test_idle_sessions_expire(clock):
+    store = InMemorySessionStore(max_sessions=10, ttl_seconds=60)
+    store.save(_session("a"))
+    store.save(_session("b"))
+
+    clock[0] = 50
+    assert store.get("a") is not None  # pushes a's expiry back to 110
+
+    clock[0] = 100
+    assert store.get("b") is None
+    store.save(_session("c"))
+    assert store.get("a") is not None
+    assert store.expired == 1
+
+    clock[0] = 200
+    store.save(_session("d"))
+    assert len(store) == 1
+    assert store.expired == 3
+
+
+def test_least_recently_used_sessions_are_evicted(clock):
+    store = InMemorySessionStore(max_sessions=2, ttl_seconds=60)
+    store.save(_session("a"))
+    store.save(_session("b"))
+    store.get("a")
+    store.save(_session("c"))
+
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert (store.evicted, store.expired) == (1, 0)
+
+
+def test_append_keeps_system_messages_and_the_latest_turns():
+    session = _session("a")
+    session.append([_msg("system", "tutor")] + [_msg("user", str(i)) for i in range(5)], max_messages=3)
+    assert [m.content for m in session.messages] == ["tutor", "2", "3", "4"]
+
+
+def test_append_drops_the_oldest_turns_beyond_the_size_budget():
+    session = _session("a")
+    session.append([_msg("system", "tutor")] + [_msg("user", c * 10) for c in "abcd"], max_chars=30)
+    assert [m.content for m in session.messages] == ["tutor", "c" * 10, "d" * 10]
+
+    # The latest message is kept even when it alone is over the budget
+    session.append([_msg("user", "e" * 50)], max_chars=30)
+    assert [m.content for m in session.messages] == ["tutor", "e" * 50]
+
+
+def test_session_stores_must_implement_the_whole_interface():
+    class GetOnly(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_cached_retrievals_are_bounded(monkeypatch):
+    monkeypatch.setattr(sessions, "MAX_CACHED_RETRIEVALS", 2)
+    session = _session("a")
+    session.cache_retrieval("heaps", 6, [])
+    session.cache_retrieval("tries", 6, [])
+    assert session.cached_retrieval("heaps", 6) == []
+    session.cache_retrieval("graphs", 6, [])
+
+    assert session.cached_retrieval("tries", 6) is None
+    assert session.cached_retrieval("heaps", 6) == []
+    assert session.cached_retrieval("heaps", 3) is None
+
+
+class CountingRetriever:
+    def __init__(self):
+        self.queries = []
+
+    async def retrieve(self, course_id, query, top_k, deadline=None):
+        self.queries.append(query)
+        return [RagChunk(id=query, score=1.0, course_id=course_id, content=query)]
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    retriever = CountingRetriever()
+    monkeypatch.setattr(retrieval, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(sessions, "_store", InMemorySessionStore())
+    return TestClient(app), retriever
+
+
+def _turn(client, content, session_id=None, student_id="s1"):
+    return client.post(
+        "/v1/courses/cs101/rag:chat",
+        json={
+            "student_id": student_id,
+            "course_id": "cs101",
+            "messages": [{"role": "user", "content": content}],
+            "session_id": session_id,
+        },
+    )
+
+
+def test_sessions_keep_the_conversation_and_cache_retrievals(chat):
+    client, retriever = chat
+    first = _turn(client, "recursion")
+    assert first.status_code == 200
+    session_id = first.json()["session_id"]
+    assert retriever.queries == ["recursion"]
+
+    second = _turn(client, "base case", session_id=session_id)
+    assert second.status_code == 200
+    assert second.json()["session_id"] == session_id
+    # "recursion base case" and its keywords are new; nothing repeats yet
+    assert retriever.queries[1:] == ["base case", "recursion base case"]
+
+    retriever.queries.clear()
+    _turn(client, "base case", session_id=session_id)
+    # The latest turn was retrieved before; only the new queries go out
+    assert retriever.queries == ["base case base case", "base case recursion"]
+
+    session = sessions._store.get(session_id)
+    assert [m.role for m in session.messages] == ["user", "assistant"] * 3
+
+
+def test_unknown_and_foreign_sessions_are_not_found(chat):
+    client, _ = chat
+    session_id = _turn(client, "recursion").json()["session_id"]
+
+    assert _turn(client, "recursion", session_id="missing").status_code == 404
+    assert _turn(client, "recursion", session_id=session_id, student_id="s2").status_code == 404
@@ -0,0 +1,186 @@
+"""
+Admission control for the search endpoints.
+
+Two layers protect search latency from misbehaving or bursty clients:
+
+1. Per-user token buckets: each uid may issue `rate` searches per second
+   with bursts up to `burst`. Excess requests get 429 + Retry-After.
+2. A global concurrency limit: at most `max_concurrent` searches run at
+   once. Others wait for a slot; if none frees up within `max_queue_ms`
+   the request is shed with 503 + Retry-After rather than piling up.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from .auth import get_current_user
+from .config import get_settings
+
+
+class TokenBucket:
+    """Classic token bucket; refilled lazily on each acquire."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Take one token. Returns (admitted, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Per-uid rate limits plus a global concurrency limit with bounded queueing.
+
+    A `rate` of 0 disables rate limiting, a `max_concurrent` of 0 disables
+    the concurrency limit. At most `max_users` buckets are kept (LRU).
+    """
+
+    def __init__(
+        self,
+        rate: float = 20.0,
+        burst: float = 40.0,
+        max_concurrent: int = 16,
+        max_queue_ms: float = 200.0,
+        max_users: int = 10000,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue_ms = max_queue_ms
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._lock = threading.Lock()
+        # Metrics
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.queued = 0  # requests that had to wait for a slot
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_queue_ms = 0.0
+        self.max_queue_wait_ms = 0.0
+
+    def check_rate(self, uid: str) -> None:
+        """
+        Raises:
+            HTTPException(429): If `uid` is over its rate limit.
+        """
+        if not self.rate:
+            return
+        with self._lock:
+            bucket = self._buckets.get(uid)
+            if bucket is None:
+                bucket = self._buckets[uid] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(uid)
+            admitted, retry_after = bucket.try_acquire()
+            if not admitted:
+                self.rate_limited += 1
+        if not admitted:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    def acquire_slot(self) -> None:
+        """
+        Wait up to `max_queue_ms` for a concurrency slot.
+
+        Raises:
+            HTTPException(503): If no slot frees up in time (load shedding).
+        """
+        if self._slots is None:
+            with self._lock:
+                self.in_flight += 1
+                self.admitted += 1
+            return
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.queued += 1
+                self.waiting += 1
+            start = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.max_queue_ms / 1000.0)
+            waited_ms = (time.monotonic() - start) * 1000.0
+            with self._lock:
+                self.waiting -= 1
+                self.total_queue_ms += waited_ms
+                self.max_queue_wait_ms = max(self.max_queue_wait_ms, waited_ms)
+                if not acquired:
+                    self.shed += 1
+            if not acquired:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Search service overloaded, retry later",
+                    headers={"Retry-After": "1"},
+                )
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release_slot(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def reset(self) -> None:
+        """Forget all rate-limit buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        """Admission metrics, for /health/json."""
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "rejected_rate_limited": self.rate_limited,
+                "rejected_overloaded": self.shed,
+                "queued": self.queued,
+                "waiting": self.waiting,
+                "in_flight": self.in_flight,
+                "average_queue_ms": round(self.total_queue_ms / self.queued, 2) if self.queued else 0.0,
+                "max_queue_ms": round(self.max_queue_wait_ms, 2),
+                "max_concurrent": self.max_concurrent,
+            }
+
+
+settings = get_settings()
+search_admission = AdmissionController(
+    rate=settings.SEARCH_RATE_PER_SEC,
+    burst=settings.SEARCH_RATE_BURST,
+    max_concurrent=settings.SEARCH_MAX_CONCURRENCY,
+    max_queue_ms=settings.SEARCH_MAX_QUEUE_MS,
+)
+
+
+def admit_search(current_user: dict = Depends(get_current_user)) -> Iterator[None]:
+    """
+    FastAPI dependency gating a search: rate limit by uid, then hold a
+    concurrency slot for the duration of the request.
+    """
+    search_admission.check_rate(current_user["uid"])
+    search_admission.acquire_slot()
+    try:
+        yield
+    finally:
+        search_admission.release_slot()
@@ -0,0 +1,122 @@
+"""
+Shared text analyzers for BM25 indexing.
+
+An analyzer turns text into term ids against a process-wide vocabulary.
+It reproduces `bm25s.tokenize(..., stopwords="en", stemmer=...)` exactly
+(same regex, lowercasing, stopword list and stemmer), but caches the stem
+of every word it has seen, so each distinct word is stemmed once per
+process instead of once per rebuild.
+
+All BM25Index instances share analyzers through `get_analyzer`, instead of
+each building its own stemmer and stopword state.
+"""
+
+import re
+from threading import Lock
+from typing import Dict, List
+
+import numpy as np
+
+# Same default pattern as bm25s.tokenize (scikit-learn CountVectorizer style)
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+class Analyzer:
+    """Tokenizer + stopwords + stemmer with a grow-only term vocabulary."""
+
+    def __init__(self, name: str, language: str, stopwords):
+        self.name = name
+        self.language = language
+        self._stemmer = None  # created on first use
+        self.stopwords = frozenset(stopwords)
+        self._split = re.compile(TOKEN_PATTERN).findall
+        self._lock = Lock()
+        self._stem_lock = Lock()
+        # term (stemmed) <-> term id
+        self.term_to_id: Dict[str, int] = {}
+        self.terms: List[str] = []
+        # word (lowercased, unstemmed) -> term id
+        self._word_cache: Dict[str, int] = {}
+        # term id -> shortest word seen for it, shown to users (suggestions)
+        self.surface: Dict[int, str] = {}
+        # Characters of the terms and cached words, kept as they are added
+        self._text_bytes = 0
+
+    def words(self, text: str) -> List[str]:
+        """Lowercased words of `text` that are not stopwords."""
+        return [w for w in self._split(text.lower()) if w not in self.stopwords]
+
+    def intern(self, term: str) -> int:
+        """Id of an (already stemmed) term, adding it to the vocabulary if new."""
+        term_id = self.term_to_id.get(term)
+        if term_id is None:
+            with self._lock:
+                term_id = self.term_to_id.get(term)
+                if term_id is None:
+                    term_id = len(self.terms)
+                    self.terms.append(term)
+                    self.term_to_id[term] = term_id
+                    self._text_bytes += len(term)
+        return term_id
+
+    def _stem(self, words: List[str]) -> List[str]:
+        # PyStemmer objects are not thread-safe
+        with self._stem_lock:
+            if self._stemmer is None:
+                import Stemmer
+
+                self._stemmer = Stemmer.Stemmer(self.language)
+            return self._stemmer.stemWords(words)
+
+    def encode(self, text: str) -> np.ndarray:
+        """Term ids of a document, in order, as a compact int32 array."""
+        words = self.words(text)
+        cache = self._word_cache
+        unseen = [w for w in dict.fromkeys(words) if w not in cache]
+        if unseen:
+            for word, stem in zip(unseen, self._stem(unseen)):
+                term_id = cache[word] = self.intern(stem)
+                self.note_surface(term_id, word)
+            self._text_bytes += sum(len(w) for w in unseen)
+        return np.fromiter((cache[w] for w in words), dtype=np.int32, count=len(words))
+
+    def note_surface(self, term_id: int, word: str):
+        """Remember `word` as the display form of a term if it is the shortest yet."""
+        current = self.surface.get(term_id)
+        if current is None or (len(word), word) < (len(current), current):
+            self.surface[term_id] = word
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the vocabulary: its terms and cached words."""
+        return self._text_bytes
+
+    def surface_form(self, term_id: int) -> str:
+        """Display form of a term: its shortest known word, else the stem itself."""
+        return self.surface.get(term_id) or self.terms[term_id]
+
+    def query_terms(self, text: str) -> List[str]:
+        """
+        Stemmed terms of a query, in the form bm25s.retrieve expects.
+        Unknown words are stemmed but not added to the vocabulary.
+        """
+        words = self.words(text)
+        cache = self._word_cache
+        unseen = [w for w in dict.fromkeys(words) if w not in cache]
+        stems = dict(zip(unseen, self._stem(unseen))) if unseen else {}
+        return [self.terms[cache[w]] if w in cache else stems[w] for w in words]
+
+
+_analyzers: Dict[str, Analyzer] = {}
+_registry_lock = Lock()
+
+
+def get_analyzer(name: str = "english") -> Analyzer:
+    """Return the shared analyzer registered under `name`."""
+    with _registry_lock:
+        if name not in _analyzers:
+            if name != "english":
+                raise KeyError(f"Unknown analyzer {name!r}")
+            from bm25s.stopwords import STOPWORDS_EN
+
+            _analyzers[name] = Analyzer(name, language="english", stopwords=STOPWORDS_EN)
+        return _analyzers[name]
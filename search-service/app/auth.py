@@ -1,12 +1,10 @@
-import firebase_admin
-from firebase_admin import credentials, auth
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from .config import get_settings
 
-# Get application settings
-settings = get_settings()
+# firebase_admin (with google-auth and requests) is imported on first use,
+# not at startup, to keep cold starts fast.
 
 # Define the security scheme for bearer tokens
 http_bearer = HTTPBearer()
@@ -16,6 +14,10 @@ def init_firebase():
     Initializes the Firebase Admin SDK idempotently, handling both production 
     and emulator environments based on settings.
     """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    settings = get_settings()
     try:
         # Check if the default app is already initialized
         firebase_admin.get_app()
@@ -47,6 +49,7 @@ async def get_current_user(
         HTTPException(500): For any other unexpected errors during token verification.
     """
     init_firebase()  # Ensure Firebase is initialized before proceeding
+    from firebase_admin import auth
 
     if not token:
         raise HTTPException(
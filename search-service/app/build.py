@@ -0,0 +1,182 @@
+"""
+Bulk analysis and BM25 index construction for BM25Index.
+
+Large corpora are sharded across a process pool:
+
+- `analyze_texts` tokenizes and stems shards of documents in worker
+  processes and merges their shard vocabularies into the shared analyzer.
+- `build_bm25` counts per-shard term statistics (doc, term, tf) in the
+  workers, merges them into global document frequencies and computes the
+  BM25 score matrix with vectorized numpy.
+
+Below `PARALLEL_MIN_DOCS` everything runs serially in-process. Either way
+the scores are the same as `bm25s.BM25().index(...)` (Lucene variant,
+default k1/b) produces for the same tokens.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .analysis import Analyzer, get_analyzer
+from .config import get_settings
+
+if TYPE_CHECKING:
+    import bm25s
+
+settings = get_settings()
+
+# bm25s defaults (method="lucene")
+K1 = 1.5
+B = 0.75
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+
+
+def num_workers() -> int:
+    return settings.INDEX_BUILD_WORKERS or os.cpu_count() or 1
+
+
+def use_parallel(num_docs: int) -> bool:
+    return num_workers() > 1 and num_docs >= settings.INDEX_PARALLEL_MIN_DOCS
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Lazily start the shared worker pool. "spawn" avoids forking a process
+    that already runs request and ingestion threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=num_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _shards(n: int, parts: int) -> List[Tuple[int, int]]:
+    step = -(-n // parts)
+    return [(i, min(i + step, n)) for i in range(0, n, step)]
+
+
+def _concat(seqs: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate term id sequences; returns (flat ids, offsets)."""
+    offsets = np.zeros(len(seqs) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in seqs], out=offsets[1:])
+    flat = np.concatenate(seqs) if seqs else np.zeros(0, dtype=np.int32)
+    return flat.astype(np.int32, copy=False), offsets
+
+
+# ----- Tokenization -----
+
+def _analyze_shard(analyzer_name: str, texts: List[str]):
+    """
+    Worker: encode texts with a process-local analyzer. Returns the shard's
+    terms with their display words, shard-local ids and per-text offsets.
+    """
+    analyzer = get_analyzer(analyzer_name)
+    flat, offsets = _concat([analyzer.encode(t) for t in texts])
+    term_ids, local = np.unique(flat, return_inverse=True)
+    terms = [(analyzer.terms[t], analyzer.surface_form(t)) for t in term_ids.tolist()]
+    return terms, local.astype(np.int32), offsets
+
+
+def analyze_texts(analyzer: Analyzer, texts: List[str]) -> List[np.ndarray]:
+    """Encode many texts to term ids of `analyzer`, in parallel for large inputs."""
+    if not use_parallel(len(texts)):
+        return [analyzer.encode(t) for t in texts]
+
+    pool = _get_pool()
+    futures = [
+        pool.submit(_analyze_shard, analyzer.name, texts[start:end])
+        for start, end in _shards(len(texts), num_workers())
+    ]
+
+    seqs: List[np.ndarray] = []
+    for future in futures:
+        terms, local, offsets = future.result()
+        to_global = np.array([analyzer.intern(term) for term, _ in terms], dtype=np.int32)
+        for term_id, (_, word) in zip(to_global.tolist(), terms):
+            analyzer.note_surface(term_id, word)
+        flat = to_global[local] if len(terms) else local
+        seqs.extend(flat[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+    return seqs
+
+
+# ----- Term statistics and scoring -----
+
+def term_stats(flat: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(doc index, term id, term frequency) for every distinct term of every doc."""
+    n_docs = len(offsets) - 1
+    if len(flat) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    width = int(flat.max()) + 1
+    docs = np.repeat(np.arange(n_docs, dtype=np.int64), np.diff(offsets))
+    keys, tf = np.unique(docs * width + flat, return_counts=True)
+    return keys // width, keys % width, tf
+
+
+def _term_stats_shard(flat: np.ndarray, offsets: np.ndarray):
+    return term_stats(flat, offsets)
+
+
+def build_bm25(seqs: List[np.ndarray], n_vocab: int, vocab: Dict[str, int]) -> "bm25s.BM25":
+    """
+    Build a bm25s model from term id sequences (ids < n_vocab, names in `vocab`).
+    """
+    import bm25s
+
+    flat, offsets = _concat(seqs)
+    doc_lens = np.diff(offsets)
+    n_docs = len(seqs)
+
+    if use_parallel(n_docs):
+        pool = _get_pool()
+        shards = _shards(n_docs, num_workers())
+        futures = [
+            pool.submit(_term_stats_shard, flat[offsets[s]:offsets[e]], offsets[s:e + 1] - offsets[s])
+            for s, e in shards
+        ]
+        parts = [f.result() for f in futures]
+        doc_idx = np.concatenate([d + s for (d, _, _), (s, _) in zip(parts, shards)])
+        term_idx = np.concatenate([t for _, t, _ in parts])
+        tf = np.concatenate([c for _, _, c in parts])
+    else:
+        doc_idx, term_idx, tf = term_stats(flat, offsets)
+
+    # Same arithmetic and dtypes as bm25s' Lucene scorer, so scores match bit for bit
+    avg_doc_len = doc_lens.mean() if n_docs else 0.0
+    df = np.bincount(term_idx, minlength=n_vocab)
+    idf = np.zeros(n_vocab, dtype=np.float32)
+    nz = df > 0
+    idf[nz] = np.log(1 + (n_docs - df[nz] + 0.5) / (df[nz] + 0.5))
+
+    tf32 = tf.astype(np.float32).astype(np.float64)
+    l_d = doc_lens[doc_idx].astype(np.float64)
+    tfc = tf32 / (K1 * ((1 - B) + B * l_d / avg_doc_len) + tf32)
+    scores = (idf[term_idx].astype(np.float64) * tfc).astype(np.float32)
+
+    order = np.lexsort((doc_idx, term_idx))
+    indptr = np.zeros(n_vocab + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+
+    model = bm25s.BM25()
+    model.scores = {
+        "data": scores[order],
+        "indices": doc_idx[order].astype(np.int32),
+        "indptr": indptr,
+        "num_docs": n_docs,
+    }
+    model.nonoccurrence_array = None
+    model.vocab_dict = dict(vocab)
+    # bm25s always reserves an empty token past the last real one
+    model.vocab_dict.setdefault("", n_vocab)
+    model.unique_token_ids_set = set(model.vocab_dict.values())
+    return model
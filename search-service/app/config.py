@@ -1,12 +1,93 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     """Manages application settings and environment variables."""
     FIREBASE_AUTH_EMULATOR_HOST: str | None = None
     FIREBASE_PROJECT_ID: str = "your-gcp-project-id"
+    # Document/profile storage: "memory" (lost on restart) or "sqlite"
+    DOCUMENT_STORE: str = "memory"
+    DOCUMENT_STORE_PATH: str = "data/search.db"
+    # Search admission control: per-user rate (requests/s, 0 = off) and
+    # burst, concurrent searches (0 = unlimited) and how long a search may
+    # wait for a slot before it is shed with 503
+    SEARCH_RATE_PER_SEC: float = 20.0
+    SEARCH_RATE_BURST: float = 40.0
+    SEARCH_MAX_CONCURRENCY: int = 16
+    SEARCH_MAX_QUEUE_MS: float = 200.0
+    # Request profiling: requests carrying this token in X-Profile-Token (and
+    # a random PROFILING_SAMPLE_RATE fraction of all requests) are profiled;
+    # the last PROFILING_RING_SIZE profiles are kept under /debug/profiles
+    PROFILING_ADMIN_TOKEN: str | None = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_MS: float = 1.0
+    PROFILING_RING_SIZE: int = 50
+    # When set, changed course indexes are snapshotted here in the
+    # background, at most SEARCH_SNAPSHOT_DELAY_SECONDS after the first
+    # unsaved write of a course (all writes until then share one snapshot)
+    SEARCH_SNAPSHOT_DIR: str | None = None
+    SEARCH_SNAPSHOT_DELAY_SECONDS: float = 2.0
+    # Asynchronous ingestion (documents:batchCreateAsync)
+    INGEST_WORKERS: int = 2
+    INGEST_QUEUE_SIZE: int = 64
+    INGEST_BATCH_SIZE: int = 500
+    # Near-duplicate chunks (MinHash estimate of word 3-shingle Jaccard
+    # similarity >= threshold) at ingest: "off", "flag" (index them with
+    # metadata.duplicate_of = canonical chunk id) or "collapse" (skip them)
+    INGEST_DEDUP: str = "off"
+    INGEST_DEDUP_THRESHOLD: float = 0.8
+    # Index builds: worker processes (0 = one per CPU) and the corpus size
+    # from which tokenization and scoring are sharded across them
+    INDEX_BUILD_WORKERS: int = 0
+    INDEX_PARALLEL_MIN_DOCS: int = 5000
+    # Memory budget for resident course indexes (0 = unlimited); least
+    # recently used courses beyond it are evicted to disk. The cross-course
+    # index and the analyzer vocabulary are never evicted but count against
+    # it. Pinned courses (comma-separated ids) are never evicted.
+    INDEX_MEMORY_BUDGET_MB: int = 0
+    INDEX_PINNED_COURSES: str = ""
+    # Positional postings (quoted phrase queries, proximity boost), off by
+    # default. Without phrases, the best SEARCH_PROXIMITY_CANDIDATES BM25 hits
+    # of a multi-term query are re-ranked by score * (1 + weight * proximity);
+    # 0 disables it
+    INDEX_POSITIONS: bool = False
+    SEARCH_PROXIMITY_WEIGHT: float = 0.0
+    SEARCH_PROXIMITY_CANDIDATES: int = 100
+    # Long queries (e.g. a whole chat message) are scored on at most this
+    # many distinct terms, those weighing most (query tf x idf); 0 = no cap
+    SEARCH_MAX_QUERY_TERMS: int = 32
+    # Top-k retrieval: "bm25s" (score every posting) or "blockmax" (exact,
+    # skips postings whose score bound cannot reach the top k; maxima are
+    # kept per block of INDEX_BLOCK_SIZE postings; only faster on large
+    # courses, see README)
+    SEARCH_ENGINE: str = "bm25s"
+    INDEX_BLOCK_SIZE: int = 128
+    # Quantize BM25 scores to 8 or 16 bits per posting, with varint-coded
+    # document rows (0 = exact float32 scores; blockmax needs those)
+    INDEX_SCORE_BITS: int = 0
+    # Restored snapshots keep their score matrices memory-mapped on disk
+    INDEX_SNAPSHOT_MMAP: bool = False
+    # Queries (one per line) run against every restored course during warmup
+    WARMUP_QUERIES_FILE: str | None = None
+    # Query log (off when unset): searches are buffered in a ring of
+    # QUERY_LOG_BUFFER_SIZE entries and flushed every QUERY_LOG_FLUSH_SECONDS
+    # to files rotated at QUERY_LOG_MAX_BYTES (QUERY_LOG_BACKUPS kept). The
+    # QUERY_WARM_TOP_N most frequent queries of a course are re-run after
+    # each rebuild of its index and at startup (0 = no warming)
+    QUERY_LOG_DIR: str | None = None
+    QUERY_LOG_BUFFER_SIZE: int = 10000
+    QUERY_LOG_FLUSH_SECONDS: float = 2.0
+    QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    QUERY_LOG_BACKUPS: int = 5
+    QUERY_WARM_TOP_N: int = 20
+    # Search responses of at least this many bytes are compressed (zstd or
+    # gzip, per Accept-Encoding); 0 = never compress
+    RESPONSE_COMPRESS_MIN_BYTES: int = 1024
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra='ignore')
 
+@lru_cache
 def get_settings() -> Settings:
-    """Returns the application settings."""
+    """Returns the application settings (read from the environment once)."""
     return Settings()
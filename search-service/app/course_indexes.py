@@ -0,0 +1,302 @@
+"""
+Memory-bounded storage of per-course BM25 indexes.
+
+Every course index is kept in memory while it is in use. When the resident
+indexes exceed the memory budget, the least recently used ones are written
+to on-disk snapshots and dropped; the next request for such a course loads
+it back from its snapshot. Pinned courses (e.g. the current semester's) are
+never evicted. Memory the course indexes share with the rest of the
+process (the cross-course index, the analyzer vocabulary) cannot be
+evicted but counts against the budget too, leaving the courses the rest.
+
+With a snapshot directory, changed courses are also snapshotted in the
+background (`schedule_persist`): writes within `persist_delay` seconds of a
+course's first unsaved write share one snapshot, taken off the request path.
+Eviction and `flush()` (at shutdown) write whatever is still pending.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+from .index import BM25Index, snapshot_path
+
+logger = logging.getLogger(__name__)
+
+
+class CourseIndexManager:
+    """
+    LRU cache of course indexes with a memory budget.
+
+    `memory_budget_bytes` of 0 disables eviction. Evicted indexes go to
+    `snapshot_dir`, or to a private temporary directory if none is given.
+    `write_lock` must be the lock that serializes index writes, so an index
+    is never evicted halfway through a write; it is held while evicting and
+    must therefore be reentrant. `loader(course_id)` builds the index of a
+    course that has no snapshot, e.g. from the document store.
+    `shared_bytes()` measures memory outside the course indexes that the
+    budget must also cover; it is called under `write_lock` after writes
+    (`note_write`, `refresh_shared_bytes`) and the result is cached.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = 0,
+        snapshot_dir: Optional[str] = None,
+        pinned: Iterable[str] = (),
+        write_lock: Optional[threading.RLock] = None,
+        mmap: bool = False,
+        loader: Optional[Callable[[str], BM25Index]] = None,
+        persist_delay: float = 2.0,
+        shared_bytes: Optional[Callable[[], int]] = None,
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.snapshot_dir = snapshot_dir
+        self.pinned = set(pinned)
+        self.write_lock = write_lock or threading.RLock()
+        # Load snapshots with memory-mapped score matrices
+        self.mmap = mmap
+        self.loader = loader
+        self.shared_bytes = shared_bytes or (lambda: 0)
+        self._shared_bytes = 0
+        self._lock = threading.RLock()
+        # course id -> index, least recently used first
+        self._resident: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        # Courses whose resident index matches their snapshot on disk
+        self._persisted: set = set()
+        self._evictions: Dict[str, int] = {}
+        self._loads = 0
+        self._spill_dir: Optional[str] = None
+        # Background snapshots: course id -> when it is due (monotonic)
+        self.persist_delay = persist_delay
+        self._dirty: Dict[str, float] = {}
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    # ----- Lookup -----
+
+    def get(self, course_id: str) -> BM25Index:
+        """Return the course index, loading it from disk or creating it if needed."""
+        with self._lock:
+            index = self._resident.get(course_id)
+            if index is not None:
+                self._resident.move_to_end(course_id)
+                self._last_access[course_id] = time.time()
+                return index
+
+            path = self._path(course_id)
+            if path is not None and os.path.isdir(path):
+                index = BM25Index.load_snapshot(path, mmap=self.mmap)
+                self._persisted.add(course_id)
+                self._loads += 1
+            else:
+                index = self.loader(course_id) if self.loader else BM25Index()
+            self._resident[course_id] = index
+            self._bytes[course_id] = index.memory_bytes()
+            self._last_access[course_id] = time.time()
+
+        self.evict_if_needed(keep=course_id)
+        return index
+
+    def replace(self, course_id: str, index: BM25Index):
+        """Install a freshly built index for a course, e.g. after a stale snapshot."""
+        with self._lock:
+            self._resident[course_id] = index
+            self._resident.move_to_end(course_id)
+            self._bytes[course_id] = index.memory_bytes()
+            self._last_access[course_id] = time.time()
+            self._persisted.discard(course_id)
+        self.evict_if_needed(keep=course_id)
+
+    def __contains__(self, course_id: str) -> bool:
+        with self._lock:
+            return course_id in self._resident
+
+    # ----- Bookkeeping after writes -----
+
+    def note_write(self, course_id: str):
+        """Re-measure a course index (and shared memory) after it changed, then enforce the budget."""
+        self.refresh_shared_bytes()
+        with self._lock:
+            index = self._resident.get(course_id)
+            if index is None:
+                return
+            self._bytes[course_id] = index.memory_bytes()
+            self._persisted.discard(course_id)
+        self.evict_if_needed(keep=course_id)
+
+    def refresh_shared_bytes(self):
+        """Re-measure the shared memory, e.g. after writes that touched no course."""
+        # Measured while writes are excluded, never from the health endpoint
+        with self.write_lock:
+            nbytes = self.shared_bytes()
+        with self._lock:
+            self._shared_bytes = nbytes
+
+    def mark_persisted(self, course_id: str):
+        """Record that the course's snapshot on disk is up to date."""
+        with self._lock:
+            if course_id in self._resident:
+                self._persisted.add(course_id)
+
+    # ----- Background snapshots -----
+
+    def schedule_persist(self, course_id: str):
+        """Snapshot a changed course in the background, within `persist_delay` seconds."""
+        if self.snapshot_dir is None:
+            return
+        with self._lock:
+            # Later writes join the pending snapshot rather than postponing it
+            self._dirty.setdefault(course_id, time.monotonic() + self.persist_delay)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="snapshot-flusher", daemon=True)
+                self._flusher.start()
+        self._wake.set()
+
+    def _run_flusher(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                due = [course_id for course_id, at in self._dirty.items() if at <= now]
+                next_at = min(self._dirty.values(), default=None)
+            for course_id in due:
+                try:
+                    self.persist(course_id)
+                except Exception:
+                    logger.exception("Snapshot of course %s failed", course_id)
+            if due:
+                continue
+            self._wake.wait(None if next_at is None else max(0.0, next_at - now))
+            self._wake.clear()
+
+    def persist(self, course_id: str) -> bool:
+        """Snapshot a resident course now if it changed since its last snapshot."""
+        with self.write_lock:
+            with self._lock:
+                self._dirty.pop(course_id, None)
+                index = self._resident.get(course_id)
+                if index is None or course_id in self._persisted or self.snapshot_dir is None:
+                    return False
+            # Writes hold write_lock, so the index cannot change while it is saved
+            path = self._path(course_id, create=True)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            index.save_snapshot(path)
+            self.mark_persisted(course_id)
+            return True
+
+    def flush(self) -> int:
+        """Snapshot every course with pending changes now; returns how many were written."""
+        with self._lock:
+            pending = list(self._dirty)
+        return sum(self.persist(course_id) for course_id in pending)
+
+    # ----- Pinning -----
+
+    def pin(self, course_id: str):
+        with self._lock:
+            self.pinned.add(course_id)
+
+    def unpin(self, course_id: str):
+        with self._lock:
+            self.pinned.discard(course_id)
+        self.evict_if_needed()
+
+    # ----- Eviction -----
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(self._bytes.values())
+
+    def has_room(self) -> bool:
+        """True if resident indexes and shared memory are below the budget (or there is none)."""
+        if not self.memory_budget_bytes:
+            return True
+        return self.resident_bytes() + self._shared_bytes < self.memory_budget_bytes
+
+    def resident(self) -> Dict[str, BM25Index]:
+        """Snapshot of the currently resident indexes."""
+        with self._lock:
+            return dict(self._resident)
+
+    def evict_if_needed(self, keep: Optional[str] = None):
+        """Evict least recently used, unpinned courses until under budget."""
+        if not self.memory_budget_bytes:
+            return
+        with self.write_lock, self._lock:
+            budget = self.memory_budget_bytes - self._shared_bytes
+            for course_id in list(self._resident):
+                if self.resident_bytes() <= budget:
+                    break
+                if course_id == keep or course_id in self.pinned:
+                    continue
+                self.evict(course_id)
+
+    def evict(self, course_id: str) -> bool:
+        """Write a course index to disk (if it changed) and drop it from memory."""
+        with self.write_lock, self._lock:
+            index = self._resident.get(course_id)
+            if index is None:
+                return False
+            if course_id not in self._persisted:
+                path = self._path(course_id, create=True)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                index.save_snapshot(path)
+            del self._resident[course_id]
+            del self._bytes[course_id]
+            self._persisted.discard(course_id)
+            self._dirty.pop(course_id, None)
+            self._evictions[course_id] = self._evictions.get(course_id, 0) + 1
+            return True
+
+    def _path(self, course_id: str, create: bool = False) -> Optional[str]:
+        root = self.snapshot_dir or self._spill_dir
+        if root is None and create:
+            self._spill_dir = root = tempfile.mkdtemp(prefix="search-index-spill-")
+        return snapshot_path(root, course_id) if root else None
+
+    def clear(self):
+        """Forget all courses, including ones spilled to the private temp directory."""
+        with self._lock:
+            self._resident.clear()
+            self._bytes.clear()
+            self._last_access.clear()
+            self._persisted.clear()
+            self._dirty.clear()
+            self._evictions.clear()
+            self._loads = 0
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+
+    # ----- Monitoring -----
+
+    def stats(self) -> dict:
+        """Resident memory and eviction counts, for /health/json."""
+        with self._lock:
+            courses = {
+                course_id: {
+                    "resident_bytes": self._bytes.get(course_id, 0),
+                    "resident": course_id in self._resident,
+                    "pinned": course_id in self.pinned,
+                    "evictions": self._evictions.get(course_id, 0),
+                    "last_access": self._last_access.get(course_id),
+                }
+                for course_id in dict.fromkeys([*self._resident, *self._evictions])
+            }
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": sum(self._bytes.values()),
+                "shared_bytes": self._shared_bytes,
+                "resident_courses": len(self._resident),
+                "evictions": sum(self._evictions.values()),
+                "loads": self._loads,
+                "pending_snapshots": len(self._dirty),
+                "courses": courses,
+            }
@@ -0,0 +1,77 @@
+"""
+Caller deadlines for the Search Service.
+
+Callers send their remaining time budget in the `X-Request-Deadline-Ms`
+header (milliseconds, relative, so clocks need not agree). Handlers use it
+to skip optional work once time runs out and flag the response as partial;
+requests that arrive already expired are rejected with 504. The search
+itself is not interrupted once it has started; handlers check the deadline
+again as soon as it returns.
+"""
+
+import time
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class Deadline:
+    """Absolute point in (monotonic) time by which a request must finish."""
+
+    def __init__(self, budget_ms: float):
+        self.expires_at = time.monotonic() + budget_ms / 1000.0
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+def get_deadline(
+    deadline_ms: Optional[str] = Header(default=None, alias=DEADLINE_HEADER),
+) -> Optional[Deadline]:
+    """
+    FastAPI dependency returning the caller's deadline, or None if no header was sent.
+
+    Raises:
+        HTTPException(400): If the header is not a number.
+        HTTPException(504): If the budget is already spent on arrival.
+    """
+    if deadline_ms is None:
+        return None
+
+    try:
+        budget_ms = float(deadline_ms)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{DEADLINE_HEADER} must be a number of milliseconds",
+        )
+
+    if budget_ms <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request deadline already exceeded",
+        )
+    return Deadline(budget_ms)
+
+
+def is_expired(deadline: Optional[Deadline]) -> bool:
+    """True if a deadline was given and has passed."""
+    return deadline is not None and deadline.expired()
+
+
+def ensure_not_expired(deadline: Optional[Deadline]) -> None:
+    """
+    Abort with 504 if the deadline has passed, e.g. while the request was
+    queued for a worker thread. Call before starting the main work.
+    """
+    if is_expired(deadline):
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request deadline exceeded before search started",
+        )
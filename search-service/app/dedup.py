@@ -0,0 +1,134 @@
+"""
+Near-duplicate chunk detection with MinHash and LSH banding.
+
+Re-uploaded slides and overlapping versions of a lecture produce chunks
+that differ only in a few words. Two chunks are near-duplicates when the
+Jaccard similarity of their sets of word 3-shingles reaches a threshold.
+
+- A chunk's MinHash signature holds, for each of `num_perm` hash functions
+  (multiply-shift hashing of the 64-bit shingle hashes), the minimum hash
+  over its shingles. The fraction of positions where two signatures agree
+  estimates the Jaccard similarity of the chunks.
+- LSH splits signatures into `bands` bands of `num_perm / bands` rows and
+  buckets chunks by each band. Chunks sharing any bucket are candidates, so
+  a lookup touches a handful of buckets instead of every chunk; the band
+  count is picked so that pairs near the threshold almost always collide.
+  Candidates are then checked against the threshold with the signature.
+"""
+
+import re
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .analysis import TOKEN_PATTERN
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+SHINGLE_SIZE = 3
+# Metadata key linking a near-duplicate chunk to its canonical chunk
+DUPLICATE_OF = "duplicate_of"
+
+_split_words = re.compile(TOKEN_PATTERN).findall
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """64-bit hashes of the distinct `size`-word shingles of `text` (one shingle for shorter texts)."""
+    words = _split_words(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.array([zlib.crc32(w.encode("utf-8")) for w in words], dtype=np.uint64)
+    n = max(1, len(hashes) - size + 1)
+    shingles = np.zeros(n, dtype=np.uint64)
+    for j in range(min(size, len(hashes))):
+        # Polynomial combination; uint64 arithmetic wraps modulo 2**64
+        shingles = shingles * np.uint64(0x100000001B3) + hashes[j:j + n]
+    return np.unique(shingles)
+
+
+def optimal_bands(num_perm: int, threshold: float) -> int:
+    """
+    Band count (a divisor of `num_perm`) whose S-curve midpoint
+    (1/bands)^(1/rows) is closest to `threshold` from below.
+    """
+    # More bands lower the midpoint: take the fewest bands that reach below
+    below = [b for b in range(1, num_perm + 1) if num_perm % b == 0 and (1.0 / b) ** (b / num_perm) <= threshold]
+    return below[0] if below else num_perm
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of chunks by id, bucketed by LSH band."""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = optimal_bands(num_perm, threshold)
+        self.rows = num_perm // self.bands
+        rng = np.random.default_rng(seed)
+        # Odd multipliers make x -> a * x + b a bijection modulo 2**64
+        self._a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.signatures
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of `text`, or None if it has no words."""
+        shingles = shingle_hashes(text)
+        if not len(shingles):
+            return None
+        # Top 32 bits of a * x + b (mod 2**64): multiply-shift hashing
+        hashed = (np.outer(self._a, shingles) + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, doc_id: str, signature: Optional[np.ndarray]):
+        """Index a signature under `doc_id`, replacing what was indexed for it."""
+        self.remove(doc_id)
+        if signature is None:
+            return
+        self.signatures[doc_id] = signature
+        for key in self._keys(signature):
+            self._buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: str):
+        signature = self.signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for key in self._keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(a == b))
+
+    def find(self, signature: Optional[np.ndarray], exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        The indexed chunk (other than `exclude`) most similar to a signature
+        at or above the threshold (ties: smallest id), as (doc id, estimated
+        similarity), or None.
+        """
+        if signature is None:
+            return None
+        candidates: Set[str] = set()
+        for key in self._keys(signature):
+            candidates |= self._buckets.get(key, set())
+        candidates.discard(exclude)
+        best = None
+        for doc_id in candidates:
+            score = self.similarity(signature, self.signatures[doc_id])
+            if score >= self.threshold and (best is None or (-score, doc_id) < (-best[1], best[0])):
+                best = (doc_id, score)
+        return best
@@ -0,0 +1,134 @@
+"""
+Response encoding negotiation for the search endpoints.
+
+Search responses (ragSearch in particular, which carries full chunk
+content) are large, and FastAPI's default path re-validates the returned
+model against `response_model`, walks it with `jsonable_encoder` and then
+runs the stdlib JSON encoder. The search handlers instead build their
+models with `model_construct` (the chunks were validated at ingest) and
+hand them to a `ResponseEncoder`, which serializes them once:
+
+- `Accept: application/msgpack` (or `application/x-msgpack`) gets
+  MessagePack, anything else JSON via orjson,
+- bodies of at least RESPONSE_COMPRESS_MIN_BYTES are compressed when
+  `Accept-Encoding` allows it: zstd if the `zstandard` package is
+  installed, otherwise gzip.
+
+Responses carry `Vary: Accept, Accept-Encoding` so caches keep the variants apart.
+"""
+
+import gzip
+import importlib.util
+from typing import Dict, Optional
+
+import msgpack
+import orjson
+from fastapi import Header, Response
+from pydantic import BaseModel
+
+from .config import get_settings
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = {MSGPACK, "application/x-msgpack"}
+
+# Fastest levels: on the hot path, CPU matters more than the last few percent
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+# zstandard is optional; without it zstd is simply never negotiated
+HAS_ZSTD = importlib.util.find_spec("zstandard") is not None
+
+settings = get_settings()
+
+_zstd_compressor = None
+
+
+def _zstd_compress(body: bytes) -> bytes:
+    global _zstd_compressor
+    if _zstd_compressor is None:
+        import zstandard
+
+        _zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return _zstd_compressor.compress(body)
+
+
+def _gzip_compress(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Preferred first
+COMPRESSORS = {"zstd": _zstd_compress, "gzip": _gzip_compress}
+
+
+def _parse_header(value: Optional[str]) -> Dict[str, float]:
+    """Tokens of an Accept / Accept-Encoding header (lowercased) with their q values."""
+    tokens: Dict[str, float] = {}
+    for part in (value or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        tokens[token.lower()] = q
+    return tokens
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """MessagePack when the client accepts it at least as much as JSON, else JSON."""
+    tokens = _parse_header(accept)
+    msgpack_q = max((tokens.get(t, 0.0) for t in MSGPACK_TYPES), default=0.0)
+    json_q = max(tokens.get(JSON, 0.0), tokens.get("application/*", 0.0), tokens.get("*/*", 0.0))
+    return MSGPACK if msgpack_q > 0 and msgpack_q >= json_q else JSON
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The content coding to compress with, or None for identity."""
+    tokens = _parse_header(accept_encoding)
+    for name in COMPRESSORS:
+        if name == "zstd" and not HAS_ZSTD:
+            continue
+        if tokens.get(name, tokens.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+class ResponseEncoder:
+    """Serializes (and possibly compresses) response models for one request."""
+
+    def __init__(self, media_type: str = JSON, encoding: Optional[str] = None, min_compress_bytes: int = 1024):
+        self.media_type = media_type
+        self.encoding = encoding
+        self.min_compress_bytes = min_compress_bytes
+
+    def encode(self, model: BaseModel) -> bytes:
+        data = model.model_dump()
+        if self.media_type == MSGPACK:
+            return msgpack.packb(data, use_bin_type=True)
+        return orjson.dumps(data)
+
+    def render(self, model: BaseModel, status_code: int = 200) -> Response:
+        body = self.encode(model)
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if self.encoding is not None and len(body) >= self.min_compress_bytes:
+            body = COMPRESSORS[self.encoding](body)
+            headers["Content-Encoding"] = self.encoding
+        return Response(content=body, status_code=status_code, media_type=self.media_type, headers=headers)
+
+
+def get_response_encoder(
+    accept: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
+) -> ResponseEncoder:
+    """FastAPI dependency: the encoder negotiated from the request's Accept headers."""
+    min_bytes = settings.RESPONSE_COMPRESS_MIN_BYTES
+    return ResponseEncoder(
+        media_type=negotiate_media_type(accept),
+        encoding=negotiate_encoding(accept_encoding) if min_bytes > 0 else None,
+        min_compress_bytes=min_bytes,
+    )
@@ -0,0 +1,84 @@
+"""
+Typo-tolerant term lookup with a symmetric-delete (SymSpell) index.
+
+For every indexed term, all strings obtained by deleting up to
+`max_distance` characters (from its first `prefix_length` characters) are
+precomputed and mapped back to the term. A misspelled query term is
+resolved by generating its own deletes and looking them up: two words
+within edit distance d always share a delete variant, so candidates are
+found with a few dict lookups instead of a scan of the vocabulary. The
+candidates are then checked with the real (optimal string alignment)
+edit distance.
+
+Terms are only ever added. Callers filter candidates against their live
+vocabulary, so a term whose last document was deleted is never suggested.
+"""
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+MAX_EDIT_DISTANCE = 2
+# Only deletes of the first characters are indexed (SymSpell's prefix
+# length): keeps the index small, long words rarely differ only at the end
+PREFIX_LENGTH = 7
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """`word` and every string obtained by deleting up to `max_distance` characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent
+    transpositions), or `max_distance + 1` once it is known to exceed it.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SymSpell:
+    """Grow-only symmetric-delete index over a set of terms."""
+
+    def __init__(self, terms: Iterable[str] = (), max_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.terms: Set[str] = set()
+        # delete variant -> terms it was derived from
+        self._deletes: Dict[str, List[str]] = {}
+        for term in terms:
+            self.add(term)
+
+    def add(self, term: str):
+        if term in self.terms:
+            return
+        self.terms.add(term)
+        for variant in _deletes(term[:self.prefix_length], self.max_distance):
+            self._deletes.setdefault(variant, []).append(term)
+
+    def lookup(self, word: str, max_distance: int = MAX_EDIT_DISTANCE) -> List[Tuple[str, int]]:
+        """Indexed terms within `max_distance` edits of `word`, as (term, distance)."""
+        max_distance = min(max_distance, self.max_distance)
+        found: Dict[str, int] = {}
+        for variant in _deletes(word[:self.prefix_length], max_distance):
+            for term in self._deletes.get(variant, ()):
+                if term not in found:
+                    found[term] = edit_distance(word, term, max_distance)
+        return [(term, d) for term, d in found.items() if d <= max_distance]
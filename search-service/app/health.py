@@ -5,18 +5,29 @@ Provides JSON endpoints and HTML dashboard for monitoring.
 """
 
 from fastapi import APIRouter
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from .monitoring import monitoring_service
+from .warmup import warmup_state
 
 router = APIRouter()
 
 
 @router.get("/health")
 async def health_simple() -> dict:
-    """Simple health check for load balancers and orchestrators."""
+    """Liveness check: cheap and always healthy while the process serves requests."""
     return {"status": "healthy"}
 
 
+@router.get("/health/ready")
+async def health_ready() -> JSONResponse:
+    """
+    Readiness probe: 200 once startup warmup has finished, 503 until then
+    (or if warmup failed), so load balancers hold traffic back.
+    """
+    status_code = 200 if warmup_state.ready else 503
+    return JSONResponse(status_code=status_code, content=warmup_state.to_dict())
+
+
 @router.get("/health/json")
 async def health_json() -> dict:
     """Detailed health data in JSON format."""
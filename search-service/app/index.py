@@ -1,66 +1,816 @@
-from typing import List, Dict, Tuple
-import bm25s
-import Stemmer
+from collections import Counter
+from typing import Iterable, List, Dict, Optional, Tuple
+import copy
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+from .analysis import TOKEN_PATTERN, Analyzer, get_analyzer
+from .build import analyze_texts, build_bm25
+from .config import get_settings
 from .models import DocumentChunk
+from .positions import PositionalIndex, min_distance
+from .pruning import BlockMaxIndex
+from .quantize import SCORE_BITS, QuantizedScores
+from .dedup import DUPLICATE_OF, NearDuplicateIndex
+from .fuzzy import MAX_EDIT_DISTANCE, SymSpell
+from .suggest import Suggester
+
+
+# Snapshot layout: <root>/<quoted course id>/{docs.jsonl, tokens.*, bm25/}
+SNAPSHOT_DOCS_FILE = "docs.jsonl"
+SNAPSHOT_BM25_DIR = "bm25"
+# Term ids of all docs concatenated, per-doc offsets, and the terms they refer to
+SNAPSHOT_TOKEN_IDS_FILE = "tokens.ids.npy"
+SNAPSHOT_TOKEN_OFFSETS_FILE = "tokens.offsets.npy"
+SNAPSHOT_TOKEN_VOCAB_FILE = "tokens.vocab.json"
+# Display words of those terms, same order (optional)
+SNAPSHOT_TOKEN_SURFACE_FILE = "tokens.surface.json"
+# Liveness of the bm25s rows, when some are tombstoned; docs.jsonl then
+# holds the live rows only (optional)
+SNAPSHOT_LIVE_FILE = "live.npy"
+
+
+settings = get_settings()
+
+# Quoted parts of a query must match as phrases
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+# Query terms considered for the proximity boost
+MAX_PROXIMITY_TERMS = 8
+# Top-k retrieval engines: bm25s' exhaustive scoring, or block-max pruning
+ENGINES = ("bm25s", "blockmax")
+# Process-wide, so a course index reloaded from disk gets a new generation too
+_generations = itertools.count(1)
+
+
+def snapshot_path(root: str, course_id: str) -> str:
+    """Directory holding the snapshot of one course index under `root`."""
+    return os.path.join(root, quote(course_id, safe=""))
+
+
+# (course_id, source, chunk_index) -> position of a chunk within its course
+PositionKey = Tuple[str, str, int]
+
+
+def _position_key(doc: DocumentChunk) -> Optional[PositionKey]:
+    if doc.source is None or doc.chunk_index is None:
+        return None
+    return (doc.course_id, doc.source, doc.chunk_index)
+
+
+def _titles(doc: DocumentChunk) -> List[str]:
+    """Distinct title and headings of a chunk, offered as suggestions."""
+    titles = [doc.title] if doc.title else []
+    titles.extend(doc.headings or [])
+    return list(dict.fromkeys(t.strip() for t in titles if t and t.strip()))
+
+
+class SearchState:
+    """
+    Everything a search reads: the bm25s model and the structures built
+    with it. A rebuild (or restore) builds a new state and publishes it
+    with one assignment, and a search reads `BM25Index.state` once, so a
+    search running during a rebuild sees the old index or the new one,
+    never rows of one resolved against the other. Deletes only tombstone
+    rows in place (clearing their `live_mask` entry), which searches
+    tolerate.
+    """
+
+    def __init__(
+        self,
+        doc_ids: List[str],
+        live_mask: np.ndarray,
+        bm25=None,
+        postings: Optional[PositionalIndex] = None,
+        block_max: Optional[BlockMaxIndex] = None,
+        quantized: Optional[QuantizedScores] = None,
+        generation: int = 0,
+    ):
+        # Row order of the bm25s model; may contain tombstoned ids
+        self.doc_ids = doc_ids
+        # Liveness of the rows (1.0 live, 0.0 tombstoned), and live doc id -> row
+        self.live_mask = live_mask
+        self.rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(doc_ids) if live_mask[row]}
+        self.num_tombstones = len(doc_ids) - len(self.rows)
+        self.bm25 = bm25
+        self.postings = postings
+        self.block_max = block_max
+        self.quantized = quantized
+        self.generation = generation
 
 
 class BM25Index:
-    def __init__(self):
+    """
+    BM25 index over document chunks.
+
+    Deletes are O(1): the row of a deleted document is tombstoned and
+    masked out of searches instead of rebuilding the index. Tombstoned rows
+    are dropped at the next rebuild, or by `compact()` once they exceed
+    `compact_ratio` of all rows. Until then BM25 statistics (doc count,
+    average length, IDF) still include the deleted rows, as in Lucene.
+
+    Each document is analyzed once, at ingest, into term ids of the shared
+    analyzer's vocabulary. Rebuilds and snapshot restores work from those
+    stored ids and never run the tokenizer or stemmer again.
+
+    With `positional` (default: INDEX_POSITIONS) every rebuild also builds
+    positional postings from those ids, which enable quoted phrase queries
+    and a proximity boost for multi-term queries.
+
+    `engine` (default: SEARCH_ENGINE) picks how the top k are found:
+    "bm25s" scores every posting of the query terms, "blockmax" keeps
+    per-term and per-block score maxima and skips the postings that cannot
+    reach the top k (same scores; rows tied at score 0, which both engines
+    use to fill up the k, may differ).
+
+    With `score_bits` (default: INDEX_SCORE_BITS) of 8 or 16 the score
+    matrix is kept quantized (see `QuantizedScores`) instead of as float32
+    scores and int32 rows, at a fraction of the memory; scores are then
+    approximate and the blockmax engine falls back to scoring every posting.
+    """
+
+    def __init__(
+        self,
+        compact_ratio: float = 0.25,
+        analyzer: str = "english",
+        positional: Optional[bool] = None,
+        engine: Optional[str] = None,
+        score_bits: Optional[int] = None,
+    ):
         self.docs: Dict[str, DocumentChunk] = {}
-        self.doc_ids: List[str] = []
-        self.bm25 = None
-        self.stemmer = Stemmer.Stemmer("english")
+        # What searches read, replaced as a whole by every rebuild
+        self.state = SearchState([], np.ones(0, dtype=np.float32))
+        # Documents added since the last rebuild, in insertion order
+        self._new_ids: List[str] = []
+        self.positional = settings.INDEX_POSITIONS if positional is None else positional
+        self.engine = engine or settings.SEARCH_ENGINE
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown search engine {self.engine!r}")
+        self.score_bits = settings.INDEX_SCORE_BITS if score_bits is None else score_bits
+        if self.score_bits and self.score_bits not in SCORE_BITS:
+            raise ValueError(f"Unsupported score width {self.score_bits!r}")
+        self.analyzer_name = analyzer
+        self._analyzer: Optional[Analyzer] = None
+        # doc id -> term ids (analyzer vocabulary) of its content
+        self.token_ids: Dict[str, np.ndarray] = {}
+        # Secondary index used to look chunks up by position
+        self.positions: Dict[PositionKey, str] = {}
+        self.compact_ratio = compact_ratio
+        # Live document frequencies backing suggestions, kept up to date on every write
+        self.term_doc_freq: Counter = Counter()  # analyzer term id -> docs
+        self.title_doc_freq: Counter = Counter()  # title or heading -> docs
+        self._suggester: Optional[Suggester] = None
+        # term id -> the text it is suggested as (its surface form when first suggested)
+        self._suggested_terms: Dict[int, str] = {}
+        # Deletion index for fuzzy queries, built on the first one
+        self._symspell: Optional[SymSpell] = None
+        self._freq_version = 0
+        # MinHash/LSH index of the canonical (not duplicate) chunks, built on
+        # the first duplicate check and kept up to date by writes after that
+        self._near_duplicates: Optional[NearDuplicateIndex] = None
+
+    @property
+    def analyzer(self) -> Analyzer:
+        # Resolved on first use, so creating an empty index stays cheap at startup
+        if self._analyzer is None:
+            self._analyzer = get_analyzer(self.analyzer_name)
+        return self._analyzer
+
+    # The current search state's parts, read-only
+    @property
+    def doc_ids(self) -> List[str]:
+        return self.state.doc_ids
+
+    @property
+    def num_tombstones(self) -> int:
+        return self.state.num_tombstones
+
+    @property
+    def bm25(self):
+        return self.state.bm25
+
+    @property
+    def postings(self) -> Optional[PositionalIndex]:
+        # Term positions per row of the bm25s model
+        return self.state.postings
+
+    @property
+    def block_max(self) -> Optional[BlockMaxIndex]:
+        # Block maxima of the bm25s score matrix (engine="blockmax")
+        return self.state.block_max
+
+    @property
+    def quantized(self) -> Optional[QuantizedScores]:
+        # Quantized score matrix (score_bits); bm25.scores then only keeps num_docs
+        return self.state.quantized
+
+    @property
+    def generation(self) -> int:
+        # Changes with every rebuild of the score matrix (or restore)
+        return self.state.generation
 
     def upsert(self, doc: DocumentChunk):
-        if doc.id not in self.docs:
-            self.doc_ids.append(doc.id)
-        self.docs[doc.id] = doc
+        self._put(doc)
+        self._rebuild_index()
+
+    def upsert_many(self, docs: List[DocumentChunk]):
+        """
+        Insert or replace several documents with a single index rebuild.
+        New or changed content is analyzed in one batch, sharded across
+        worker processes for large batches.
+        """
+        self._put_batch(docs)
         self._rebuild_index()
 
+    def load_documents(self, docs: Iterable[DocumentChunk], batch_size: int = 1000):
+        """
+        Add a stream of documents (e.g. a store cursor) with a single index
+        rebuild at the end; only `batch_size` documents are buffered at a time.
+        """
+        batch: List[DocumentChunk] = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self._put_batch(batch)
+                batch = []
+        self._put_batch(batch)
+        self._rebuild_index()
+
+    def _put_batch(self, docs: List[DocumentChunk]):
+        changed = {doc.id: doc.content for doc in docs if self._needs_encoding(doc)}
+        encoded = dict(zip(changed, analyze_texts(self.analyzer, list(changed.values()))))
+        for doc in docs:
+            self._put(doc, encoded.get(doc.id))
+
+    def _needs_encoding(self, doc: DocumentChunk) -> bool:
+        existing = self.docs.get(doc.id)
+        return existing is None or existing.content != doc.content or doc.id not in self.token_ids
+
+    def _put(self, doc: DocumentChunk, token_ids: Optional[np.ndarray] = None):
+        if token_ids is None and self._needs_encoding(doc):
+            token_ids = self.analyzer.encode(doc.content)
+        existing = self.docs.get(doc.id)
+        if existing is not None:
+            self._count(existing, -1)
+        if token_ids is not None:
+            self.token_ids[doc.id] = token_ids
+        if existing is None:
+            self._new_ids.append(doc.id)
+        else:
+            self._unlink_position(existing)
+        self.docs[doc.id] = doc
+        self._count(doc, +1)
+        if self._near_duplicates is not None:
+            if DUPLICATE_OF in doc.metadata:
+                self._near_duplicates.remove(doc.id)
+            elif existing is None or existing.content != doc.content or doc.id not in self._near_duplicates:
+                self._near_duplicates.add(doc.id, self._near_duplicates.signature(doc.content))
+        key = _position_key(doc)
+        if key is not None:
+            self.positions[key] = doc.id
+
     def delete(self, doc_id: str):
-        if doc_id in self.docs:
-            del self.docs[doc_id]
-            self.doc_ids.remove(doc_id)
-            self._rebuild_index()
+        self.delete_many([doc_id])
+
+    def delete_many(self, doc_ids: List[str]) -> List[str]:
+        """
+        Tombstone the given documents and return the ids that existed.
+        Compacts once at the end if the tombstone ratio passed the threshold.
+        """
+        state = self.state
+        deleted = []
+        for doc_id in doc_ids:
+            doc = self.docs.pop(doc_id, None)
+            if doc is None:
+                continue
+            self._unlink_position(doc)
+            self._count(doc, -1)
+            self.token_ids.pop(doc_id, None)
+            if self._near_duplicates is not None:
+                self._near_duplicates.remove(doc_id)
+            row = state.rows.pop(doc_id, None)
+            if row is not None:
+                state.live_mask[row] = 0.0
+                state.num_tombstones += 1
+            deleted.append(doc_id)
+
+        if deleted and state.num_tombstones > self.compact_ratio * len(state.doc_ids):
+            self.compact()
+        return deleted
+
+    def compact(self):
+        """Drop tombstoned rows by rebuilding over the live documents."""
+        self._rebuild_index()
+
+    def _unlink_position(self, doc: DocumentChunk):
+        key = _position_key(doc)
+        if key is not None and self.positions.get(key) == doc.id:
+            del self.positions[key]
+
+    def _count(self, doc: DocumentChunk, sign: int):
+        """Add (+1) or remove (-1) a stored document's terms and titles from the frequencies."""
+        ids = self.token_ids.get(doc.id)
+        unique = []
+        if ids is not None and len(ids):
+            unique = np.unique(ids).tolist()
+            self.term_doc_freq.update({t: sign for t in unique})
+            if sign > 0 and self._symspell is not None:
+                terms = self.analyzer.terms
+                for t in unique:
+                    self._symspell.add(terms[t])
+        titles = _titles(doc)
+        self.title_doc_freq.update({t: sign for t in titles})
+        self._freq_version += 1
+        if self._suggester is not None:
+            self._update_suggester(self._suggester, unique, titles)
+
+    def _update_suggester(self, suggester: Suggester, term_ids: List[int], titles: Iterable[str]):
+        changes = []
+        for t in term_ids:
+            df = self.term_doc_freq[t]
+            text = self._suggested_terms.get(t)
+            if text is None:
+                text = self._suggested_terms[t] = self.analyzer.surface_form(t)
+            if df <= 0:
+                del self._suggested_terms[t]
+            changes.append((text, "term", df))
+        changes.extend((title, "title", self.title_doc_freq[title]) for title in titles)
+        suggester.update(changes)
+
+    def suggester(self) -> Suggester:
+        """Prefix index over the live terms and titles, built on first use and updated by writes."""
+        suggester = self._suggester
+        if suggester is None:
+            # Searches do not take the write lock: copy the counts, and only
+            # keep the result if no write happened while building it
+            version = self._freq_version
+            surface = self.analyzer.surface_form
+            counts = [(t, df) for t, df in list(self.term_doc_freq.items()) if df > 0]
+            titles = list(self.title_doc_freq.items())
+            surfaces = {t: surface(t) for t, _ in counts}
+            suggester = Suggester(((surfaces[t], df) for t, df in counts), titles)
+            if version == self._freq_version:
+                self._suggested_terms = surfaces
+                self._suggester = suggester
+                # A write that slipped in before the assignment did not update it
+                if version != self._freq_version:
+                    self._suggester = None
+        return suggester
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, str, int]]:
+        """Completions of a partially typed query as (text, kind, doc_freq)."""
+        return self.suggester().suggest(prefix, limit)
+
+    def symspell(self) -> SymSpell:
+        """Deletion index over the terms of this index; extended incrementally once built."""
+        symspell = self._symspell
+        if symspell is None:
+            version = self._freq_version
+            terms = self.analyzer.terms
+            symspell = SymSpell(terms[t] for t, df in list(self.term_doc_freq.items()) if df > 0)
+            if version == self._freq_version:
+                self._symspell = symspell
+        return symspell
+
+    def near_duplicates(self) -> NearDuplicateIndex:
+        """MinHash/LSH index over the chunks not marked as a duplicate of another."""
+        if self._near_duplicates is None:
+            index = NearDuplicateIndex(settings.INGEST_DEDUP_THRESHOLD)
+            for doc_id, doc in self.docs.items():
+                if DUPLICATE_OF not in doc.metadata:
+                    index.add(doc_id, index.signature(doc.content))
+            self._near_duplicates = index
+        return self._near_duplicates
+
+    def find_duplicates(self, docs: List[DocumentChunk]) -> Dict[str, str]:
+        """
+        Near-duplicates among `docs` (about to be written), as doc id ->
+        id of the canonical chunk: an indexed chunk, or an earlier chunk of
+        `docs` that is not a duplicate itself. Chunks are never compared
+        with the indexed version of themselves.
+        """
+        indexed = self.near_duplicates()
+        batch = NearDuplicateIndex(indexed.threshold, indexed.num_perm)
+        found: Dict[str, str] = {}
+        for doc in docs:
+            signature = indexed.signature(doc.content)
+            match = indexed.find(signature, exclude=doc.id) or batch.find(signature, exclude=doc.id)
+            if match is not None:
+                found[doc.id] = match[0]
+            else:
+                batch.add(doc.id, signature)
+        return found
+
+    def correct_query(self, query: str) -> Optional[str]:
+        """
+        Replace query words whose term is not in this index by the closest
+        indexed term (fewest edits, then most documents), compared after
+        stemming. Returns the corrected query, or None if nothing changed.
+        """
+        analyzer = self.analyzer
+        words = analyzer.words(query)
+        corrections: Dict[str, str] = {}
+        for word, stem in dict(zip(words, analyzer.query_terms(query))).items():
+            term_id = analyzer.term_to_id.get(stem)
+            if term_id is not None and self.term_doc_freq.get(term_id, 0) > 0:
+                continue
+            if len(word) < 3 or not word.isalpha():
+                continue
+            max_distance = 1 if len(stem) <= 4 else MAX_EDIT_DISTANCE
+            best = None
+            for term, distance in self.symspell().lookup(stem, max_distance):
+                candidate = analyzer.term_to_id[term]
+                df = self.term_doc_freq.get(candidate, 0)
+                if df > 0 and (best is None or (distance, -df, term) < best[0]):
+                    best = ((distance, -df, term), candidate)
+            if best is not None:
+                corrections[word] = analyzer.surface_form(best[1])
+
+        if not corrections:
+            return None
+        return re.sub(TOKEN_PATTERN, lambda m: corrections.get(m.group().lower(), m.group()), query)
+
+    def get_by_position(self, course_id: str, source: str, chunk_index: int) -> Optional[DocumentChunk]:
+        doc_id = self.positions.get((course_id, source, chunk_index))
+        return self.docs.get(doc_id) if doc_id is not None else None
+
+    def neighbors(self, doc: DocumentChunk, radius: int) -> List[DocumentChunk]:
+        """Chunks of the same source within +/- `radius` positions of `doc`, in order."""
+        if radius <= 0 or doc.source is None or doc.chunk_index is None:
+            return []
+        found = []
+        for offset in range(-radius, radius + 1):
+            if offset == 0:
+                continue
+            neighbor = self.get_by_position(doc.course_id, doc.source, doc.chunk_index + offset)
+            if neighbor is not None:
+                found.append(neighbor)
+        return found
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate memory held by this index: score matrix, stored term ids
+        and document text. Memory-mapped score arrays are not counted.
+        """
+        state = self.state
+        total = state.live_mask.nbytes
+        if state.bm25 is not None:
+            for value in state.bm25.scores.values():
+                if isinstance(value, np.ndarray) and not isinstance(value, np.memmap):
+                    total += value.nbytes
+        total += sum(ids.nbytes for ids in self.token_ids.values())
+        if state.postings is not None:
+            total += state.postings.nbytes()
+        if state.block_max is not None:
+            total += state.block_max.nbytes()
+        if state.quantized is not None:
+            total += state.quantized.nbytes()
+        total += sum(len(doc.content) + len(doc.id) for doc in self.docs.values())
+        return total
+
+    def touch_pages(self) -> int:
+        """
+        Read one value per page of memory-mapped score arrays, so the OS pages
+        them in now rather than on the first queries. Returns bytes touched.
+        """
+        touched = 0
+        bm25 = self.state.bm25
+        if bm25 is None:
+            return touched
+        for value in bm25.scores.values():
+            if isinstance(value, np.memmap) and value.size:
+                step = max(1, 4096 // value.itemsize)
+                value[::step].sum()
+                touched += value.nbytes
+        return touched
 
     def _rebuild_index(self):
-        if not self.docs:
-            self.bm25 = None
+        # Every rebuild also compacts: tombstoned rows are left out
+        doc_ids = [doc_id for doc_id in dict.fromkeys([*self.state.doc_ids, *self._new_ids]) if doc_id in self.docs]
+        self._new_ids = []
+        # Drop the zero counts left behind by deletes and edits
+        self.term_doc_freq = +self.term_doc_freq
+        self.title_doc_freq = +self.title_doc_freq
+
+        if not doc_ids:
+            self.state = SearchState([], np.ones(0, dtype=np.float32), generation=self.state.generation)
             return
 
-        corpus = [self.docs[doc_id].content for doc_id in self.doc_ids]
+        # Map the stored analyzer-wide term ids onto a compact local
+        # vocabulary, so the score matrix only spans terms of this index.
+        seqs = [self.token_ids[doc_id] for doc_id in doc_ids]
+        flat = np.concatenate(seqs) if seqs else np.zeros(0, dtype=np.int32)
+        term_ids, local = np.unique(flat, return_inverse=True)
+        local = local.astype(np.int32)
 
-        # Tokenize the corpus
-        tokenized_corpus = bm25s.tokenize(
-            corpus, stopwords="en", stemmer=self.stemmer
-        )
+        corpus_ids = []
+        start = 0
+        for seq in seqs:
+            corpus_ids.append(local[start:start + len(seq)])
+            start += len(seq)
+
+        terms = self.analyzer.terms
+        vocab = {terms[t]: i for i, t in enumerate(term_ids.tolist())}
+
+        bm25 = build_bm25(corpus_ids, len(vocab), vocab)
+        postings = PositionalIndex.build(seqs) if self.positional else None
+        self.state = self._search_state(doc_ids, np.ones(len(doc_ids), dtype=np.float32), bm25, postings)
 
-        self.bm25 = bm25s.BM25()
-        self.bm25.index(tokenized_corpus)
+    def _search_state(self, doc_ids: List[str], live_mask: np.ndarray, bm25, postings) -> SearchState:
+        """A new search state around a built bm25s model, with the engine's structures."""
+        block_max = quantized = None
+        if self.score_bits:
+            quantized = QuantizedScores.from_scores(bm25.scores, self.score_bits)
+            bm25.scores = {"num_docs": quantized.num_docs}
+        elif self.engine == "blockmax":
+            block_max = BlockMaxIndex(bm25.scores, settings.INDEX_BLOCK_SIZE)
+        return SearchState(doc_ids, live_mask, bm25, postings, block_max, quantized, next(_generations))
 
-    def search(self, query: str, k: int = 10) -> List[Tuple[DocumentChunk, float]]:
-        if not self.bm25:
+    def search(self, query: str, k: int = 10, fuzzy: bool = False) -> List[Tuple[DocumentChunk, float]]:
+        """Top `k` live documents for `query`; with `fuzzy=True` misspelled terms are corrected first."""
+        # Writes may publish a new state meanwhile; this search keeps using this one
+        state = self.state
+        if not state.bm25:
             return []
+        if fuzzy:
+            query = self.correct_query(query) or query
 
         # Don't ask bm25s for more docs than we actually have
-        num_docs = len(self.doc_ids)
-        if num_docs == 0:
+        num_docs = len(state.doc_ids)
+        num_tombstones = state.num_tombstones
+        if num_docs - num_tombstones <= 0:
             return []
 
-        k = min(k, num_docs)
+        # Tombstoned rows are masked to score 0, but can still tie with live
+        # zero-score rows, so over-fetch by their count and filter them out.
+        k = min(k, num_docs - num_tombstones)
+        fetch_k = min(k + num_tombstones, num_docs)
 
-        query_tokens = bm25s.tokenize(
-            query,
-            stopwords="en",
-            stemmer=self.stemmer,
-        )
+        terms = self._query_terms(state, query)
+        phrases = [p for p in PHRASE_PATTERN.findall(query) if self.analyzer.words(p)]
+        if state.postings is not None and (
+            phrases or (settings.SEARCH_PROXIMITY_WEIGHT and len(set(terms)) > 1)
+        ):
+            return self._positional_search(state, terms, phrases, k)
 
-        indices, scores = self.bm25.retrieve(query_tokens, k=k)
+        if state.block_max is not None or state.quantized is not None:
+            rows, scores = self._top_rows(state, terms, k)
+            return self._hits(state, rows, scores, k)
 
-        results: List[Tuple[DocumentChunk, float]] = []
-        for idx, score in zip(indices[0], scores[0]):
-            doc_id = self.doc_ids[int(idx)]
-            results.append((self.docs[doc_id], float(score)))
+        indices, scores = state.bm25.retrieve(
+            [terms],
+            k=fetch_k,
+            show_progress=False,
+            weight_mask=state.live_mask if num_tombstones else None,
+        )
+        return self._hits(state, indices[0], scores[0], k)
 
+    def _hits(self, state: SearchState, rows, scores, k: int) -> List[Tuple[DocumentChunk, float]]:
+        """The first `k` live rows as (document, score), skipping documents deleted meanwhile."""
+        results: List[Tuple[DocumentChunk, float]] = []
+        for row, score in zip(rows, scores):
+            row = int(row)
+            doc = self.docs.get(state.doc_ids[row]) if state.live_mask[row] else None
+            if doc is None:
+                continue
+            results.append((doc, float(score)))
+            if len(results) == k:
+                break
         return results
 
+    def query_terms(self, query: str, max_terms: Optional[int] = None) -> List[str]:
+        """
+        Terms of `query` worth scoring, in query order: each term once,
+        only terms of this index, and at most `max_terms` (default:
+        SEARCH_MAX_QUERY_TERMS, 0 = no cap) of them, those with the highest
+        weight (occurrences in the query x idf). Bounds the postings a long
+        chat message can make a search touch.
+        """
+        return self._query_terms(self.state, query, max_terms)
+
+    def _query_terms(self, state: SearchState, query: str, max_terms: Optional[int] = None) -> List[str]:
+        vocab = state.bm25.vocab_dict
+        counts = Counter(t for t in self.analyzer.query_terms(query) if t in vocab)
+        max_terms = settings.SEARCH_MAX_QUERY_TERMS if max_terms is None else max_terms
+        if not max_terms or len(counts) <= max_terms:
+            return list(counts)
+
+        num_docs = max(len(self.docs), 1)
+        term_to_id = self.analyzer.term_to_id
+
+        def weight(term: str) -> float:
+            df = self.term_doc_freq.get(term_to_id.get(term), 0)
+            return counts[term] * math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+        kept = set(heapq.nlargest(max_terms, counts, key=weight))
+        return [t for t in counts if t in kept]
+
+    def _positional_search(
+        self, state: SearchState, terms: List[str], phrases: List[str], k: int
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        Score with BM25, keep only rows matching every phrase, then boost the
+        best SEARCH_PROXIMITY_CANDIDATES of them where consecutive query
+        terms occur close together.
+        """
+        analyzer = self.analyzer
+        # Only the best BM25 candidates are re-ranked by proximity
+        n = max(k, settings.SEARCH_PROXIMITY_CANDIDATES)
+        if phrases:
+            candidates = None
+            for phrase in phrases:
+                ids = [analyzer.term_to_id.get(t) for t in analyzer.query_terms(phrase)]
+                rows = state.postings.phrase_rows(ids)
+                candidates = rows if candidates is None else np.intersect1d(candidates, rows)
+            candidates = candidates[state.live_mask[candidates] > 0]
+            scores = self._scores(state, terms)[candidates]
+            if n < len(candidates):
+                best = np.argpartition(-scores, n - 1)[:n]
+                candidates, scores = candidates[best], scores[best]
+        else:
+            candidates, scores = self._top_rows(state, terms, n)
+
+        final = scores * (1.0 + settings.SEARCH_PROXIMITY_WEIGHT * self._proximity(state, terms, candidates))
+        order = np.lexsort((candidates, -final))[:k]
+        return self._hits(state, candidates[order], final[order], k)
+
+    def _scores(self, state: SearchState, terms: List[str]) -> np.ndarray:
+        """BM25 score of every row (0 for tombstoned rows)."""
+        vocab = state.bm25.vocab_dict
+        known = [t for t in terms if t in vocab]
+        if not known:
+            return np.zeros(len(state.doc_ids), dtype=np.float32)
+        if state.quantized is not None:
+            return state.quantized.get_scores([vocab[t] for t in known]) * state.live_mask
+        return state.bm25.get_scores(known) * state.live_mask
+
+    def _top_rows(self, state: SearchState, terms: List[str], n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best `n` live rows by BM25 score, best first, as (rows, scores).
+        Like bm25s, rows matching no term fill up the n with score 0.
+        """
+        if state.block_max is not None:
+            vocab = state.bm25.vocab_dict
+            ids = [vocab[t] for t in terms if t in vocab]
+            rows, scores = state.block_max.top_k(ids, n, state.live_mask if state.num_tombstones else None)
+            if len(rows) < n:
+                rows, scores = self._pad_rows(state, rows, scores, n)
+            return rows, scores
+        scores = self._scores(state, terms)
+        candidates = np.flatnonzero(state.live_mask)
+        if n < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return candidates, scores[candidates]
+
+    def _pad_rows(self, state: SearchState, rows: np.ndarray, scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Append the first live rows not in `rows`, with score 0, up to `n` rows."""
+        wanted = n + len(rows)
+        if state.num_tombstones:
+            live = np.flatnonzero(state.live_mask)[:wanted]
+        else:
+            live = np.arange(min(wanted, len(state.doc_ids)))
+        extra = live[~np.isin(live, rows)][:n - len(rows)]
+        return (
+            np.concatenate([np.asarray(rows, dtype=np.int64), extra.astype(np.int64)]),
+            np.concatenate([scores, np.zeros(len(extra), dtype=scores.dtype)]),
+        )
+
+    def _proximity(self, state: SearchState, terms: List[str], rows: np.ndarray) -> np.ndarray:
+        """
+        Per row, mean of 1 / distance^2 over pairs of consecutive distinct
+        query terms that both occur in it: 1.0 when they are all adjacent.
+        """
+        boost = np.zeros(len(rows), dtype=np.float32)
+        term_ids = [t for t in dict.fromkeys(map(self.analyzer.term_to_id.get, terms)) if t is not None]
+        term_ids = term_ids[:MAX_PROXIMITY_TERMS]
+        if len(term_ids) < 2 or not len(rows):
+            return boost
+
+        positions = [state.postings.positions(t, rows) for t in term_ids]
+        for i, row in enumerate(rows.tolist()):
+            total = 0.0
+            for a, b in zip(positions, positions[1:]):
+                if row in a and row in b:
+                    total += 1.0 / min_distance(a[row], b[row]) ** 2
+            boost[i] = total / (len(term_ids) - 1)
+        return boost
+
+    def save_snapshot(self, path: str):
+        """
+        Write the documents and the built bm25s model to `path`.
+
+        Tombstoned rows are kept as they are (with the live mask), so a
+        snapshot after a delete does not rebuild the index.
+
+        The snapshot is written to a sibling temp directory and swapped in,
+        so readers never see a half-written snapshot.
+        """
+        state = self.state
+        live = state.live_mask > 0
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_path)
+
+        with open(os.path.join(tmp_path, SNAPSHOT_DOCS_FILE), "w", encoding="utf-8") as f:
+            for row, doc_id in enumerate(state.doc_ids):
+                if live[row]:
+                    f.write(self.docs[doc_id].model_dump_json())
+                    f.write("\n")
+        if state.num_tombstones:
+            np.save(os.path.join(tmp_path, SNAPSHOT_LIVE_FILE), live)
+
+        # Term ids are process-local, so store them against a snapshot-local vocabulary
+        empty = np.zeros(0, dtype=np.int32)
+        seqs = [self.token_ids[doc_id] if live[row] else empty for row, doc_id in enumerate(state.doc_ids)]
+        flat = np.concatenate(seqs) if seqs else np.zeros(0, dtype=np.int32)
+        term_ids, local = np.unique(flat, return_inverse=True)
+        offsets = np.cumsum([0] + [len(seq) for seq in seqs], dtype=np.int64)
+        np.save(os.path.join(tmp_path, SNAPSHOT_TOKEN_IDS_FILE), local.astype(np.int32))
+        np.save(os.path.join(tmp_path, SNAPSHOT_TOKEN_OFFSETS_FILE), offsets)
+        with open(os.path.join(tmp_path, SNAPSHOT_TOKEN_VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump([self.analyzer.terms[t] for t in term_ids.tolist()], f, ensure_ascii=False)
+        with open(os.path.join(tmp_path, SNAPSHOT_TOKEN_SURFACE_FILE), "w", encoding="utf-8") as f:
+            json.dump([self.analyzer.surface_form(t) for t in term_ids.tolist()], f, ensure_ascii=False)
+
+        if state.bm25 is not None:
+            model = state.bm25
+            if state.quantized is not None:
+                # Snapshots keep the bm25s layout; the restore quantizes again
+                model = copy.copy(state.bm25)
+                model.scores = state.quantized.to_scores()
+            model.save(os.path.join(tmp_path, SNAPSHOT_BM25_DIR), show_progress=False)
+
+        old_path = f"{path}.old-{uuid.uuid4().hex}"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load_snapshot(cls, path: str, mmap: bool = False) -> "BM25Index":
+        """
+        Restore an index written by `save_snapshot` without re-tokenizing.
+        With `mmap=True` the score matrix stays on disk and is paged in on use.
+        Snapshots without stored term ids are re-analyzed once.
+        """
+        index = cls()
+        with open(os.path.join(path, SNAPSHOT_DOCS_FILE), encoding="utf-8") as f:
+            docs = [DocumentChunk.model_validate_json(line) for line in f]
+        live_path = os.path.join(path, SNAPSHOT_LIVE_FILE)
+        live = np.load(live_path) if os.path.exists(live_path) else np.ones(len(docs), dtype=bool)
+        live_docs = iter(docs)
+        doc_ids: List[str] = []
+        for row, is_live in enumerate(live.tolist()):
+            if not is_live:
+                # Placeholder id of a tombstoned row; never in docs or rows
+                doc_ids.append(f"\0deleted:{row}")
+                continue
+            doc = next(live_docs)
+            index.docs[doc.id] = doc
+            doc_ids.append(doc.id)
+            key = _position_key(doc)
+            if key is not None:
+                index.positions[key] = doc.id
+        live_ids = [doc_id for row, doc_id in enumerate(doc_ids) if live[row]]
+
+        ids_path = os.path.join(path, SNAPSHOT_TOKEN_IDS_FILE)
+        if os.path.exists(ids_path):
+            with open(os.path.join(path, SNAPSHOT_TOKEN_VOCAB_FILE), encoding="utf-8") as f:
+                to_global = np.array([index.analyzer.intern(t) for t in json.load(f)], dtype=np.int32)
+            surface_path = os.path.join(path, SNAPSHOT_TOKEN_SURFACE_FILE)
+            if os.path.exists(surface_path):
+                with open(surface_path, encoding="utf-8") as f:
+                    for term_id, word in zip(to_global.tolist(), json.load(f)):
+                        index.analyzer.note_surface(term_id, word)
+            flat = to_global[np.load(ids_path)] if len(to_global) else np.zeros(0, dtype=np.int32)
+            offsets = np.load(os.path.join(path, SNAPSHOT_TOKEN_OFFSETS_FILE))
+            for row, doc_id in enumerate(doc_ids):
+                if live[row]:
+                    index.token_ids[doc_id] = flat[offsets[row]:offsets[row + 1]]
+        else:
+            for doc_id in live_ids:
+                index.token_ids[doc_id] = index.analyzer.encode(index.docs[doc_id].content)
+        for doc_id in live_ids:
+            index._count(index.docs[doc_id], +1)
+
+        bm25_path = os.path.join(path, SNAPSHOT_BM25_DIR)
+        if os.path.isdir(bm25_path):
+            import bm25s
+
+            bm25 = bm25s.BM25.load(bm25_path, mmap=mmap, show_progress=False)
+            postings = None
+            if index.positional:
+                empty = np.zeros(0, dtype=np.int32)
+                postings = PositionalIndex.build([index.token_ids.get(doc_id, empty) for doc_id in doc_ids])
+            index.state = index._search_state(doc_ids, live.astype(np.float32), bm25, postings)
+        else:
+            index._new_ids = live_ids
+            index._rebuild_index()
+        return index
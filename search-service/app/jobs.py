@@ -0,0 +1,166 @@
+"""
+Asynchronous ingestion jobs for the Search Service.
+
+Large batchCreate payloads are validated by the endpoint, enqueued as a job
+and applied to the course indexes by a small pool of worker threads, so
+the HTTP request returns immediately instead of running into the request
+deadline. The queue is bounded: when it is full, new jobs are refused and
+the client is asked to retry later.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from .models import DocumentChunk
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue cannot take another job."""
+
+
+@dataclass
+class IngestJob:
+    """Progress of one asynchronous ingestion job."""
+    course_id: str
+    documents: List[DocumentChunk]
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"  # queued | running | succeeded | failed
+    total: int = 0
+    processed: int = 0
+    errors: List[str] = field(default_factory=list)
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    _started: Optional[float] = None
+    _finished: Optional[float] = None
+
+    def __post_init__(self):
+        self.total = len(self.documents)
+
+    @property
+    def docs_per_second(self) -> float:
+        """Ingestion throughput so far."""
+        if self._started is None:
+            return 0.0
+        elapsed = (self._finished or time.monotonic()) - self._started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "course_id": self.course_id,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "docs_per_second": round(self.docs_per_second, 2),
+            "errors": list(self.errors),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Bounded job queue plus worker threads.
+
+    `apply_batch(course_id, docs)` does the actual indexing; it is injected
+    by the app so this module does not depend on how indexes are stored.
+    Documents are applied in slices of `batch_size` so progress is visible
+    and each slice costs a single index rebuild.
+    """
+
+    def __init__(
+        self,
+        apply_batch: Callable[[str, List[DocumentChunk]], None],
+        workers: int = 2,
+        queue_size: int = 64,
+        batch_size: int = 500,
+        max_retained: int = 1000,
+    ):
+        self.apply_batch = apply_batch
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retained = max_retained
+        self._queue: "queue.Queue[IngestJob]" = queue.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, course_id: str, documents: List[DocumentChunk]) -> IngestJob:
+        """
+        Enqueue documents for indexing.
+
+        Raises:
+            QueueFullError: If the queue is at capacity (back-pressure).
+        """
+        self._ensure_workers()
+        job = IngestJob(course_id=course_id, documents=documents)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("Ingestion queue is full")
+            self._jobs[job.id] = job
+            self._evict_finished()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _evict_finished(self):
+        """Forget the oldest finished jobs beyond `max_retained` (caller holds the lock)."""
+        if len(self._jobs) <= self.max_retained:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if self._jobs[job_id].status in ("succeeded", "failed"):
+                del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: IngestJob):
+        job.status = "running"
+        job.started_at = datetime.utcnow().isoformat()
+        job._started = time.monotonic()
+
+        for start in range(0, job.total, self.batch_size):
+            batch = job.documents[start:start + self.batch_size]
+            try:
+                self.apply_batch(job.course_id, batch)
+            except Exception as e:
+                job.errors.append(f"documents {start}-{start + len(batch) - 1}: {e}")
+            else:
+                job.processed += len(batch)
+
+        job._finished = time.monotonic()
+        job.finished_at = datetime.utcnow().isoformat()
+        job.status = "failed" if job.errors else "succeeded"
+        # Release the payload; only progress is kept for status queries
+        job.documents = []
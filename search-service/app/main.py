@@ -6,11 +6,26 @@
 #    - Output: BatchCreateResponse
 #    - Description: Creates or updates a batch of document chunks for a specific course.
 #
+#  - POST /v1/courses/{course_id}/documents:batchCreateAsync
+#    - Input: BatchCreateRequest
+#    - Output: IngestJobStatus (202)
+#    - Description: Enqueues a batch for background indexing; poll GET /v1/jobs/{job_id}.
+#
 #  - POST /v1/courses/{course_id}/documents:search
 #    - Input: SearchRequest
 #    - Output: SearchResponse
 #    - Description: Performs a full-text search on the documents of a specific course.
 #
+#  - POST /v1/courses/{course_id}/documents:suggest
+#    - Input: SuggestRequest
+#    - Output: SuggestResponse
+#    - Description: Search-as-you-type completions from the course's terms and titles.
+#
+#  - POST /v1/courses/{course_id}/documents:batchDelete
+#    - Input: BatchDeleteRequest
+#    - Output: BatchDeleteResponse
+#    - Description: Deletes chunks by id list and/or by source in one step.
+#
 #  - PATCH /v1/courses/{course_id}/documents/{document_id}
 #    - Input: UpdateDocumentChunk
 #    - Output: DocumentChunk
@@ -26,30 +41,49 @@
 #  - Documents are identified by `document_id` in the URL path.
 #
 # Storage:
-#  - The service uses an in-memory dictionary (`course_indices`) to store a BM25Index object for each course.
-#    This is not suitable for production but is acceptable for the current development phase.
+#  - The service keeps a BM25Index object per course in `course_indices`, a CourseIndexManager.
+#    With INDEX_MEMORY_BUDGET_MB set, cold courses are evicted to disk snapshots and reloaded on demand.
 
+import os
+import threading
 from fastapi import FastAPI, HTTPException, Path, Depends
-from typing import Dict, List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from pydantic import BaseModel  # <-- NEW: for RAG-specific response models
 
 from .models import (
     BatchCreateRequest,
     BatchCreateResponse,
+    BatchDeleteRequest,
+    BatchDeleteResponse,
     DocumentChunk,
+    IngestJobStatus,
     SearchRequest,
     SearchResponse,
     SearchResult,
+    SuggestRequest,
+    SuggestResponse,
+    Suggestion,
     UpdateDocumentChunk,
     UserProfile,
     UpsertMeRequest,
 )
-from .index import BM25Index
+from .index import BM25Index, snapshot_path
+from .dedup import DUPLICATE_OF
+from .course_indexes import CourseIndexManager
+from .store import create_store
+from .config import get_settings
 from .auth import get_current_user
 from .roles import is_teacher
 from .monitoring import MonitoringMiddleware, monitoring_service
 from .health import router as health_router
+from .profiling import ProfilingRoute, router as profiling_router
+from .jobs import JobManager, QueueFullError
+from .admission import admit_search, search_admission
+from .deadline import Deadline, get_deadline, ensure_not_expired, is_expired
+from .warmup import WarmupState, warmup_state, snapshot_course_ids, load_warmup_queries
+from .querylog import PopularQueryWarmer, QueryLog
+from .encoding import ResponseEncoder, get_response_encoder
 
 
 app = FastAPI(
@@ -63,23 +97,70 @@ app.add_middleware(MonitoringMiddleware, monitoring_service=monitoring_service)
 
 # Include health monitoring routes
 app.include_router(health_router)
-
-# In-memory storage for course indices
-# In a production environment, you'd use a persistent database.
-course_indices: Dict[str, BM25Index] = {}
+app.include_router(profiling_router)
+
+# Routes declared below can be profiled on demand (see profiling.py)
+app.router.route_class = ProfilingRoute
+
+settings = get_settings()
+
+# Serializes index writes from request threads and ingestion workers
+index_write_lock = threading.RLock()
+
+# Source of truth for documents and profiles; indexes are rebuilt from it
+store = create_store(settings)
+
+def load_course_from_store(course_id: str) -> BM25Index:
+    """Build a course index by streaming its documents out of the store."""
+    index = BM25Index()
+    index.load_documents(store.iter_documents(course_id))
+    return index
+
+# Course indices, evicted to disk snapshots under memory pressure
+course_indices = CourseIndexManager(
+    memory_budget_bytes=settings.INDEX_MEMORY_BUDGET_MB * 1024 * 1024,
+    snapshot_dir=settings.SEARCH_SNAPSHOT_DIR,
+    pinned=[c.strip() for c in settings.INDEX_PINNED_COURSES.split(",") if c.strip()],
+    write_lock=index_write_lock,
+    mmap=settings.INDEX_SNAPSHOT_MMAP,
+    loader=load_course_from_store,
+    persist_delay=settings.SEARCH_SNAPSHOT_DELAY_SECONDS,
+    # The cross-course index and the shared vocabulary stay resident
+    shared_bytes=lambda: global_index.memory_bytes() + global_index.analyzer.memory_bytes(),
+)
+monitoring_service.register_section("course_indexes", course_indices.stats)
+monitoring_service.register_section("admission", search_admission.stats)
 global_index = BM25Index()
-user_profiles: Dict[str, UserProfile] = {}
+
+# What students search for, and re-running the popular queries after reindexing
+query_log = QueryLog(
+    settings.QUERY_LOG_DIR,
+    capacity=settings.QUERY_LOG_BUFFER_SIZE,
+    flush_interval=settings.QUERY_LOG_FLUSH_SECONDS,
+    max_bytes=settings.QUERY_LOG_MAX_BYTES,
+    backups=settings.QUERY_LOG_BACKUPS,
+)
+query_warmer = PopularQueryWarmer(
+    query_log, lambda course_id: course_indices.resident().get(course_id), settings.QUERY_WARM_TOP_N
+)
+monitoring_service.register_section("query_log", query_log.stats)
+
+@app.on_event("shutdown")
+def close_store():
+    query_log.stop()
+    course_indices.flush()
+    store.close()
 
 @app.get("/v1/users/me", response_model=UserProfile)
 def get_me(current_user: dict = Depends(get_current_user)):
     uid = current_user["uid"]
-    return user_profiles.get(uid) or UserProfile(uid=uid, role=current_user.get("role", "student"))
+    return store.get_profile(uid) or UserProfile(uid=uid, role=current_user.get("role", "student"))
 
 
 @app.post("/v1/users/me", response_model=UserProfile)
 def upsert_me(payload: UpsertMeRequest, current_user: dict = Depends(get_current_user)):
     uid = current_user["uid"]
-    existing = user_profiles.get(uid) or UserProfile(uid=uid, role=current_user.get("role", "student"))
+    existing = store.get_profile(uid) or UserProfile(uid=uid, role=current_user.get("role", "student"))
 
     data = payload.model_dump(exclude_unset=True)
     updated = existing.model_copy(update={
@@ -90,15 +171,122 @@ def upsert_me(payload: UpsertMeRequest, current_user: dict = Depends(get_current
         "updated_at": datetime.utcnow().isoformat()
     })
 
-    user_profiles[uid] = updated
+    store.put_profile(updated)
     return updated
 
 
 
 def get_course_index(course_id: str) -> BM25Index:
-    if course_id not in course_indices:
-        course_indices[course_id] = BM25Index()
-    return course_indices[course_id]
+    return course_indices.get(course_id)
+
+def persist_course_index(course_id: str):
+    """
+    Schedule a snapshot of a course index to SEARCH_SNAPSHOT_DIR (if
+    configured) so other processes, e.g. rag-service in embedded mode, can
+    load it directly. The snapshot is taken in the background at most
+    SEARCH_SNAPSHOT_DELAY_SECONDS later, covering every write until then.
+    Call after every write, with index_write_lock held. Also schedules
+    the course's popular queries against the rebuilt index.
+    """
+    course_indices.note_write(course_id)
+    query_warmer.request(course_id)
+    if settings.SEARCH_SNAPSHOT_DIR:
+        course_indices.schedule_persist(course_id)
+
+def apply_documents(course_id: str, documents: List[DocumentChunk]):
+    """
+    Write documents to the store, then upsert them into the course and
+    global indexes with one rebuild each.
+
+    With INGEST_DEDUP, near-duplicates of the course's chunks (or of an
+    earlier chunk of the batch) get metadata.duplicate_of set to the
+    canonical chunk's id; "collapse" then leaves them out of the store and
+    the indexes, dropping an older version of the same id if there is one.
+    """
+    for doc in documents:
+        doc.course_id = course_id
+    with index_write_lock:
+        index = get_course_index(course_id)
+        if settings.INGEST_DEDUP in ("flag", "collapse"):
+            duplicates = index.find_duplicates(documents)
+            for doc in documents:
+                if doc.id in duplicates:
+                    doc.metadata[DUPLICATE_OF] = duplicates[doc.id]
+                else:
+                    doc.metadata.pop(DUPLICATE_OF, None)
+            if settings.INGEST_DEDUP == "collapse" and duplicates:
+                stale = index.delete_many([doc_id for doc_id in duplicates if doc_id in index.docs])
+                store.delete_many(course_id, stale)
+                global_index.delete_many(stale)
+                documents = [doc for doc in documents if doc.id not in duplicates]
+        store.put_many(documents)
+        index.upsert_many(documents)
+        global_index.upsert_many(documents)
+        persist_course_index(course_id)
+
+job_manager = JobManager(
+    apply_documents,
+    workers=settings.INGEST_WORKERS,
+    queue_size=settings.INGEST_QUEUE_SIZE,
+    batch_size=settings.INGEST_BATCH_SIZE,
+)
+
+def run_warmup(state: WarmupState):
+    """
+    Restore course indexes (pinned courses first, while the memory budget
+    allows) from their snapshots or, without one, from the document store.
+    Rebuild the cross-course index, page in memory-mapped scores and run
+    the warmup queries and the most logged queries against every restored
+    course.
+    """
+    query_log.load()
+    course_ids = sorted(set(snapshot_course_ids(settings.SEARCH_SNAPSHOT_DIR)) | set(store.course_ids()))
+    course_ids.sort(key=lambda c: c not in course_indices.pinned)
+
+    restored_docs: List[DocumentChunk] = []
+    for course_id in course_ids:
+        with index_write_lock:
+            if course_indices.has_room() or course_id in course_indices.pinned:
+                index = get_course_index(course_id)
+                if store.persistent and len(index.docs) != store.count(course_id):
+                    # Snapshot missed writes (e.g. crash before it was rewritten)
+                    index = load_course_from_store(course_id)
+                    course_indices.replace(course_id, index)
+                docs = index.docs
+                state.courses_restored += 1
+            elif store.persistent:
+                continue
+            else:
+                # Stays on disk until first queried, but is still searchable globally
+                path = snapshot_path(settings.SEARCH_SNAPSHOT_DIR, course_id)
+                docs = BM25Index.load_snapshot(path).docs
+            if not store.persistent:
+                restored_docs.extend(docs.values())
+
+    with index_write_lock:
+        if store.persistent:
+            global_index.load_documents(store.iter_documents())
+        elif restored_docs:
+            global_index.upsert_many(restored_docs)
+        course_indices.refresh_shared_bytes()
+
+    resident = course_indices.resident()
+    for index in resident.values():
+        index.touch_pages()
+
+    # Without warmup queries, one throwaway query still warms the retrieval path
+    queries = load_warmup_queries(settings.WARMUP_QUERIES_FILE) or ["warmup"]
+    for index in [*resident.values(), global_index]:
+        for query in queries:
+            index.search(query, k=10)
+            state.queries_primed += 1
+    for course_id, index in resident.items():
+        state.queries_primed += query_warmer.warm(course_id, index)
+
+@app.on_event("startup")
+def start_warmup():
+    query_log.start()
+    warmup_state.start(run_warmup)
 
 def get_allowed_course_ids(current_user: dict) -> Optional[set[str]]:
     """
@@ -112,7 +300,7 @@ def get_allowed_course_ids(current_user: dict) -> Optional[set[str]]:
         return None
 
     uid = current_user["uid"]
-    profile = user_profiles.get(uid)
+    profile = store.get_profile(uid)
 
     if not profile or not profile.courses:
         raise HTTPException(
@@ -130,25 +318,63 @@ def batch_create(
     request: BatchCreateRequest,
     current_user: dict = Depends(is_teacher),
 ):
-    index = get_course_index(course_id)
-    created_documents = []
+    apply_documents(course_id, request.documents)
+    return BatchCreateResponse(documents=request.documents)
+
+@app.post(
+    "/v1/courses/{course_id}/documents:batchCreateAsync",
+    response_model=IngestJobStatus,
+    status_code=202,
+)
+def batch_create_async(
+    course_id: str,
+    request: BatchCreateRequest,
+    current_user: dict = Depends(is_teacher),
+):
+    """
+    Validate and enqueue a batch for background indexing.
+
+    Returns the job immediately; poll GET /v1/jobs/{job_id} for progress.
+    Responds 503 with Retry-After when the ingestion queue is full.
+    """
     for doc in request.documents:
         doc.course_id = course_id
-        index.upsert(doc)
-        global_index.upsert(doc)
-        created_documents.append(doc)
-    return BatchCreateResponse(documents=created_documents)
+    try:
+        job = job_manager.submit(course_id, request.documents)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue is full, retry later",
+            headers={"Retry-After": "5"},
+        )
+    return job.to_dict()
+
+@app.get("/v1/jobs/{job_id}", response_model=IngestJobStatus)
+def get_job(
+    job_id: str,
+    current_user: dict = Depends(is_teacher),
+):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @app.post("/v1/documents:search", response_model=SearchResponse)
 def search_all_courses(
     request: SearchRequest,
     current_user: dict = Depends(get_current_user),
+    deadline: Optional[Deadline] = Depends(get_deadline),
+    _admitted: None = Depends(admit_search),
+    encoder: ResponseEncoder = Depends(get_response_encoder),
 ):
-
+    ensure_not_expired(deadline)
     allowed = get_allowed_course_ids(current_user)
 
     # pull more than page_size so filtering still leaves enough results
-    raw = global_index.search(query=request.query, k=request.page_size * 5)
+    corrected = global_index.correct_query(request.query) if request.fuzzy else None
+    raw = global_index.search(query=corrected or request.query, k=request.page_size * 5)
+    # The search itself is not interrupted; a deadline it overran is reported
+    partial = is_expired(deadline)
 
     if allowed is not None:
         raw = [(doc, score) for (doc, score) in raw if doc.course_id in allowed]
@@ -156,7 +382,7 @@ def search_all_courses(
     results = raw[: request.page_size]
 
     search_results = [
-        SearchResult(
+        SearchResult.model_construct(
             id=doc.id,
             score=score,
             course_id=doc.course_id,
@@ -169,10 +395,14 @@ def search_all_courses(
         for doc, score in results
     ]
 
-    return SearchResponse(
-        query=request.query,
-        mode=request.mode,
-        results=search_results,
+    return encoder.render(
+        SearchResponse.model_construct(
+            query=request.query,
+            mode=request.mode,
+            results=search_results,
+            partial=partial,
+            corrected_query=corrected,
+        )
     )
 
 @app.post("/v1/courses/{course_id}/documents:search", response_model=SearchResponse)
@@ -180,12 +410,20 @@ def search(
     course_id: str,
     request: SearchRequest,
     current_user: dict = Depends(get_current_user),
+    deadline: Optional[Deadline] = Depends(get_deadline),
+    _admitted: None = Depends(admit_search),
+    encoder: ResponseEncoder = Depends(get_response_encoder),
 ):
+    ensure_not_expired(deadline)
     index = get_course_index(course_id)
-    results = index.search(query=request.query, k=request.page_size)
+    corrected = index.correct_query(request.query) if request.fuzzy else None
+    results = index.search(query=corrected or request.query, k=request.page_size)
+    # The search itself is not interrupted; a deadline it overran is reported
+    partial = is_expired(deadline)
+    query_log.record(course_id, request.query, len(results))
 
     search_results = [
-        SearchResult(
+        SearchResult.model_construct(
             id=doc.id,
             score=score,
             course_id=doc.course_id,
@@ -198,13 +436,36 @@ def search(
         for doc, score in results
     ]
 
-    return SearchResponse(
-        query=request.query,
-        mode=request.mode,
-        results=search_results,
+    return encoder.render(
+        SearchResponse.model_construct(
+            query=request.query,
+            mode=request.mode,
+            results=search_results,
+            partial=partial,
+            corrected_query=corrected,
+        )
     )
 
 
+@app.post("/v1/courses/{course_id}/documents:suggest", response_model=SuggestResponse)
+def suggest(
+    course_id: str,
+    request: SuggestRequest,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Completions of a partially typed query, ranked by document frequency.
+    Meant to be called on every keystroke: it only reads a prefix index and
+    is not subject to the search rate limits.
+    """
+    index = get_course_index(course_id)
+    suggestions = [
+        Suggestion(text=text, kind=kind, doc_freq=doc_freq)
+        for text, kind, doc_freq in index.suggest(request.prefix, limit=request.limit)
+    ]
+    return SuggestResponse(prefix=request.prefix, suggestions=suggestions)
+
+
 @app.patch("/v1/courses/{course_id}/documents/{document_id}", response_model=DocumentChunk)
 def update_document(
     course_id: str,
@@ -223,8 +484,13 @@ def update_document(
     updated_doc = existing_doc.model_copy(update=update_data)
     updated_doc.updated_at = datetime.utcnow().isoformat()
 
-    index.upsert(updated_doc)
-    global_index.upsert(updated_doc)
+    with index_write_lock:
+        # Re-fetch: the index may have been evicted and reloaded meanwhile
+        index = get_course_index(course_id)
+        store.put_many([updated_doc])
+        index.upsert(updated_doc)
+        global_index.upsert(updated_doc)
+        persist_course_index(course_id)
 
     return updated_doc
 
@@ -240,12 +506,46 @@ def delete_document(
     if document_id not in index.docs:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    index.delete(document_id)
-    global_index.delete(document_id)
+    with index_write_lock:
+        index = get_course_index(course_id)
+        store.delete_many(course_id, [document_id])
+        index.delete(document_id)
+        global_index.delete(document_id)
+        persist_course_index(course_id)
 
     return None
 
 
+@app.post("/v1/courses/{course_id}/documents:batchDelete", response_model=BatchDeleteResponse)
+def batch_delete(
+    course_id: str,
+    request: BatchDeleteRequest,
+    current_user: dict = Depends(is_teacher),
+):
+    """
+    Delete many chunks at once, e.g. every chunk of an outdated lecture.
+
+    Documents are tombstoned in a single pass; the indexes compact at most
+    once at the end instead of rebuilding per document.
+    """
+    if not request.ids and request.source is None:
+        raise HTTPException(status_code=400, detail="Provide ids and/or source")
+
+    with index_write_lock:
+        index = get_course_index(course_id)
+        doc_ids = list(request.ids)
+        if request.source is not None:
+            doc_ids += [doc_id for doc_id, doc in index.docs.items() if doc.source == request.source]
+
+        deleted = index.delete_many(list(dict.fromkeys(doc_ids)))
+        store.delete_many(course_id, deleted)
+        global_index.delete_many(deleted)
+        if deleted:
+            persist_course_index(course_id)
+
+    return BatchDeleteResponse(deleted_ids=deleted)
+
+
 # -------------------------------------------------------------------
 # RAG-specific retrieval endpoint
 # -------------------------------------------------------------------
@@ -260,12 +560,64 @@ class RagSearchResult(BaseModel):
     title: Optional[str] = None
     content: str
     metadata: Optional[dict] = None
+    # Set on expanded neighbours: id of the hit that pulled this chunk in
+    neighbor_of: Optional[str] = None
 
 
 class RagSearchResponse(BaseModel):
     query: str
     mode: str  # reuse SearchRequest.mode for now
     results: List[RagSearchResult]
+    # Neighbouring chunks of the hits (request.expand > 0), deduplicated
+    neighbors: List[RagSearchResult] = []
+    # True when the caller's deadline passed during the search or cut
+    # neighbour expansion short
+    partial: bool = False
+    # Set when fuzzy=true changed the query: what was actually searched
+    corrected_query: Optional[str] = None
+
+
+def expand_neighbors(
+    index: BM25Index, results, radius: int, deadline: Optional[Deadline] = None
+) -> Tuple[List[RagSearchResult], bool]:
+    """
+    Collect the +/- `radius` neighbours of every hit through the index's
+    (course_id, source, chunk_index) lookup. Chunks that are hits themselves
+    or were already added for an earlier (higher ranked) hit are skipped.
+
+    Returns the neighbours and whether the deadline has passed (before or
+    during expansion).
+    """
+    # Checked first: a deadline that passed during the search marks the
+    # response partial even when nothing is to be expanded
+    if is_expired(deadline):
+        return [], True
+    if radius <= 0:
+        return [], False
+
+    seen = {doc.id for doc, _ in results}
+    neighbors: List[RagSearchResult] = []
+    for doc, score in results:
+        if is_expired(deadline):
+            return neighbors, True
+        for neighbor in index.neighbors(doc, radius):
+            if neighbor.id in seen:
+                continue
+            seen.add(neighbor.id)
+            neighbors.append(
+                RagSearchResult.model_construct(
+                    id=neighbor.id,
+                    score=0.0,
+                    course_id=neighbor.course_id,
+                    source=neighbor.source,
+                    chunk_index=neighbor.chunk_index,
+                    title=neighbor.title,
+                    content=neighbor.content,
+                    metadata=neighbor.metadata,
+                    neighbor_of=doc.id,
+                )
+            )
+    return neighbors, False
 
 
 @app.post("/v1/courses/{course_id}/documents:ragSearch", response_model=RagSearchResponse)
@@ -273,6 +625,9 @@ def rag_search(
     course_id: str,
     request: SearchRequest,
     current_user: dict = Depends(get_current_user),
+    deadline: Optional[Deadline] = Depends(get_deadline),
+    _admitted: None = Depends(admit_search),
+    encoder: ResponseEncoder = Depends(get_response_encoder),
 ):
     """
     RAG-oriented retrieval endpoint.
@@ -280,12 +635,26 @@ def rag_search(
     Same input shape as /documents:search, but returns the *full* chunk content
     for each hit instead of just a short snippet. This is what the RAG service
     will call to build its LLM context.
+
+    With `expand=N` the response also carries the +/- N neighbouring chunks
+    of every hit in `neighbors`, saving the caller extra round trips.
+
+    If the caller sent a deadline (X-Request-Deadline-Ms) that passed during
+    the search, the hits are returned without neighbours and partial=true;
+    if it passes while expanding, with the neighbours gathered so far.
+
+    The response is JSON or MessagePack and possibly compressed, as
+    negotiated from Accept / Accept-Encoding (see encoding.py).
     """
+    ensure_not_expired(deadline)
     index = get_course_index(course_id)
-    results = index.search(query=request.query, k=request.page_size)
+    corrected = index.correct_query(request.query) if request.fuzzy else None
+    results = index.search(query=corrected or request.query, k=request.page_size)
+    query_log.record(course_id, request.query, len(results))
 
+    # Chunks were validated at ingest; the encoder serializes them as they are
     rag_results = [
-        RagSearchResult(
+        RagSearchResult.model_construct(
             id=doc.id,
             score=score,
             course_id=doc.course_id,
@@ -298,21 +667,33 @@ def rag_search(
         for doc, score in results
     ]
 
-    return RagSearchResponse(
-        query=request.query,
-        mode=request.mode,
-        results=rag_results,
+    neighbors, partial = expand_neighbors(index, results, request.expand, deadline)
+
+    return encoder.render(
+        RagSearchResponse.model_construct(
+            query=request.query,
+            mode=request.mode,
+            results=rag_results,
+            neighbors=neighbors,
+            partial=partial,
+            corrected_query=corrected,
+        )
     )
 
 @app.post("/v1/documents:ragSearch", response_model=RagSearchResponse)
 def rag_search_all_courses(
     request: SearchRequest,
     current_user: dict = Depends(get_current_user),
+    deadline: Optional[Deadline] = Depends(get_deadline),
+    _admitted: None = Depends(admit_search),
+    encoder: ResponseEncoder = Depends(get_response_encoder),
 ):
+    ensure_not_expired(deadline)
     allowed = get_allowed_course_ids(current_user)
 
     # pull more than page_size so filtering still leaves enough results
-    raw = global_index.search(query=request.query, k=request.page_size * 5)
+    corrected = global_index.correct_query(request.query) if request.fuzzy else None
+    raw = global_index.search(query=corrected or request.query, k=request.page_size * 5)
 
     if allowed is not None:
         raw = [(doc, score) for (doc, score) in raw if doc.course_id in allowed]
@@ -320,7 +701,7 @@ def rag_search_all_courses(
     results = raw[: request.page_size]
 
     rag_results = [
-        RagSearchResult(
+        RagSearchResult.model_construct(
             id=doc.id,
             score=score,
             course_id=doc.course_id,
@@ -333,14 +714,19 @@ def rag_search_all_courses(
         for doc, score in results
     ]
 
-    return RagSearchResponse(
-        query=request.query,
-        mode=request.mode,
-        results=rag_results,
-    )
+    neighbors, partial = expand_neighbors(global_index, results, request.expand, deadline)
 
+    return encoder.render(
+        RagSearchResponse.model_construct(
+            query=request.query,
+            mode=request.mode,
+            results=rag_results,
+            neighbors=neighbors,
+            partial=partial,
+            corrected_query=corrected,
+        )
+    )
 
-import os
 
 if os.getenv("TEST_AUTH_BYPASS") == "1":
     # Only for local E2E runs. Do NOT set in production.
@@ -25,6 +25,26 @@ class BatchCreateRequest(BaseModel):
 class BatchCreateResponse(BaseModel):
     documents: List[DocumentChunk]
 
+class BatchDeleteRequest(BaseModel):
+    # Delete these ids and/or every chunk of this source
+    ids: List[str] = Field(default_factory=list)
+    source: Optional[str] = None
+
+class BatchDeleteResponse(BaseModel):
+    deleted_ids: List[str]
+
+class IngestJobStatus(BaseModel):
+    id: str
+    course_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    total: int
+    processed: int
+    docs_per_second: float
+    errors: List[str]
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
 class SearchResult(BaseModel):
     id: str
     score: float
@@ -35,16 +55,45 @@ class SearchResult(BaseModel):
     snippet: str 
     metadata: Dict[str, Any]
 
+# Server-side caps on search requests. Queries may be whole chat turns
+# (rag-service); scoring cost is bounded by SEARCH_MAX_QUERY_TERMS instead
+MAX_PAGE_SIZE = 100
+MAX_QUERY_LENGTH = 16000
+
 class SearchRequest(BaseModel):
-    query: str
-    page_size: int = 10
+    query: str = Field(max_length=MAX_QUERY_LENGTH)
+    page_size: int = Field(default=10, ge=1, le=MAX_PAGE_SIZE)
     mode: Literal["lexical", "vector", "hybrid"] = "lexical"
+    # ragSearch only: also return +/- `expand` neighbouring chunks of each hit
+    expand: int = Field(default=0, ge=0, le=5)
+    # Correct misspelled terms against the index vocabulary before searching
+    fuzzy: bool = False
 
 class SearchResponse(BaseModel):
     query: str
     mode: Literal["lexical", "vector", "hybrid"]
     results: List[SearchResult]
     next_page_token: Optional[str] = None
+    # True when the caller's deadline passed during the search (results are late)
+    partial: bool = False
+    # Set when fuzzy=true changed the query: what was actually searched
+    corrected_query: Optional[str] = None
+
+MAX_SUGGEST_PREFIX_LENGTH = 100
+MAX_SUGGESTIONS = 50
+
+class SuggestRequest(BaseModel):
+    prefix: str = Field(max_length=MAX_SUGGEST_PREFIX_LENGTH)
+    limit: int = Field(default=10, ge=1, le=MAX_SUGGESTIONS)
+
+class Suggestion(BaseModel):
+    text: str
+    kind: Literal["term", "title"]
+    doc_freq: int
+
+class SuggestResponse(BaseModel):
+    prefix: str
+    suggestions: List[Suggestion]
 
 class UpdateDocumentChunk(BaseModel):
     source: Optional[str] = None
@@ -4,22 +4,20 @@ Monitoring service for the Search Service.
 Tracks request metrics, system resources, and provides health data.
 """
 
+import importlib.util
 import time
 import platform
 import sys
 from datetime import datetime
-from typing import Dict, Any
+from typing import Callable, Dict, Any
 from dataclasses import dataclass, field
 from threading import Lock
 
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
-try:
-    import psutil
-    HAS_PSUTIL = True
-except ImportError:
-    HAS_PSUTIL = False
+# psutil is optional and imported on first use (it is only needed for health data)
+HAS_PSUTIL = importlib.util.find_spec("psutil") is not None
 
 
 @dataclass
@@ -64,6 +62,11 @@ class MonitoringService:
         self._lock = Lock()
         self._start_time = time.time()
         self._request_metrics = RequestMetrics()
+        self._sections: Dict[str, Callable[[], Any]] = {}
+
+    def register_section(self, name: str, provider: Callable[[], Any]) -> None:
+        """Add a named section, computed by `provider`, to the health data."""
+        self._sections[name] = provider
 
     def record_request(self, response_time: float, status_code: int) -> None:
         """Thread-safe request recording."""
@@ -96,6 +99,8 @@ class MonitoringService:
         """Get this process's resource usage. Returns zeros if psutil unavailable."""
         if HAS_PSUTIL:
             try:
+                import psutil
+
                 process = psutil.Process()
                 cpu_percent = process.cpu_percent(interval=0.1)
                 memory_info = process.memory_info()
@@ -148,7 +153,8 @@ class MonitoringService:
                 "memory_mb": process_stats["memory_mb"],
                 "psutil_available": process_stats["psutil_available"]
             },
-            "environment": env_info
+            "environment": env_info,
+            **{name: provider() for name, provider in self._sections.items()},
         }
 
 
@@ -0,0 +1,152 @@
+"""
+Positional postings for phrase and proximity scoring.
+
+bm25s only keeps per-document term weights. `PositionalIndex` adds, for
+every term, the rows of the documents it occurs in and its positions in
+each of them, built from the term ids BM25Index already stores (positions
+count indexed words, so stopwords do not break a phrase).
+
+Layout, all flat numpy arrays:
+
+- `term_ids`: sorted analyzer term ids; a term's index `t` in it selects
+  postings `term_ptr[t]:term_ptr[t + 1]`,
+- `doc_deltas`: per posting, the document row minus the previous row of
+  the same term (the first one absolute),
+- `pos_ptr`: per posting, its slice of `pos_deltas`, which hold the
+  positions minus the previous position in the same document.
+
+Deltas are small, so they are stored in the narrowest unsigned dtype that
+fits, and decoded with a cumulative sum for the few terms of a query.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def _compact(values: np.ndarray) -> np.ndarray:
+    """`values` (non-negative) in the narrowest unsigned integer dtype that holds them."""
+    top = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if top <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+
+def _deltas(values: np.ndarray, restart: np.ndarray) -> np.ndarray:
+    """Differences to the previous value, restarting (absolute) where `restart` is set."""
+    out = values.copy()
+    out[1:] -= values[:-1]
+    out[restart] = values[restart]
+    return out
+
+
+def min_distance(a: np.ndarray, b: np.ndarray) -> int:
+    """Smallest |x - y| between two sorted, non-empty position arrays."""
+    idx = np.searchsorted(b, a)
+    after = b[np.minimum(idx, len(b) - 1)] - a
+    before = a - b[np.maximum(idx - 1, 0)]
+    return int(min(np.abs(after).min(), np.abs(before).min()))
+
+
+class PositionalIndex:
+    """Delta-encoded term -> (document row, positions) postings of one BM25 index."""
+
+    def __init__(self, term_ids, term_ptr, doc_deltas, pos_ptr, pos_deltas):
+        self.term_ids = term_ids
+        self.term_ptr = term_ptr
+        self.doc_deltas = doc_deltas
+        self.pos_ptr = pos_ptr
+        self.pos_deltas = pos_deltas
+
+    @classmethod
+    def build(cls, seqs: Sequence[np.ndarray]) -> "PositionalIndex":
+        """Build from the term id sequence of every row, in row order."""
+        lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=len(seqs))
+        flat = np.concatenate(seqs).astype(np.int64) if len(seqs) else _EMPTY
+        rows = np.repeat(np.arange(len(seqs), dtype=np.int64), lengths)
+        positions = np.arange(len(flat), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        term_ids, local = np.unique(flat, return_inverse=True)
+        # Stable sort by term keeps (row, position) order within each term
+        order = np.argsort(local, kind="stable")
+        terms, rows, positions = local[order], rows[order], positions[order]
+
+        new_posting = np.ones(len(terms), dtype=bool)
+        new_posting[1:] = (terms[1:] != terms[:-1]) | (rows[1:] != rows[:-1])
+        starts = np.flatnonzero(new_posting)
+        post_terms, post_rows = terms[starts], rows[starts]
+        new_term = np.ones(len(starts), dtype=bool)
+        new_term[1:] = post_terms[1:] != post_terms[:-1]
+
+        return cls(
+            term_ids=term_ids.astype(np.int32),
+            term_ptr=_compact(np.searchsorted(post_terms, np.arange(len(term_ids) + 1))),
+            doc_deltas=_compact(_deltas(post_rows, new_term)),
+            pos_ptr=_compact(np.append(starts, len(terms))),
+            pos_deltas=_compact(_deltas(positions, new_posting)),
+        )
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.term_ids, self.term_ptr, self.doc_deltas, self.pos_ptr, self.pos_deltas))
+
+    def _term(self, term_id: Optional[int]) -> int:
+        """Index of an analyzer term id in `term_ids`, or -1."""
+        if term_id is None:
+            return -1
+        t = int(np.searchsorted(self.term_ids, term_id))
+        return t if t < len(self.term_ids) and self.term_ids[t] == term_id else -1
+
+    def _postings(self, t: int):
+        """(document rows, first posting index) of local term `t`."""
+        start, end = int(self.term_ptr[t]), int(self.term_ptr[t + 1])
+        return np.cumsum(self.doc_deltas[start:end], dtype=np.int64), start
+
+    def _positions(self, posting: int) -> np.ndarray:
+        start, end = int(self.pos_ptr[posting]), int(self.pos_ptr[posting + 1])
+        return np.cumsum(self.pos_deltas[start:end], dtype=np.int64)
+
+    def positions(self, term_id: Optional[int], rows: np.ndarray) -> Dict[int, np.ndarray]:
+        """Positions of a term in each of the given rows that contain it."""
+        t = self._term(term_id)
+        if t < 0:
+            return {}
+        post_rows, first = self._postings(t)
+        idx = np.searchsorted(post_rows, rows)
+        found = {}
+        for row, i in zip(rows.tolist(), idx.tolist()):
+            if i < len(post_rows) and post_rows[i] == row:
+                found[row] = self._positions(first + i)
+        return found
+
+    def _occurrences(self, t: int) -> np.ndarray:
+        """Every occurrence of local term `t` as a sorted `row << 32 | position` key."""
+        start, end = int(self.term_ptr[t]), int(self.term_ptr[t + 1])
+        post_rows = np.cumsum(self.doc_deltas[start:end], dtype=np.int64)
+        bounds = self.pos_ptr[start:end + 1].astype(np.int64)
+        counts = np.diff(bounds)
+        # Cumulative sum over all postings, minus its value where each posting starts
+        totals = np.cumsum(self.pos_deltas[bounds[0]:bounds[-1]], dtype=np.int64)
+        before = np.concatenate(([0], totals))[bounds[:-1] - bounds[0]]
+        positions = totals - np.repeat(before, counts)
+        return (np.repeat(post_rows, counts) << 32) | positions
+
+    def phrase_rows(self, term_ids: List[Optional[int]]) -> np.ndarray:
+        """Rows in which the terms occur at consecutive positions, in order."""
+        if not term_ids:
+            return _EMPTY
+        local = [self._term(term_id) for term_id in term_ids]
+        if min(local) < 0:
+            return _EMPTY
+
+        # Shift the i-th term's occurrences back by i: a phrase match is a
+        # key present for every term
+        starts = None
+        for offset in sorted(range(len(local)), key=lambda i: self.term_ptr[local[i] + 1] - self.term_ptr[local[i]]):
+            keys = self._occurrences(local[offset]) - offset
+            starts = keys if starts is None else np.intersect1d(starts, keys, assume_unique=True)
+            if not len(starts):
+                break
+        return np.unique(starts >> 32)
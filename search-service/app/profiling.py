@@ -0,0 +1,241 @@
+"""
+Opt-in request profiling for the Search Service.
+
+A request is profiled when it carries the admin token in `X-Profile-Token`
+(PROFILING_ADMIN_TOKEN) or is picked by random sampling
+(PROFILING_SAMPLE_RATE). Profiling uses a stack sampler: a background
+thread records the Python stacks of the threads serving the request (the
+event loop thread, which parses the request and serializes the response,
+and the worker thread running the endpoint) every PROFILING_INTERVAL_MS.
+Other coroutines running on the event loop at the same time can show up
+in its samples.
+
+Results are kept in a bounded in-memory ring and exposed under
+/debug/profiles as collapsed stacks (flamegraph.pl / speedscope input) or
+JSON. Profiled responses carry the profile id in `X-Profile-Id`.
+"""
+
+import asyncio
+import contextvars
+import functools
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+from .config import get_settings
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+settings = get_settings()
+
+
+def _frame_stack(frame) -> str:
+    """Collapsed representation of a stack, outermost frame first."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples the stacks of a set of threads until stopped."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000.0
+        self.thread_ids: set = set()
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def add_thread(self, thread_id: int):
+        self.thread_ids.add(thread_id)
+
+    def remove_thread(self, thread_id: int):
+        self.thread_ids.discard(thread_id)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples[_frame_stack(frame)] += 1
+
+
+class ProfileStore:
+    """Bounded ring of finished profiles, newest last."""
+
+    def __init__(self, capacity: int = 50):
+        self._profiles: Deque[dict] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def add(self, profile: dict):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [{k: v for k, v in p.items() if k != "samples"} for p in reversed(self._profiles)]
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            return next((p for p in self._profiles if p["id"] == profile_id), None)
+
+
+profile_store = ProfileStore(settings.PROFILING_RING_SIZE)
+
+# Sampler of the request being profiled, visible to its endpoint thread
+_current_sampler: contextvars.ContextVar[Optional[StackSampler]] = contextvars.ContextVar(
+    "current_sampler", default=None
+)
+
+
+def _profiling_reason(request: Request) -> Optional[str]:
+    token = request.headers.get(PROFILE_TOKEN_HEADER)
+    if token and settings.PROFILING_ADMIN_TOKEN and secrets.compare_digest(token, settings.PROFILING_ADMIN_TOKEN):
+        return "admin"
+    if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _profiled_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a sync endpoint so the worker thread running it gets sampled too."""
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        sampler = _current_sampler.get()
+        if sampler is None:
+            return endpoint(*args, **kwargs)
+        thread_id = threading.get_ident()
+        sampler.add_thread(thread_id)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            sampler.remove_thread(thread_id)
+
+    return wrapper
+
+
+class ProfilingRoute(APIRoute):
+    """APIRoute that profiles requests selected by `_profiling_reason`."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = _profiled_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request: Request) -> Response:
+            reason = _profiling_reason(request)
+            if reason is None:
+                return await handler(request)
+
+            sampler = StackSampler(settings.PROFILING_INTERVAL_MS)
+            sampler.add_thread(threading.get_ident())
+            token = _current_sampler.set(sampler)
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                response = await handler(request)
+            finally:
+                sampler.stop()
+                _current_sampler.reset(token)
+
+            profile_id = str(uuid.uuid4())
+            profile_store.add({
+                "id": profile_id,
+                "method": request.method,
+                "path": request.url.path,
+                "reason": reason,
+                "status_code": response.status_code,
+                "created_at": datetime.utcnow().isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "sample_count": sum(sampler.samples.values()),
+                "samples": dict(sampler.samples),
+            })
+            response.headers[PROFILE_ID_HEADER] = profile_id
+            return response
+
+        return profiled_handler
+
+
+def _top_functions(samples: Dict[str, int], limit: int = 30) -> List[dict]:
+    """Functions by samples spent in them (self) and under them (total)."""
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    for stack, count in samples.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for name in set(frames):
+            total_counts[name] += count
+    return [
+        {"function": name, "self_samples": self_counts[name], "total_samples": total}
+        for name, total in total_counts.most_common(limit)
+    ]
+
+
+def require_profiling_admin(
+    token: Optional[str] = Header(default=None, alias=PROFILE_TOKEN_HEADER),
+) -> None:
+    """
+    FastAPI dependency guarding the debug endpoints.
+
+    Raises:
+        HTTPException(404): If no admin token is configured.
+        HTTPException(403): If the request does not carry it.
+    """
+    if not settings.PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not token or not secrets.compare_digest(token, settings.PROFILING_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+router = APIRouter(prefix="/debug/profiles", dependencies=[Depends(require_profiling_admin)])
+
+
+@router.get("")
+def list_profiles() -> List[dict]:
+    """Metadata of the stored profiles, newest first."""
+    return profile_store.list()
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str, format: str = "json"):
+    """
+    Download a profile: `format=collapsed` returns one `stack count` line
+    per distinct stack, `format=json` the metadata plus the top functions.
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "collapsed":
+        lines = [f"{stack} {count}" for stack, count in sorted(profile["samples"].items())]
+        return PlainTextResponse("\n".join(lines) + "\n")
+    if format == "json":
+        meta = {k: v for k, v in profile.items() if k != "samples"}
+        return {**meta, "top_functions": _top_functions(profile["samples"])}
+    raise HTTPException(status_code=400, detail="format must be 'json' or 'collapsed'")
@@ -0,0 +1,218 @@
+"""
+Exact top-k retrieval with dynamic pruning (Block-Max MaxScore).
+
+bm25s scores a query by adding up the full posting list of every query
+term. For long questions with common terms most of that work goes into the
+long lists of low-idf terms, whose contribution can rarely decide the top k.
+
+`BlockMaxIndex` stores, next to the bm25s score matrix, the maximum score of
+every term and of every block of BLOCK_SIZE consecutive postings of a term
+(as in Block-Max WAND). A query then:
+
+1. scores the postings of the highest-scoring blocks of its terms exactly,
+   which gives a threshold: the k-th best score found so far,
+2. splits its terms, by their maximum scores, into non-essential terms
+   whose maxima together stay below the threshold and essential ones; a
+   row that only contains non-essential terms cannot reach the top k
+   (MaxScore),
+3. adds up the essential terms' postings, which gives every candidate row
+   a partial score,
+4. adds the non-essential terms one at a time, looking up each remaining
+   row with a binary search in the term's posting list instead of scanning
+   it, and after each term drops the rows whose partial score plus the
+   maxima still to come cannot reach the k-th best partial score,
+5. scores the few rows left exactly.
+
+The result is exact: scores are accumulated in float32 in query term
+order, as bm25s does. When no term can be pruned it falls back to a full
+scan, so it is never much slower than bm25s.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 128
+# Postings scored (at least, x k) to get the first threshold
+SEED_POSTINGS_PER_RESULT = 4
+# Guards the bounds against float32 rounding of the exact sums
+_BOUND_SLACK = 1.0 + 1e-5
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(s, e) for every (s, e) pair."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total, dtype=np.int64)
+
+
+class BlockMaxIndex:
+    """Per-term and per-block score maxima over a bm25s score matrix."""
+
+    def __init__(self, scores: dict, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self.data = scores["data"]
+        self.indices = scores["indices"]
+        self.indptr = np.asarray(scores["indptr"], dtype=np.int64)
+        self.num_docs = int(scores["num_docs"])
+
+        lengths = np.diff(self.indptr)
+        terms = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        rows = np.asarray(self.indices, dtype=np.int64)
+        if len(rows) > 1 and np.any((np.diff(rows) < 0) & (terms[1:] == terms[:-1])):
+            # Rows must be ascending within each term; bm25s does not promise it
+            order = np.lexsort((rows, terms))
+            self.data, self.indices = self.data[order], self.indices[order]
+
+        # Term t owns blocks block_ptr[t]:block_ptr[t + 1]; block j of it
+        # covers postings indptr[t] + j * block_size onwards
+        blocks_per_term = -(-lengths // block_size)
+        self.block_ptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(blocks_per_term, out=self.block_ptr[1:])
+        block_term = np.repeat(np.arange(len(lengths), dtype=np.int64), blocks_per_term)
+        block_index = np.arange(len(block_term), dtype=np.int64) - self.block_ptr[block_term]
+        starts = self.indptr[block_term] + block_index * block_size
+        if len(starts):
+            self.block_max = np.maximum.reduceat(np.asarray(self.data), starts).astype(np.float32)
+            self.term_max = np.maximum.reduceat(self.block_max, self.block_ptr[:-1][blocks_per_term > 0])
+            term_max = np.zeros(len(lengths), dtype=np.float32)
+            term_max[blocks_per_term > 0] = self.term_max
+            self.term_max = term_max
+        else:
+            self.block_max = np.zeros(0, dtype=np.float32)
+            self.term_max = np.zeros(len(lengths), dtype=np.float32)
+        # Work done by the last query, for benchmarks
+        self.last_postings_read = 0
+
+    def nbytes(self) -> int:
+        """Memory of the maxima (the score matrix is shared with bm25s)."""
+        return self.block_ptr.nbytes + self.block_max.nbytes + self.term_max.nbytes
+
+    def _score_rows(self, query_ids: List[int], rows: np.ndarray) -> np.ndarray:
+        """Exact scores of sorted `rows`, one binary search per term."""
+        acc = np.zeros(len(rows), dtype=self.data.dtype)
+        # Same dtype as the posting lists, or searchsorted would copy them
+        rows = rows.astype(self.indices.dtype)
+        for term in query_ids:
+            start, end = int(self.indptr[term]), int(self.indptr[term + 1])
+            if start == end:
+                continue
+            term_rows = self.indices[start:end]
+            pos = np.minimum(np.searchsorted(term_rows, rows), end - start - 1)
+            hit = term_rows[pos] == rows
+            acc[hit] += self.data[start + pos[hit]]
+            self.last_postings_read += len(rows)
+        return acc
+
+    def _full_scan(self, query_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        acc = np.zeros(self.num_docs, dtype=self.data.dtype)
+        for term in query_ids:
+            start, end = int(self.indptr[term]), int(self.indptr[term + 1])
+            np.add.at(acc, self.indices[start:end], self.data[start:end])
+            self.last_postings_read += end - start
+        rows = np.flatnonzero(acc)
+        return rows, acc[rows]
+
+    def _seed_rows(self, query_ids: List[int], k: int) -> np.ndarray:
+        """Rows of the query terms' highest-scoring blocks, at least SEED_POSTINGS_PER_RESULT * k postings."""
+        terms = np.array(sorted(set(query_ids)), dtype=np.int64)
+        first, last = self.block_ptr[terms], self.block_ptr[terms + 1]
+        blocks = _ranges(first, last)
+        block_term = np.repeat(terms, last - first)
+        order = np.argsort(-self.block_max[blocks], kind="stable")
+        block_start = self.indptr[block_term] + (blocks - self.block_ptr[block_term]) * self.block_size
+        block_end = np.minimum(block_start + self.block_size, self.indptr[block_term + 1])
+        taken = np.searchsorted(np.cumsum((block_end - block_start)[order]), SEED_POSTINGS_PER_RESULT * k) + 1
+        chosen = order[:taken]
+        return np.unique(np.asarray(self.indices[_ranges(block_start[chosen], block_end[chosen])], dtype=np.int64))
+
+    def top_k(
+        self, query_ids: List[int], k: int, weight_mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best `k` rows with a positive score for term ids `query_ids`
+        (repeats count twice, as in bm25s), best first: (rows, scores).
+        """
+        self.last_postings_read = 0
+        if not query_ids or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=self.data.dtype)
+
+        # 1. Threshold from the most promising postings
+        seeds = self._seed_rows(query_ids, k)
+        seed_scores = self._score_rows(query_ids, seeds)
+        if weight_mask is not None:
+            seed_scores = seed_scores * weight_mask[seeds]
+        positive = np.sort(seed_scores[seed_scores > 0])
+        threshold = float(positive[-k]) if len(positive) >= k else 0.0
+
+        # 2. Non-essential terms: the lowest maxima summing to below the threshold
+        maxima = self.term_max[query_ids].astype(np.float64) * _BOUND_SLACK
+        by_max = np.argsort(maxima, kind="stable")
+        non_essential = int(np.searchsorted(np.cumsum(maxima[by_max]), threshold))
+        if non_essential == 0:
+            rows, scores = self._full_scan(query_ids)
+            if weight_mask is not None:
+                scores = scores * weight_mask[rows]
+            return self._best(rows, scores, k)
+
+        # 3. Partial scores from the essential terms (short, high-idf lists)
+        terms = np.array([query_ids[i] for i in by_max[non_essential:]], dtype=np.int64)
+        postings = _ranges(self.indptr[terms], self.indptr[terms + 1])
+        self.last_postings_read += len(postings)
+        rows, inverse = np.unique(self.indices[postings], return_inverse=True)
+        partial = np.bincount(inverse, weights=self.data[postings], minlength=len(rows))
+        if weight_mask is not None:
+            live = weight_mask[rows] > 0
+            rows, partial = rows[live], partial[live]
+
+        # 4. Add the non-essential terms, highest maximum first, by binary
+        # search for the remaining rows only; after each, drop rows whose
+        # partial score plus the maxima still to come cannot reach the k-th
+        # best partial score (a lower bound of the final k-th best score)
+        remaining = float(maxima[by_max[:non_essential]].sum())
+        for i in by_max[:non_essential][::-1]:
+            threshold = max(threshold, self._kth(partial, k))
+            keep = (partial + remaining) * _BOUND_SLACK >= threshold
+            rows, partial = rows[keep], partial[keep]
+            partial += self._lookup(query_ids[i], rows)
+            remaining -= maxima[i]
+        threshold = max(threshold, self._kth(partial, k))
+        rows = rows[partial * _BOUND_SLACK >= threshold]
+
+        # 5. Exact scores in query term order, as bm25s adds them up
+        scores = self._score_rows(query_ids, rows)
+        if weight_mask is not None:
+            scores = scores * weight_mask[rows]
+        return self._best(rows, scores, k)
+
+    @staticmethod
+    def _kth(values: np.ndarray, k: int) -> float:
+        return float(np.partition(values, len(values) - k)[len(values) - k]) if len(values) >= k else 0.0
+
+    def _lookup(self, term: int, rows: np.ndarray) -> np.ndarray:
+        """Score of `term` in each of the sorted `rows` (0 where it does not occur)."""
+        out = np.zeros(len(rows), dtype=np.float64)
+        start, end = int(self.indptr[term]), int(self.indptr[term + 1])
+        if start == end or not len(rows):
+            return out
+        term_rows = self.indices[start:end]
+        pos = np.minimum(np.searchsorted(term_rows, rows.astype(term_rows.dtype)), end - start - 1)
+        hit = term_rows[pos] == rows
+        out[hit] = self.data[start + pos[hit]]
+        self.last_postings_read += len(rows)
+        return out
+
+    @staticmethod
+    def _best(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The `k` best rows with a positive score, best first (ties by row)."""
+        keep = scores > 0
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            # Keep every row tied with the k-th score, the row order breaks ties
+            top = scores >= np.partition(scores, len(scores) - k)[len(scores) - k]
+            rows, scores = rows[top], scores[top]
+        ranked = np.lexsort((rows, -scores))[:k]
+        return rows[ranked], scores[ranked]
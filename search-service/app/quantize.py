@@ -0,0 +1,161 @@
+"""
+Compact, quantized storage of a bm25s score matrix.
+
+bm25s keeps every posting as a float32 score plus an int32 document row
+(8 bytes). `QuantizedScores` stores the same postings as:
+
+- `impacts`: per posting, its score divided by the term's scale and rounded
+  to an 8- or 16-bit unsigned integer (`scales[t]` is the term's maximum
+  score over the largest impact, so every term uses the full range; a
+  posting never rounds down to 0),
+- `row_bytes`: per term, its document rows as deltas to the previous row
+  (the first one absolute), LEB128 varint encoded: 7 bits per byte, the
+  high bit set on every byte but a value's last. Rows of common terms are
+  close together, so most deltas take one byte,
+- `indptr` / `byte_ptr`: per term, its slice of `impacts` / `row_bytes`, in
+  the narrowest unsigned dtype that holds them.
+
+A query decodes only the postings of its own terms, which costs a few
+vectorized passes per posting: memory is traded for some query latency.
+Scores are
+`impact * scale`, so each one is within half a quantization step of the
+float32 score: 1/510 (8 bits) or 1/131070 (16 bits) of the term's maximum.
+"""
+
+from typing import List
+
+import numpy as np
+
+from .positions import _compact
+
+SCORE_BITS = (8, 16)
+
+
+def _varint_sizes(values: np.ndarray) -> np.ndarray:
+    sizes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28):
+        sizes += values >= (1 << shift)
+    return sizes
+
+
+def encode_varints(values: np.ndarray) -> np.ndarray:
+    """LEB128 bytes of non-negative integers below 2**35."""
+    values = np.asarray(values, dtype=np.int64)
+    sizes = _varint_sizes(values)
+    out = np.zeros(int(sizes.sum()), dtype=np.uint8)
+    starts = np.cumsum(sizes) - sizes
+    for j in range(int(sizes.max()) if len(sizes) else 0):
+        has = sizes > j
+        byte = (values[has] >> (7 * j)) & 0x7F
+        more = sizes[has] > j + 1
+        out[starts[has] + j] = byte | (more << 7)
+    return out
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Integers encoded by `encode_varints` (`data` itself when every one fits in a byte)."""
+    more = data >= 0x80
+    if not more.any():
+        # Dense lists: every delta fits in one byte
+        return data
+    # Value of every byte read as the first of a varint, one byte at a time:
+    # byte j contributes while all bytes before it carry the continuation bit
+    low = (data & 0x7F).astype(np.int64)
+    values = low.copy()
+    carry = more.copy()
+    for j in range(1, 5):
+        if not carry[:len(data) - j].any():
+            break
+        values[:-j] += carry[:-j] * (low[j:] << (7 * j))
+        carry[:-j] &= more[j:]
+    first = np.ones(len(data), dtype=bool)
+    first[1:] = ~more[:-1]
+    return values[first]
+
+
+class QuantizedScores:
+    """Term -> (document rows, quantized scores) of one bm25s score matrix."""
+
+    def __init__(self, impacts, scales, indptr, row_bytes, byte_ptr, num_docs: int, dtype=np.float32):
+        self.impacts = impacts
+        self.scales = scales
+        self.indptr = indptr
+        self.row_bytes = row_bytes
+        self.byte_ptr = byte_ptr
+        self.num_docs = num_docs
+        # dtype of the original scores (and of the scores handed out)
+        self.dtype = np.dtype(dtype)
+
+    @classmethod
+    def from_scores(cls, scores: dict, bits: int = 8) -> "QuantizedScores":
+        """Quantize a bm25s `scores` dict (data, indices, indptr, num_docs)."""
+        if bits not in SCORE_BITS:
+            raise ValueError(f"Unsupported score width {bits!r}, expected one of {SCORE_BITS}")
+        levels = (1 << bits) - 1
+        data = np.asarray(scores["data"])
+        rows = np.asarray(scores["indices"], dtype=np.int64)
+        indptr = np.asarray(scores["indptr"], dtype=np.int64)
+        lengths = np.diff(indptr)
+        terms = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        if len(rows) > 1 and np.any((np.diff(rows) < 0) & (terms[1:] == terms[:-1])):
+            # Deltas need ascending rows within each term
+            order = np.lexsort((rows, terms))
+            data, rows = data[order], rows[order]
+
+        term_max = np.zeros(len(lengths), dtype=np.float64)
+        occurring = lengths > 0
+        if len(data):
+            term_max[occurring] = np.maximum.reduceat(data.astype(np.float64), indptr[:-1][occurring])
+        scales = (term_max / levels).astype(np.float32)
+        safe = np.where(scales > 0, scales, 1).astype(np.float64)
+        impacts = np.clip(np.rint(data / safe[terms]), 1, levels).astype(np.uint8 if bits == 8 else np.uint16)
+
+        deltas = rows.copy()
+        deltas[1:] -= rows[:-1]
+        deltas[indptr[:-1][occurring]] = rows[indptr[:-1][occurring]]
+        byte_ptr = np.concatenate(([0], np.cumsum(_varint_sizes(deltas))))[indptr]
+
+        return cls(
+            impacts=impacts,
+            scales=scales,
+            indptr=_compact(indptr),
+            row_bytes=encode_varints(deltas),
+            byte_ptr=_compact(byte_ptr),
+            num_docs=int(scores["num_docs"]),
+            dtype=data.dtype,
+        )
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.impacts, self.scales, self.indptr, self.row_bytes, self.byte_ptr))
+
+    def postings(self, term: int):
+        """(document rows, scores) of term `term`."""
+        start, end = int(self.indptr[term]), int(self.indptr[term + 1])
+        deltas = decode_varints(self.row_bytes[int(self.byte_ptr[term]):int(self.byte_ptr[term + 1])])
+        rows = np.cumsum(deltas, dtype=np.int64)
+        return rows, self.impacts[start:end] * self.scales[term]
+
+    def get_scores(self, term_ids: List[int]) -> np.ndarray:
+        """Score of every row for a query (repeated terms count twice, as in bm25s)."""
+        acc = np.zeros(self.num_docs, dtype=self.dtype)
+        for term in term_ids:
+            rows, scores = self.postings(term)
+            np.add.at(acc, rows, scores)
+        return acc
+
+    def to_scores(self) -> dict:
+        """The dequantized matrix as a bm25s `scores` dict."""
+        indptr = self.indptr.astype(np.int64)
+        lengths = np.diff(indptr)
+        terms = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        deltas = decode_varints(self.row_bytes)
+        # Per-term cumulative sums: subtract the running total before each term
+        totals = np.cumsum(deltas, dtype=np.int64)
+        before = np.concatenate(([0], totals))[indptr[:-1]]
+        rows = totals - before[terms]
+        return {
+            "data": (self.impacts * self.scales[terms]).astype(self.dtype),
+            "indices": rows.astype(np.int32),
+            "indptr": indptr,
+            "num_docs": self.num_docs,
+        }
@@ -0,0 +1,251 @@
+"""
+Query log and popularity-driven warming for the Search Service.
+
+Search handlers call `QueryLog.record`, which only appends a tuple to a
+bounded ring buffer (`collections.deque.append` is atomic, so request
+threads never take a lock; when the flusher falls behind, the oldest
+entries are dropped and counted). A background thread drains the buffer in
+batches every QUERY_LOG_FLUSH_SECONDS:
+
+- entries are appended as JSON lines to `<QUERY_LOG_DIR>/queries.log`,
+  rotated to `queries.log.1` ... `.N` once it exceeds QUERY_LOG_MAX_BYTES,
+- per-course counts of normalized queries (lowercased, whitespace
+  collapsed) are updated; `top_queries(course_id)` reads them. On restart
+  they are rebuilt from the log files.
+
+Only the course id, query text, hit count and time are logged; no user.
+
+`PopularQueryWarmer` re-runs a course's top queries in the background after
+its index generation changes (every rebuild), so the first student after a
+reindex does not pay for cold caches (analyzer word cache, lazily built
+structures, freshly mapped pages). Startup warmup primes them too.
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "queries.log"
+# Distinct queries counted per course; the least frequent are pruned beyond it
+MAX_TRACKED_QUERIES = 1000
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class QueryLog:
+    """Lock-free ring buffer of searches, flushed to rotating files by a background thread."""
+
+    def __init__(
+        self,
+        directory: Optional[str],
+        capacity: int = 10000,
+        flush_interval: float = 2.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._buffer: Deque[Tuple[float, str, str, int]] = deque(maxlen=capacity)
+        # next() on itertools.count is atomic: a lock-free record counter
+        self._recorded = itertools.count(1)
+        self.recorded = 0
+        self.flushed = 0
+        # course id -> normalized query -> searches
+        self._counts: Dict[str, Counter] = {}
+        self._counts_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, LOG_FILE)
+
+    def record(self, course_id: str, query: str, hits: int):
+        """Log one search; never blocks the request."""
+        if not self.enabled:
+            return
+        self._buffer.append((time.time(), course_id, query, hits))
+        self.recorded = next(self._recorded)
+
+    def start(self):
+        """Start the background flusher, once."""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="query-log-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write out what is still buffered."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Query log flush failed")
+
+    def flush(self) -> int:
+        """Write the buffered entries to the log and the counts; returns how many."""
+        if not self.enabled:
+            return 0
+        with self._flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._buffer.popleft())
+                except IndexError:
+                    break
+            if not batch:
+                return 0
+            os.makedirs(self.directory, exist_ok=True)
+            lines = "".join(
+                json.dumps({"ts": round(ts, 3), "course_id": course_id, "query": query, "hits": hits}) + "\n"
+                for ts, course_id, query, hits in batch
+            )
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            if os.path.getsize(self.path) > self.max_bytes:
+                self._rotate()
+            self._count((course_id, query) for _, course_id, query, _ in batch)
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _count(self, entries):
+        with self._counts_lock:
+            for course_id, query in entries:
+                query = normalize_query(query)
+                if not query:
+                    continue
+                counts = self._counts.setdefault(course_id, Counter())
+                counts[query] += 1
+                if len(counts) > 2 * MAX_TRACKED_QUERIES:
+                    self._counts[course_id] = Counter(dict(counts.most_common(MAX_TRACKED_QUERIES)))
+
+    def load(self) -> int:
+        """Rebuild the counts from the log files (oldest first); returns entries read."""
+        if not self.enabled:
+            return 0
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        entries = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        entries.append((entry["course_id"], entry["query"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn or foreign line
+        self._count(entries)
+        return len(entries)
+
+    def top_queries(self, course_id: str, n: int = 20) -> List[str]:
+        """The `n` most searched queries of a course, most frequent first."""
+        with self._counts_lock:
+            counts = self._counts.get(course_id)
+            return [query for query, _ in counts.most_common(n)] if counts else []
+
+    def top_courses(self, n: int = 10) -> List[Tuple[str, int]]:
+        """Courses with the most logged searches, as (course id, searches)."""
+        with self._counts_lock:
+            totals = Counter({course_id: sum(c.values()) for course_id, c in self._counts.items()})
+        return totals.most_common(n)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "buffered": len(self._buffer),
+            # Evicted from the full ring before the flusher got to them
+            "dropped": max(0, self.recorded - self.flushed - len(self._buffer)),
+            "top_courses": [{"course_id": c, "searches": s} for c, s in self.top_courses(5)],
+        }
+
+
+class PopularQueryWarmer:
+    """
+    Re-runs a course's top logged queries after its index changed.
+
+    `get_index(course_id)` returns the course's current index (None if it
+    is not resident); indexes expose a `generation` that changes on every
+    rebuild. Requests are coalesced and run on one background thread.
+    """
+
+    def __init__(self, query_log: QueryLog, get_index: Callable[[str], object], top_n: int = 20):
+        self.query_log = query_log
+        self.get_index = get_index
+        self.top_n = top_n
+        self.queries_run = 0
+        self._pending: Dict[str, None] = {}
+        self._warmed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def request(self, course_id: str):
+        """Warm `course_id` soon, if it has popular queries."""
+        if not self.top_n or not self.query_log.top_queries(course_id, 1):
+            return
+        with self._lock:
+            self._pending[course_id] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-warmer", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                pending, self._pending = list(self._pending), {}
+            for course_id in pending:
+                try:
+                    self.warm(course_id)
+                except Exception:
+                    logger.exception("Warming %s failed", course_id)
+
+    def warm(self, course_id: str, index=None) -> int:
+        """Run the top queries against the course's index unless this generation was warmed; returns queries run."""
+        index = index if index is not None else self.get_index(course_id)
+        if index is None or self._warmed.get(course_id) == index.generation:
+            return 0
+        queries = self.query_log.top_queries(course_id, self.top_n)
+        for query in queries:
+            index.search(query, k=10)
+        self._warmed[course_id] = index.generation
+        self.queries_run += len(queries)
+        return len(queries)
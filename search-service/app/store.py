@@ -0,0 +1,336 @@
+"""
+Durable storage of document chunks and user profiles.
+
+The BM25 indexes are derived data: they are rebuilt from a DocumentStore
+at startup. Two implementations are provided:
+
+- `InMemoryDocumentStore`: plain dicts, nothing survives a restart. Used
+  by default and in tests.
+- `SqliteDocumentStore`: embedded SQLite database in WAL mode. Writes from
+  all threads are handed to a single writer thread that group-commits
+  whatever is queued in one transaction; reads use per-thread connections
+  and stream rows through a cursor.
+
+`create_store(settings)` picks the backend from DOCUMENT_STORE.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .models import DocumentChunk, UserProfile
+
+# Rows fetched per round trip when streaming documents
+STREAM_BATCH_SIZE = 1000
+
+
+class DocumentStore(ABC):
+    """Interface of document and profile storage backends."""
+
+    # True if data survives a restart, i.e. indexes should be rebuilt from it
+    persistent = False
+
+    @abstractmethod
+    def put_many(self, docs: List[DocumentChunk]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_many(self, course_id: str, doc_ids: List[str]) -> None:
+        ...
+
+    def bulk_load(self, docs: Iterable[DocumentChunk]) -> int:
+        """Insert a large stream of documents as fast as possible; returns the count."""
+        count = 0
+        batch: List[DocumentChunk] = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                self.put_many(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.put_many(batch)
+            count += len(batch)
+        return count
+
+    @abstractmethod
+    def iter_documents(self, course_id: Optional[str] = None) -> Iterator[DocumentChunk]:
+        """Stream the documents of one course (or of all courses)."""
+
+    @abstractmethod
+    def count(self, course_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def course_ids(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get_profile(self, uid: str) -> Optional[UserProfile]:
+        ...
+
+    @abstractmethod
+    def put_profile(self, profile: UserProfile) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryDocumentStore(DocumentStore):
+    """Dict-backed store; not durable."""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, DocumentChunk]] = {}
+        self._profiles: Dict[str, UserProfile] = {}
+        self._lock = threading.Lock()
+
+    def put_many(self, docs: List[DocumentChunk]) -> None:
+        with self._lock:
+            for doc in docs:
+                self._docs.setdefault(doc.course_id, {})[doc.id] = doc
+
+    def delete_many(self, course_id: str, doc_ids: List[str]) -> None:
+        with self._lock:
+            course = self._docs.get(course_id, {})
+            for doc_id in doc_ids:
+                course.pop(doc_id, None)
+
+    def iter_documents(self, course_id: Optional[str] = None) -> Iterator[DocumentChunk]:
+        with self._lock:
+            courses = [course_id] if course_id is not None else list(self._docs)
+            docs = [doc for c in courses for doc in self._docs.get(c, {}).values()]
+        return iter(docs)
+
+    def count(self, course_id: str) -> int:
+        with self._lock:
+            return len(self._docs.get(course_id, {}))
+
+    def course_ids(self) -> List[str]:
+        with self._lock:
+            return [c for c, docs in self._docs.items() if docs]
+
+    def get_profile(self, uid: str) -> Optional[UserProfile]:
+        return self._profiles.get(uid)
+
+    def put_profile(self, profile: UserProfile) -> None:
+        self._profiles[profile.uid] = profile
+
+    def clear(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            self._profiles.clear()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    course_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (course_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS profiles (
+    uid TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+UPSERT_DOCUMENT = "INSERT OR REPLACE INTO documents (course_id, id, body) VALUES (?, ?, ?)"
+DELETE_DOCUMENT = "DELETE FROM documents WHERE course_id = ? AND id = ?"
+UPSERT_PROFILE = "INSERT OR REPLACE INTO profiles (uid, body) VALUES (?, ?)"
+
+# One queued write: runs against the writer connection inside a transaction
+WriteOp = Callable[[sqlite3.Connection], None]
+
+
+class SqliteDocumentStore(DocumentStore):
+    """
+    SQLite (WAL) store with group commit.
+
+    Writers enqueue operations and wait for them to be committed. The writer
+    thread drains up to `max_group_size` queued operations into a single
+    transaction, so concurrent writers share one commit (and one WAL sync).
+
+    A write fails (rather than hangs) when the database stays locked by
+    another connection for `busy_timeout` seconds, and writers stop waiting
+    for the writer thread after `write_timeout` seconds.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str, max_group_size: int = 256, busy_timeout: float = 5.0, write_timeout: float = 60.0):
+        self.path = path
+        self.max_group_size = max_group_size
+        self.busy_timeout = busy_timeout
+        self.write_timeout = write_timeout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._local = threading.local()
+        self._ops: "queue.Queue[Optional[Tuple[WriteOp, Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="document-store-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits survive process crashes; the last ones may be lost on power loss
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ----- Writes -----
+
+    def _submit(self, op: WriteOp, bounded: bool = True) -> None:
+        """Queue `op` and wait for its commit, at most `write_timeout` seconds if `bounded`."""
+        future: Future = Future()
+        self._ops.put((op, future))
+        try:
+            future.result(timeout=self.write_timeout if bounded else None)
+        except FutureTimeoutError:
+            raise TimeoutError(f"Document store write not committed within {self.write_timeout}s")
+
+    def _write_loop(self):
+        while True:
+            item = self._ops.get()
+            if item is None:
+                return
+            group = [item]
+            while len(group) < self.max_group_size:
+                try:
+                    item = self._ops.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._ops.put(None)  # stop after this group
+                    break
+                group.append(item)
+            try:
+                self._commit_group(group)
+            except Exception as e:
+                # Keep the writer alive; fail whatever the group left unresolved
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+
+    @staticmethod
+    def _rollback(conn: sqlite3.Connection):
+        # A failed BEGIN (e.g. database locked) leaves no transaction to roll back
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+
+    def _commit_group(self, group: List[Tuple[WriteOp, Future]]):
+        conn = self._writer
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, _ in group:
+                op(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            self._rollback(conn)
+            # Retry one by one so a single bad operation does not fail the others
+            for op, future in group:
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    op(conn)
+                    conn.execute("COMMIT")
+                except Exception as e:
+                    self._rollback(conn)
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
+        else:
+            for _, future in group:
+                future.set_result(None)
+
+    def put_many(self, docs: List[DocumentChunk]) -> None:
+        rows = [(doc.course_id, doc.id, doc.model_dump_json()) for doc in docs]
+        self._submit(lambda conn: conn.executemany(UPSERT_DOCUMENT, rows))
+
+    def delete_many(self, course_id: str, doc_ids: List[str]) -> None:
+        rows = [(course_id, doc_id) for doc_id in doc_ids]
+        self._submit(lambda conn: conn.executemany(DELETE_DOCUMENT, rows))
+
+    def bulk_load(self, docs: Iterable[DocumentChunk]) -> int:
+        """
+        Load a large stream of documents through one prepared statement,
+        committing every STREAM_BATCH_SIZE * 10 rows with fsync disabled.
+        Runs on the writer thread, so other writes wait until it finishes.
+        """
+        counter = [0]
+
+        def load(conn: sqlite3.Connection):
+            conn.execute("COMMIT")  # leave the group transaction
+            conn.execute("PRAGMA synchronous=OFF")
+            try:
+                rows = ((doc.course_id, doc.id, doc.model_dump_json()) for doc in docs)
+                while True:
+                    chunk = [row for _, row in zip(range(STREAM_BATCH_SIZE * 10), rows)]
+                    if not chunk:
+                        break
+                    conn.execute("BEGIN")
+                    conn.executemany(UPSERT_DOCUMENT, chunk)
+                    conn.execute("COMMIT")
+                    counter[0] += len(chunk)
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("BEGIN IMMEDIATE")
+
+        # Runs as long as the stream lasts
+        self._submit(load, bounded=False)
+        return counter[0]
+
+    def put_profile(self, profile: UserProfile) -> None:
+        row = (profile.uid, profile.model_dump_json())
+        self._submit(lambda conn: conn.execute(UPSERT_PROFILE, row))
+
+    # ----- Reads -----
+
+    def iter_documents(self, course_id: Optional[str] = None) -> Iterator[DocumentChunk]:
+        if course_id is None:
+            cursor = self._reader().execute("SELECT body FROM documents ORDER BY course_id, id")
+        else:
+            cursor = self._reader().execute(
+                "SELECT body FROM documents WHERE course_id = ? ORDER BY id", (course_id,)
+            )
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                return
+            for (body,) in rows:
+                yield DocumentChunk.model_validate_json(body)
+
+    def count(self, course_id: str) -> int:
+        row = self._reader().execute("SELECT COUNT(*) FROM documents WHERE course_id = ?", (course_id,)).fetchone()
+        return row[0]
+
+    def course_ids(self) -> List[str]:
+        return [row[0] for row in self._reader().execute("SELECT DISTINCT course_id FROM documents")]
+
+    def get_profile(self, uid: str) -> Optional[UserProfile]:
+        row = self._reader().execute("SELECT body FROM profiles WHERE uid = ?", (uid,)).fetchone()
+        return UserProfile.model_validate_json(row[0]) if row else None
+
+    def close(self) -> None:
+        self._ops.put(None)
+        self._thread.join()
+        self._writer.close()
+
+
+def create_store(settings) -> DocumentStore:
+    """Build the store selected by DOCUMENT_STORE (memory | sqlite)."""
+    if settings.DOCUMENT_STORE == "sqlite":
+        return SqliteDocumentStore(settings.DOCUMENT_STORE_PATH)
+    if settings.DOCUMENT_STORE == "memory":
+        return InMemoryDocumentStore()
+    raise ValueError(f"Unknown DOCUMENT_STORE {settings.DOCUMENT_STORE!r}")
@@ -0,0 +1,118 @@
+"""
+Search-as-you-type suggestions.
+
+A `Suggester` is a compact prefix structure over one course: its indexed
+terms (shown by their shortest surface word, e.g. "study" rather than
+the stem "studi") and its document titles and headings, each with the
+number of documents it appears in. Entries are kept in one array sorted by
+their lowercased text, so the entries starting with a prefix are a
+contiguous slice found with two binary searches; the best ones by document
+frequency are then picked from that slice. Results for the shortest
+prefixes, whose slices are the largest, are cached.
+
+BM25Index builds its suggester on the first suggest request and then
+passes every write's frequency changes to `update`, which edits the sorted
+arrays in place (a binary search and a list insert or delete per changed
+entry) and drops only the cached prefixes of the changed entries, so
+suggest requests never wait for the whole vocabulary to be re-sorted.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# Prefixes up to this many characters have their results cached
+CACHED_PREFIX_LENGTH = 2
+# Sorts after any character that can follow a prefix
+_PREFIX_END = "\U0010ffff"
+
+# (text, kind, doc_freq)
+Suggestion = Tuple[str, str, int]
+
+
+class Suggester:
+    """Sorted-array prefix index over terms and titles, ranked by document frequency."""
+
+    def __init__(self, terms: Iterable[Tuple[str, int]], titles: Iterable[Tuple[str, int]]):
+        entries = sorted(
+            [(text.lower(), text, "term", df) for text, df in terms if df > 0]
+            + [(text.lower(), text, "title", df) for text, df in titles if df > 0]
+        )
+        self._keys: List[str] = [e[0] for e in entries]
+        self._texts: List[str] = [e[1] for e in entries]
+        self._kinds: List[str] = [e[2] for e in entries]
+        self._freqs: List[int] = [e[3] for e in entries]
+        self._cache: Dict[Tuple[str, str, int], List[Suggestion]] = {}
+        # Writers update the arrays while suggest requests read them
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, changes: Iterable[Tuple[str, str, int]]):
+        """
+        Set the document frequency of (text, kind) entries, adding new
+        entries and removing those whose frequency dropped to zero.
+        """
+        with self._lock:
+            changed = set()
+            for text, kind, df in changes:
+                key = text.lower()
+                i = bisect_left(self._keys, key)
+                while i < len(self._keys) and self._keys[i] == key and (self._texts[i], self._kinds[i]) < (text, kind):
+                    i += 1
+                found = i < len(self._keys) and (self._keys[i], self._texts[i], self._kinds[i]) == (key, text, kind)
+                if found and df > 0:
+                    if self._freqs[i] == df:
+                        continue
+                    self._freqs[i] = df
+                elif found:
+                    for column in (self._keys, self._texts, self._kinds, self._freqs):
+                        del column[i]
+                elif df > 0:
+                    for column, value in ((self._keys, key), (self._texts, text), (self._kinds, kind), (self._freqs, df)):
+                        column.insert(i, value)
+                else:
+                    continue
+                changed.add((key, kind))
+
+            if changed:
+                self._cache = {
+                    cached: found
+                    for cached, found in self._cache.items()
+                    if not any(kind == cached[1] and key.startswith(cached[0]) for key, kind in changed)
+                }
+
+    def _complete(self, prefix: str, kind: str, limit: int) -> List[Suggestion]:
+        key = (prefix, kind, limit)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+
+            lo = bisect_left(self._keys, prefix)
+            hi = bisect_left(self._keys, prefix + _PREFIX_END, lo)
+            rows = (i for i in range(lo, hi) if self._kinds[i] == kind)
+            best = heapq.nlargest(limit, rows, key=lambda i: (self._freqs[i], -i))
+            found = [(self._texts[i], kind, self._freqs[i]) for i in best]
+
+            if len(prefix) <= CACHED_PREFIX_LENGTH:
+                self._cache[key] = found
+        return found
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """
+        Completions of `prefix`, most frequent first. The last word of the
+        prefix is completed against the vocabulary (earlier words are kept
+        as typed), and the whole prefix against titles and headings.
+        """
+        prefix = " ".join(prefix.lower().split())
+        if not prefix or limit <= 0:
+            return []
+
+        head, _, last = prefix.rpartition(" ")
+        lead = f"{head} " if head else ""
+        terms = [(lead + text, kind, df) for text, kind, df in self._complete(last, "term", limit)]
+        titles = self._complete(prefix, "title", limit)
+        return heapq.nlargest(limit, terms + titles, key=lambda s: s[2])
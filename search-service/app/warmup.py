@@ -0,0 +1,102 @@
+"""
+Startup warmup for the Search Service.
+
+A fresh instance starts with no indexes loaded. Warmup runs in a background
+thread after startup and:
+
+1. restores course indexes from SEARCH_SNAPSHOT_DIR (pinned courses first,
+   up to the memory budget) and rebuilds the cross-course index from them,
+2. touches the pages of memory-mapped score matrices so the first queries
+   do not fault them in from disk,
+3. runs the warmup queries against every restored course, priming the
+   analyzer's word cache and bm25s' retrieval path.
+
+`/health/ready` reports ready only once warmup has finished, while
+`/health` stays a cheap liveness check.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    """Progress of the warmup phase, read by the readiness probe."""
+
+    def __init__(self):
+        self.status = "pending"  # pending | running | ready | failed
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.courses_restored = 0
+        self.queries_primed = 0
+        self.error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self, run: Callable[["WarmupState"], None]) -> None:
+        """Run `run(state)` in a daemon thread, once."""
+        if self._thread is not None:
+            return
+        self.status = "running"
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, args=(run,), name="index-warmup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _run(self, run: Callable[["WarmupState"], None]) -> None:
+        try:
+            run(self)
+        except Exception as e:
+            logger.exception("Index warmup failed")
+            self.error = str(e)
+            self.status = "failed"
+        else:
+            self.status = "ready"
+        finally:
+            self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        duration = None
+        if self.started_at is not None:
+            duration = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "status": self.status,
+            "courses_restored": self.courses_restored,
+            "queries_primed": self.queries_primed,
+            "duration_seconds": duration,
+            "error": self.error,
+        }
+
+
+def snapshot_course_ids(root: Optional[str]) -> List[str]:
+    """Course ids that have a snapshot under `root`, skipping in-progress writes."""
+    if not root or not os.path.isdir(root):
+        return []
+    return sorted(
+        unquote(name)
+        for name in os.listdir(root)
+        if ".tmp-" not in name and ".old-" not in name and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def load_warmup_queries(path: Optional[str]) -> List[str]:
+    """Queries to prime with, one per line; blank lines and `#` comments are skipped."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+warmup_state = WarmupState()
@@ -0,0 +1,133 @@
+"""
+Compare top-k retrieval engines of BM25Index on a synthetic corpus.
+
+Builds one index of `--docs` chunks (sources of consecutive chunks, each on
+one topic, over a Zipf-distributed background vocabulary), then runs the
+same long queries through the bm25s engine and the blockmax engine and
+reports latency, the postings each engine reads, and whether both engines
+returned the same top k.
+
+Usage (from search-service/):
+    python scripts/bench_retrieval.py [--docs 100000] [--queries 200] [--k 10]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_ROOT)
+
+from app.index import BM25Index  # noqa: E402
+from app.models import DocumentChunk  # noqa: E402
+from app.pruning import BlockMaxIndex  # noqa: E402
+
+
+def _word(i: int) -> str:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    i += 26 * 27  # at least three letters
+    while i:
+        i, r = divmod(i, 26)
+        out += letters[r]
+    return out + "x"  # keeps the stemmer from merging words
+
+
+def make_corpus(num_docs: int, chunks_per_source: int = 40, seed: int = 0):
+    rng = random.Random(seed)
+    background = [_word(i) for i in range(20000)]
+    weights = [1.0 / (i + 1) for i in range(len(background))]
+    num_topics = max(1, num_docs // (chunks_per_source * 5))
+    topics = [[_word(100000 + t * 50 + j) for j in range(50)] for t in range(num_topics)]
+
+    docs = []
+    for source in range(-(-num_docs // chunks_per_source)):
+        topic = topics[source % num_topics]
+        for chunk in range(chunks_per_source):
+            if len(docs) == num_docs:
+                break
+            words = rng.choices(background, weights, k=rng.randint(60, 160)) + rng.choices(topic, k=rng.randint(5, 20))
+            rng.shuffle(words)
+            docs.append(DocumentChunk(
+                id=f"s{source}-c{chunk}", course_id="bench", source=f"s{source}",
+                chunk_index=chunk, content=" ".join(words),
+            ))
+    return docs, background, topics
+
+
+def make_queries(background, topics, count: int, seed: int = 1):
+    """Long questions: common words plus a few words of one topic."""
+    rng = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(len(background))]
+    return [
+        " ".join(rng.choices(background, weights, k=rng.randint(6, 14)) + rng.sample(rng.choice(topics), 3))
+        for _ in range(count)
+    ]
+
+
+def _timed(fn, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([doc.id for doc, _ in fn(query, k)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+def _summary(latencies):
+    ordered = sorted(latencies)
+    return f"p50 {statistics.median(ordered):7.2f} ms   p95 {ordered[int(len(ordered) * 0.95) - 1]:7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--block-size", type=int, default=128)
+    args = parser.parse_args()
+
+    docs, background, topics = make_corpus(args.docs)
+    queries = make_queries(background, topics, args.queries)
+
+    index = BM25Index(positional=False, engine="bm25s")
+    start = time.perf_counter()
+    index.upsert_many(docs)
+    print(f"indexed {len(docs)} chunks in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    block_max = BlockMaxIndex(index.bm25.scores, args.block_size)
+    print(f"block maxima: {len(block_max.block_max)} blocks, {block_max.nbytes() / 1e6:.2f} MB, "
+          f"built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    index.search(queries[0], args.k)
+    bm25s_ms, expected = _timed(index.search, queries, args.k)
+
+    vocab, indptr = index.bm25.vocab_dict, index.bm25.scores["indptr"]
+    full_postings = [
+        sum(int(indptr[vocab[t] + 1] - indptr[vocab[t]]) for t in index.analyzer.query_terms(q) if t in vocab)
+        for q in queries
+    ]
+
+    index.state.block_max = block_max
+    read = []
+
+    def blockmax_search(query, k):
+        found = index.search(query, k)
+        read.append(block_max.last_postings_read)
+        return found
+
+    blockmax_ms, got = _timed(blockmax_search, queries, args.k)
+
+    same = sum(e == g for e, g in zip(expected, got))
+    print(f"bm25s     {_summary(bm25s_ms)}")
+    print(f"blockmax  {_summary(blockmax_ms)}   postings read {sum(read) / sum(full_postings):.1%} of bm25s'")
+    print(f"speedup (p50) {statistics.median(bm25s_ms) / statistics.median(blockmax_ms):.1f}x, "
+          f"identical top-{args.k} for {same}/{len(queries)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Report where cold-import time of the Search Service goes.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter and
+prints the total plus the slowest modules by cumulative and self time.
+
+Usage (from search-service/):
+    python scripts/importtime.py [--module app.main] [--top 25]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str = "app.main") -> Dict[str, Tuple[int, int]]:
+    """Import `module` in a fresh interpreter; returns {module: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVICE_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def loaded_modules(module: str = "app.main") -> List[str]:
+    """Top-level packages loaded by importing `module` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print('\\n'.join(sorted(sys.modules)))"],
+        cwd=SERVICE_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return sorted({name.split(".")[0] for name in result.stdout.split()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    timings = measure(args.module)
+    total_ms = timings[args.module][1] / 1000
+    print(f"import {args.module}: {total_ms:.1f} ms\n")
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    by_cumulative = sorted(timings.items(), key=lambda kv: kv[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in by_cumulative[: args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+    print(f"\n{'self ms':>9}  module (slowest own import time)")
+    by_self = sorted(timings.items(), key=lambda kv: kv[1][0], reverse=True)
+    for name, (self_us, _) in by_self[: args.top]:
+        print(f"{self_us / 1000:9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import AdmissionController, TokenBucket
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=2.0, burst=2.0)
+    now = bucket.updated
+    assert bucket.try_acquire(now)[0]
+    assert bucket.try_acquire(now)[0]
+    admitted, retry_after = bucket.try_acquire(now)
+    assert not admitted and retry_after == pytest.approx(0.5)
+    assert bucket.try_acquire(now + 0.5)[0]
+
+
+def test_rate_limit_is_per_user():
+    controller = AdmissionController(rate=1.0, burst=1.0)
+    controller.check_rate("alice")
+    with pytest.raises(HTTPException) as exc:
+        controller.check_rate("alice")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+    controller.check_rate("bob")
+    assert controller.stats()["rejected_rate_limited"] == 1
+
+
+def test_requests_beyond_concurrency_queue_then_shed():
+    controller = AdmissionController(rate=0, max_concurrent=1, max_queue_ms=50)
+    controller.acquire_slot()
+
+    with pytest.raises(HTTPException) as exc:
+        controller.acquire_slot()
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
+
+    # A slot freed while waiting admits the queued request
+    controller.max_queue_ms = 1000
+    threading.Timer(0.01, controller.release_slot).start()
+    controller.acquire_slot()
+
+    stats = controller.stats()
+    assert stats["queued"] == 2
+    assert stats["rejected_overloaded"] == 1
+    assert stats["in_flight"] == 1
@@ -1,6 +1,8 @@
 from datetime import datetime, timezone
+import threading
 import uuid
 
+from app import index as index_module
 from app.index import BM25Index
 from app.models import DocumentChunk
 
@@ -94,3 +96,277 @@ def test_bm25_ranks_relevant_higher():
     # Most relevant should be b, irrelevant should be last
     assert ids[0] == "b"
     assert ids[-1] == "c"
+
+
+def test_neighbors_follow_source_and_chunk_index():
+    idx = BM25Index()
+    for i in range(5):
+        idx.upsert(
+            _make_model_instance(
+                DocumentChunk, id=f"l{i}", course_id="c1", source="lecture1.pdf", chunk_index=i, content=f"part {i}"
+            )
+        )
+    idx.upsert(
+        _make_model_instance(DocumentChunk, id="other", course_id="c1", source="lecture2.pdf", chunk_index=1, content="x")
+    )
+
+    assert [d.id for d in idx.neighbors(idx.docs["l2"], 1)] == ["l1", "l3"]
+    assert [d.id for d in idx.neighbors(idx.docs["l0"], 2)] == ["l1", "l2"]
+    assert idx.get_by_position("c1", "lecture1.pdf", 4).id == "l4"
+
+    # Moving or deleting a chunk keeps the position lookup in sync
+    idx.upsert(idx.docs["l3"].model_copy(update={"chunk_index": 9}))
+    assert idx.get_by_position("c1", "lecture1.pdf", 3) is None
+    idx.delete("l4")
+    assert idx.get_by_position("c1", "lecture1.pdf", 4) is None
+
+
+def test_snapshot_round_trip_preserves_ranking(tmp_path):
+    idx = BM25Index()
+    idx.upsert(_make_model_instance(DocumentChunk, id="a", content="gradient descent optimizer", source="s", chunk_index=0))
+    idx.upsert(_make_model_instance(DocumentChunk, id="b", content="database btree index", source="s", chunk_index=1))
+
+    path = str(tmp_path / "course")
+    idx.save_snapshot(path)
+    idx.save_snapshot(path)  # overwriting an existing snapshot must work too
+    restored = BM25Index.load_snapshot(path)
+
+    assert restored.doc_ids == idx.doc_ids
+    assert [(d.id, s) for d, s in restored.search("gradient", k=2)] == [(d.id, s) for d, s in idx.search("gradient", k=2)]
+    assert restored.get_by_position(idx.docs["b"].course_id, "s", 1).id == "b"
+
+
+def test_snapshot_keeps_tombstones_without_compacting(tmp_path):
+    idx = BM25Index(compact_ratio=0.9)
+    idx.upsert_many(
+        [_make_model_instance(DocumentChunk, id=f"d{i}", content=f"shared term doc{i}", source="s", chunk_index=i) for i in range(6)]
+    )
+    idx.delete_many(["d1", "d4"])
+    model = idx.bm25
+
+    path = str(tmp_path / "course")
+    idx.save_snapshot(path)
+    assert idx.bm25 is model and idx.num_tombstones == 2  # no rebuild
+
+    restored = BM25Index.load_snapshot(path)
+    assert restored.num_tombstones == 2
+    assert sorted(restored.docs) == ["d0", "d2", "d3", "d5"]
+    expected = [(d.id, s) for d, s in idx.search("shared term doc3", k=10)]
+    assert [(d.id, s) for d, s in restored.search("shared term doc3", k=10)] == expected
+    assert restored.get_by_position(idx.docs["d5"].course_id, "s", 5).id == "d5"
+
+    restored.delete("d0")
+    restored.compact()
+    assert sorted(d.id for d, _ in restored.search("shared term", k=10)) == ["d2", "d3", "d5"]
+
+
+def test_delete_tombstones_without_rebuild_then_compacts():
+    idx = BM25Index(compact_ratio=0.5)
+    idx.upsert_many(
+        [_make_model_instance(DocumentChunk, id=f"d{i}", content=f"shared term doc{i}") for i in range(6)]
+    )
+    model = idx.bm25
+
+    idx.delete("d0")
+    idx.delete("d1")
+    assert idx.bm25 is model  # no rebuild
+    assert idx.num_tombstones == 2
+    ids = [d.id for d, _ in idx.search("shared term", k=10)]
+    assert sorted(ids) == ["d2", "d3", "d4", "d5"]
+
+    # Crossing the ratio compacts the rows away
+    idx.delete_many(["d2", "d3", "missing"])
+    assert idx.num_tombstones == 0
+    assert idx.doc_ids == ["d4", "d5"]
+    assert sorted(d.id for d, _ in idx.search("shared", k=10)) == ["d4", "d5"]
+
+    # A deleted id can be re-added
+    idx.upsert(_make_model_instance(DocumentChunk, id="d0", content="shared again"))
+    assert "d0" in [d.id for d, _ in idx.search("again", k=1)]
+
+
+def test_rebuild_reuses_stored_token_ids(monkeypatch):
+    idx = BM25Index()
+    idx.upsert(_make_model_instance(DocumentChunk, id="a", content="stemming happens once per document"))
+
+    encoded = []
+    original = idx.analyzer.encode
+    monkeypatch.setattr(idx.analyzer, "encode", lambda text: encoded.append(text) or original(text))
+
+    idx.upsert(_make_model_instance(DocumentChunk, id="b", content="another document"))
+    idx.upsert(idx.docs["a"].model_copy(update={"title": "metadata only"}))
+    assert encoded == ["another document"]
+
+    # Indexes share one analyzer (stemmer, stopwords, vocabulary)
+    assert BM25Index().analyzer is idx.analyzer
+
+
+def test_parallel_build_matches_serial(monkeypatch):
+    from app import build
+
+    words = ["kernel", "gradient", "matrix", "tensor", "graph", "queue", "heap", "proof", "lemma"]
+    docs = [
+        _make_model_instance(DocumentChunk, id=f"p{i}", content=" ".join(words[j % len(words)] for j in range(i, i + 3 + i % 7)))
+        for i in range(40)
+    ]
+
+    serial = BM25Index()
+    serial.upsert_many(docs)
+
+    monkeypatch.setattr(build.settings, "INDEX_BUILD_WORKERS", 2)
+    monkeypatch.setattr(build.settings, "INDEX_PARALLEL_MIN_DOCS", 10)
+    parallel = BM25Index()
+    parallel.upsert_many(docs)
+
+    for key in ("data", "indices", "indptr"):
+        assert (serial.bm25.scores[key] == parallel.bm25.scores[key]).all()
+    assert parallel.search("gradient matrix", k=5) == serial.search("gradient matrix", k=5)
+
+
+def test_searches_during_rebuilds_see_a_consistent_index():
+    def chunk(i):
+        # Every chunk mentions "common"; only every fifth one "rare"
+        words = "common rare" if i % 5 == 0 else "common filler"
+        return DocumentChunk(id=f"d{i}", course_id="c1", content=f"{words} topic{i}")
+
+    idx = BM25Index()
+    idx.upsert_many([chunk(i) for i in range(3000)])
+    errors, wrong = [], []
+    stop = threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                for doc, _ in idx.search("rare", k=20):
+                    if "rare" not in doc.content:
+                        wrong.append(doc.id)
+            except Exception as e:  # noqa: BLE001 - any failure is the bug
+                errors.append(e)
+
+    searchers = [threading.Thread(target=search) for _ in range(2)]
+    for t in searchers:
+        t.start()
+    try:
+        # Deletes leave tombstones; each upsert rebuilds and compacts them
+        for n in range(3000, 3060, 6):
+            idx.delete_many([f"d{i}" for i in range(n - 3000, n - 2400)])
+            idx.upsert_many([chunk(i) for i in range(n, n + 600)])
+    finally:
+        stop.set()
+        for t in searchers:
+            t.join()
+
+    assert errors == [] and wrong == []
+
+
+def test_suggest_completes_terms_and_titles_by_doc_freq(tmp_path):
+    idx = BM25Index()
+    idx.upsert_many([
+        _make_model_instance(DocumentChunk, id="a", content="sorting algorithms sort lists", title="Sorting"),
+        _make_model_instance(DocumentChunk, id="b", content="sorted arrays and sorting networks"),
+        _make_model_instance(DocumentChunk, id="c", content="social networks", headings=["Sorting", "Graphs"]),
+    ])
+
+    # Terms are shown by their shortest word and ranked by document frequency
+    assert idx.suggest("so", limit=3) == [("sort", "term", 2), ("Sorting", "title", 2), ("social", "term", 1)]
+    assert idx.suggest("merge so", limit=1) == [("merge sort", "term", 2)]
+    assert idx.suggest("gra") == [("Graphs", "title", 1)]
+
+    # Deletes and edits update the frequencies
+    idx.delete("a")
+    idx.upsert(idx.docs["c"].model_copy(update={"headings": None}))
+    assert idx.suggest("so") == [("social", "term", 1), ("sort", "term", 1)]
+
+    idx.save_snapshot(str(tmp_path / "course"))
+    restored = BM25Index.load_snapshot(str(tmp_path / "course"))
+    assert restored.suggest("so") == idx.suggest("so")
+
+
+def test_suggester_is_updated_in_place_by_writes():
+    idx = BM25Index()
+    idx.upsert_many([
+        _make_model_instance(DocumentChunk, id="a", content="sorting algorithms", title="Sorting"),
+        _make_model_instance(DocumentChunk, id="b", content="social networks"),
+    ])
+    suggester = idx.suggester()
+    assert idx.suggest("so") == [("social", "term", 1), ("sort", "term", 1), ("Sorting", "title", 1)]
+
+    idx.upsert(_make_model_instance(DocumentChunk, id="c", content="sorted soup", title="Soup"))
+    idx.delete("b")
+    idx.upsert(idx.docs["a"].model_copy(update={"title": "Algorithms"}))
+
+    assert idx.suggester() is suggester
+    assert idx.suggest("so") == [("sort", "term", 2), ("soup", "term", 1), ("Soup", "title", 1)]
+    assert idx.suggest("al") == [("algorithms", "term", 1), ("Algorithms", "title", 1)]
+    idx._suggester = None
+    assert idx.suggest("so") == [("sort", "term", 2), ("soup", "term", 1), ("Soup", "title", 1)]
+
+
+def test_fuzzy_search_corrects_misspelled_terms():
+    idx = BM25Index()
+    idx.upsert_many([
+        _make_model_instance(DocumentChunk, id="r", content="recursion and recursive functions"),
+        _make_model_instance(DocumentChunk, id="b", content="backpropagation through time"),
+        _make_model_instance(DocumentChunk, id="g", content="dijkstra shortest paths"),
+    ])
+
+    assert all(score == 0 for _, score in idx.search("recurssion", k=3))
+    assert idx.correct_query("Recurssion and Djikstra?") == "recursion and dijkstra?"
+    assert idx.correct_query("backpropogation") == "backpropagation"
+    assert idx.correct_query("recursion") is None
+    assert [d.id for d, _ in idx.search("backpropogation", k=1, fuzzy=True)] == ["b"]
+
+    # The deletion index follows later writes; deleted terms are not offered
+    idx.upsert(_make_model_instance(DocumentChunk, id="h", content="heapsort"))
+    assert idx.correct_query("heapsrot") == "heapsort"
+    idx.delete("h")
+    assert idx.correct_query("heapsrot") is None
+
+
+def test_phrase_queries_and_proximity_boost(tmp_path, monkeypatch):
+    # Both are off by default
+    monkeypatch.setattr(index_module.settings, "INDEX_POSITIONS", True)
+    monkeypatch.setattr(index_module.settings, "SEARCH_PROXIMITY_WEIGHT", 0.5)
+    idx = BM25Index(positional=True)
+    idx.upsert_many([
+        _make_model_instance(DocumentChunk, id="adjacent", content="stochastic gradient descent converges slowly on noisy losses"),
+        _make_model_instance(DocumentChunk, id="apart", content="gradient of the loss, then a descent step"),
+        _make_model_instance(DocumentChunk, id="other", content="gradient boosting"),
+    ])
+
+    assert [d.id for d, _ in idx.search('"gradient descent"', k=5)] == ["adjacent"]
+    # Stopwords are not indexed, so they do not break a phrase
+    assert [d.id for d, _ in idx.search('"loss then descent"', k=5)] == ["apart"]
+    assert idx.search('"descent gradient"', k=5) == []
+
+    # BM25 alone prefers the shorter document; adjacency outweighs that
+    bag_of_words = BM25Index(positional=False)
+    bag_of_words.upsert_many(list(idx.docs.values()))
+    assert [d.id for d, _ in bag_of_words.search("gradient descent", k=2)] == ["apart", "adjacent"]
+    assert [d.id for d, _ in idx.search("gradient descent", k=2)] == ["adjacent", "apart"]
+
+    idx.delete("adjacent")
+    assert idx.search('"gradient descent"', k=5) == []
+
+    idx.save_snapshot(str(tmp_path / "course"))
+    restored = BM25Index.load_snapshot(str(tmp_path / "course"))
+    assert [d.id for d, _ in restored.search('"descent step"', k=5)] == ["apart"]
+
+
+def test_long_queries_are_pruned_to_the_highest_weighted_terms():
+    idx = BM25Index()
+    common = "the model uses data and code to learn"
+    idx.upsert_many(
+        [_make_model_instance(DocumentChunk, id=f"c{i}", content=common) for i in range(8)]
+        + [_make_model_instance(DocumentChunk, id="bp", content=f"{common} backpropagation gradients")]
+    )
+
+    message = f"{common} {common} Why do backpropagation gradients vanish? foo_bar() baz_qux()"
+    # Once each, only indexed terms, in query order
+    assert idx.query_terms(message, max_terms=0) == [
+        "model", "use", "data", "code", "learn", "backpropag", "gradient",
+    ]
+    # Under a cap, the rare terms survive
+    assert idx.query_terms(message, max_terms=2) == ["backpropag", "gradient"]
+    assert idx.query_terms("data data model", max_terms=1) == ["data"]
+    assert [d.id for d, _ in idx.search(message, k=1)] == ["bp"]
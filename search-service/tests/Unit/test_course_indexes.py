@@ -0,0 +1,89 @@
+import time
+
+from app.course_indexes import CourseIndexManager
+from app.index import BM25Index, snapshot_path
+from app.models import DocumentChunk
+
+
+def _fill(manager, course_id, n=20):
+    index = manager.get(course_id)
+    index.upsert_many(
+        [DocumentChunk(id=f"{course_id}-{i}", course_id=course_id, content=f"lecture notes on topic{i} " * 20) for i in range(n)]
+    )
+    manager.note_write(course_id)
+    return index
+
+
+def test_lru_course_is_evicted_to_disk_and_reloaded(tmp_path):
+    manager = CourseIndexManager(snapshot_dir=str(tmp_path))
+    _fill(manager, "c1")
+    manager.memory_budget_bytes = manager.resident_bytes() + 1
+
+    _fill(manager, "c2")  # pushes c1 (least recently used) out
+    assert "c1" not in manager and "c2" in manager
+    assert manager.stats()["courses"]["c1"]["evictions"] == 1
+    assert manager.stats()["courses"]["c1"]["resident_bytes"] == 0
+
+    # The next access loads c1 back from its snapshot and evicts c2 instead
+    results = manager.get("c1").search("topic3", k=1)
+    assert results[0][0].id == "c1-3"
+    assert "c2" not in manager
+    assert manager.stats()["loads"] == 1
+
+
+def test_pinned_course_is_never_evicted():
+    manager = CourseIndexManager(pinned=["hot"])
+    _fill(manager, "hot")
+    manager.memory_budget_bytes = 1
+
+    _fill(manager, "cold")
+    _fill(manager, "other")
+    assert "hot" in manager
+    assert "cold" not in manager
+    # Evicted to a private spill directory and restored on demand
+    assert len(manager.get("cold").docs) == 20
+    manager.clear()
+
+
+def test_shared_memory_counts_against_the_budget(tmp_path):
+    shared = [0]
+    manager = CourseIndexManager(snapshot_dir=str(tmp_path), shared_bytes=lambda: shared[0])
+    _fill(manager, "c1")
+    _fill(manager, "c2")
+    manager.memory_budget_bytes = manager.resident_bytes() + 1
+    manager.evict_if_needed()
+    assert "c1" in manager and manager.has_room()
+
+    # e.g. the cross-course index grew: the courses get what is left, once
+    # a write has re-measured it
+    shared[0] = manager.stats()["courses"]["c1"]["resident_bytes"]
+    assert manager.has_room() and manager.stats()["shared_bytes"] == 0
+    manager.refresh_shared_bytes()
+    assert not manager.has_room()
+    manager.evict_if_needed()
+    assert "c1" not in manager and "c2" in manager
+    assert manager.stats()["shared_bytes"] == shared[0]
+
+
+def test_writes_are_snapshotted_in_the_background_once_per_delay(tmp_path, monkeypatch):
+    manager = CourseIndexManager(snapshot_dir=str(tmp_path), persist_delay=0.2)
+    saved = []
+    original = BM25Index.save_snapshot
+    monkeypatch.setattr(BM25Index, "save_snapshot", lambda self, path: saved.append(path) or original(self, path))
+
+    for n in (5, 10, 15):
+        _fill(manager, "c1", n)
+        manager.schedule_persist("c1")
+    assert saved == []  # not on the write path
+
+    deadline = time.monotonic() + 5
+    while not saved and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert saved == [snapshot_path(str(tmp_path), "c1")]
+    assert len(BM25Index.load_snapshot(saved[0]).docs) == 15
+
+    # flush() writes what is pending right away, and only once
+    _fill(manager, "c1", 16)
+    manager.schedule_persist("c1")
+    assert manager.flush() == 1 and manager.flush() == 0
+    assert len(saved) == 2 and manager.stats()["pending_snapshots"] == 0
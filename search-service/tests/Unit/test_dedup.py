@@ -0,0 +1,68 @@
+import random
+
+from app.dedup import NearDuplicateIndex, optimal_bands, shingle_hashes
+from app.index import BM25Index
+from app.models import DocumentChunk
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+
+def _text(rng, n=120):
+    return " ".join(rng.choices(WORDS, k=n))
+
+
+def _edit(text, positions):
+    words = text.split()
+    for p in positions:
+        words[p] = "edited"
+    return " ".join(words)
+
+
+def test_minhash_estimates_shingle_jaccard():
+    rng = random.Random(0)
+    index = NearDuplicateIndex(threshold=0.8)
+    assert (index.bands, index.rows) == (optimal_bands(128, 0.8), 128 // optimal_bands(128, 0.8))
+
+    base = _text(rng)
+    near = _edit(base, [60])
+    a, b = set(shingle_hashes(base).tolist()), set(shingle_hashes(near).tolist())
+    estimate = index.similarity(index.signature(base), index.signature(near))
+    assert abs(estimate - len(a & b) / len(a | b)) < 0.1
+    assert index.similarity(index.signature(base), index.signature(_text(rng))) < 0.1
+    assert index.signature("") is None
+
+
+def test_lsh_finds_near_duplicates_only():
+    rng = random.Random(1)
+    index = NearDuplicateIndex(threshold=0.8)
+    texts = {f"d{i}": _text(rng) for i in range(300)}
+    for doc_id, text in texts.items():
+        index.add(doc_id, index.signature(text))
+
+    assert index.find(index.signature(_edit(texts["d42"], [10])))[0] == "d42"
+    assert index.find(index.signature(_edit(texts["d42"], range(0, 120, 4)))) is None
+    assert index.find(index.signature(_text(rng))) is None
+    assert index.find(index.signature(texts["d7"]), exclude="d7") is None
+
+    index.remove("d42")
+    assert index.find(index.signature(texts["d42"])) is None
+
+
+def test_find_duplicates_against_index_and_batch():
+    rng = random.Random(2)
+    lecture, other = _text(rng), _text(rng)
+    idx = BM25Index()
+    idx.upsert_many([DocumentChunk(id="v1", course_id="c", content=lecture)])
+
+    found = idx.find_duplicates([
+        DocumentChunk(id="v1", course_id="c", content=lecture),  # itself, re-uploaded
+        DocumentChunk(id="v2", course_id="c", content=_edit(lecture, [5])),
+        DocumentChunk(id="n1", course_id="c", content=other),
+        DocumentChunk(id="n2", course_id="c", content=_edit(other, [90])),
+    ])
+    assert found == {"v2": "v1", "n2": "n1"}
+
+    # Flagged duplicates are never canonical; deleted chunks drop out
+    idx.upsert_many([DocumentChunk(id="v2", course_id="c", content=lecture, metadata={"duplicate_of": "v1"})])
+    idx.delete_many(["v1"])
+    assert idx.find_duplicates([DocumentChunk(id="v3", course_id="c", content=lecture)]) == {}
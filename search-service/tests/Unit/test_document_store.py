@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.index import BM25Index
+from app.models import DocumentChunk, UserProfile
+from app.store import DocumentStore, InMemoryDocumentStore, SqliteDocumentStore
+
+
+def _doc(doc_id, course_id="c1", content="stored chunk"):
+    return DocumentChunk(id=doc_id, course_id=course_id, content=content)
+
+
+def test_sqlite_store_survives_reopen(tmp_path):
+    path = str(tmp_path / "search.db")
+    store = SqliteDocumentStore(path)
+    store.put_many([_doc("a"), _doc("b"), _doc("x", course_id="c2")])
+    store.delete_many("c1", ["b"])
+    store.put_profile(UserProfile(uid="u1", courses=["c1"]))
+    store.close()
+
+    reopened = SqliteDocumentStore(path)
+    assert [d.id for d in reopened.iter_documents("c1")] == ["a"]
+    assert sorted(reopened.course_ids()) == ["c1", "c2"]
+    assert reopened.count("c2") == 1
+    assert reopened.get_profile("u1").courses == ["c1"]
+    assert reopened.get_profile("nobody") is None
+    reopened.close()
+
+
+def test_sqlite_store_group_commits_concurrent_writers(tmp_path):
+    store = SqliteDocumentStore(str(tmp_path / "search.db"))
+    threads = [
+        threading.Thread(target=store.put_many, args=([_doc(f"t{i}-{j}") for j in range(10)],))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.count("c1") == 80
+
+    loaded = store.bulk_load(_doc(f"bulk{i}", course_id="c3", content=f"bulk topic{i}") for i in range(2500))
+    assert loaded == 2500
+
+    # Indexes rebuild from a streaming cursor
+    index = BM25Index()
+    index.load_documents(store.iter_documents("c3"), batch_size=500)
+    assert len(index.docs) == 2500
+    assert index.search("topic42", k=1)[0][0].id == "bulk42"
+    store.close()
+
+
+def test_in_memory_store_matches_interface():
+    store = InMemoryDocumentStore()
+    store.put_many([_doc("a"), _doc("b")])
+    store.delete_many("c1", ["a"])
+    assert [d.id for d in store.iter_documents()] == ["b"]
+    assert store.course_ids() == ["c1"]
+
+
+def test_sqlite_writer_survives_a_locked_database(tmp_path):
+    path = str(tmp_path / "search.db")
+    store = SqliteDocumentStore(path, busy_timeout=0.1, write_timeout=5)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        store.put_many([_doc("a")])
+
+    other.execute("ROLLBACK")
+    other.close()
+    store.put_many([_doc("b")])
+    assert [d.id for d in store.iter_documents("c1")] == ["b"]
+    store.close()
+
+
+def test_stores_must_implement_the_whole_interface():
+    class DocumentsOnly(DocumentStore):
+        def put_many(self, docs):
+            pass
+
+        def delete_many(self, course_id, doc_ids):
+            pass
+
+    with pytest.raises(TypeError):
+        DocumentsOnly()
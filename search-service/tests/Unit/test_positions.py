@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.positions import PositionalIndex, min_distance
+
+
+def test_postings_round_trip_through_delta_encoding():
+    seqs = [
+        np.array([5, 7, 5, 9], dtype=np.int32),
+        np.array([], dtype=np.int32),
+        np.array([7, 5, 1000], dtype=np.int32),
+    ]
+    index = PositionalIndex.build(seqs)
+
+    assert index.term_ids.tolist() == [5, 7, 9, 1000]
+    assert index.doc_deltas.dtype == np.uint8 and index.pos_deltas.dtype == np.uint8
+    rows = np.array([0, 1, 2])
+    assert {r: p.tolist() for r, p in index.positions(5, rows).items()} == {0: [0, 2], 2: [1]}
+    assert {r: p.tolist() for r, p in index.positions(7, rows).items()} == {0: [1], 2: [0]}
+    assert index.positions(42, rows) == {}
+
+
+def test_phrase_rows_require_consecutive_positions():
+    seqs = [
+        np.array([1, 2, 3], dtype=np.int32),  # 1 2 3
+        np.array([2, 1, 3, 1, 2], dtype=np.int32),  # 1 2 only at the end
+        np.array([1, 3, 2], dtype=np.int32),  # both, never adjacent
+    ]
+    index = PositionalIndex.build(seqs)
+
+    assert index.phrase_rows([1, 2]).tolist() == [0, 1]
+    assert index.phrase_rows([1, 2, 3]).tolist() == [0]
+    assert index.phrase_rows([3]).tolist() == [0, 1, 2]
+    assert index.phrase_rows([1, None]).tolist() == []
+    assert min_distance(np.array([0, 10]), np.array([4, 12])) == 2
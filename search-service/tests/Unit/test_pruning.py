@@ -0,0 +1,71 @@
+import random
+
+import bm25s
+import numpy as np
+
+from app.index import BM25Index
+from app.models import DocumentChunk
+from app.pruning import BlockMaxIndex
+
+
+def _exhaustive_top_k(model, ids, k, mask=None):
+    scores = model.get_scores(ids).astype(np.float32)
+    if mask is not None:
+        scores = scores * mask
+    order = np.lexsort((np.arange(len(scores)), -scores))
+    order = order[scores[order] > 0][:k]
+    return order, scores[order]
+
+
+def test_block_max_top_k_matches_exhaustive_scoring():
+    rng = random.Random(0)
+    vocab = [f"w{i}" for i in range(300)]
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    corpus = [rng.choices(vocab, weights, k=rng.randint(1, 40)) for _ in range(600)]
+    model = bm25s.BM25()
+    model.index(corpus, show_progress=False)
+    mask = np.ones(len(corpus), dtype=np.float32)
+    mask[rng.sample(range(len(corpus)), 60)] = 0
+
+    for block_size in (4, 128):
+        index = BlockMaxIndex(model.scores, block_size)
+        for trial in range(40):
+            words = set(rng.choices(vocab, weights, k=rng.randint(1, 12)))
+            ids = [model.vocab_dict[w] for w in words if w in model.vocab_dict]
+            for k in (1, 10):
+                trial_mask = mask if trial % 2 else None
+                rows, scores = index.top_k(ids, k, trial_mask)
+                expected_rows, expected_scores = _exhaustive_top_k(model, ids, k, trial_mask)
+                assert rows.tolist() == expected_rows.tolist()
+                assert np.array_equal(scores, expected_scores)
+
+
+def test_blockmax_engine_returns_bm25s_results():
+    rng = random.Random(1)
+    words = "gradient descent learning rate neural network stack frame recursion base case the of a".split()
+    docs = [
+        DocumentChunk(id=f"d{i}", course_id="c", content=" ".join(rng.choices(words, k=rng.randint(3, 30))))
+        for i in range(200)
+    ]
+    exhaustive = BM25Index(positional=False, engine="bm25s")
+    pruned = BM25Index(positional=False, engine="blockmax")
+    for index in (exhaustive, pruned):
+        index.upsert_many(docs)
+        index.delete_many(["d3", "d17"])
+
+    for query in ["gradient descent learning", "recursion base case stack", "neural", "unknown words"]:
+        # bm25s orders tied scores arbitrarily, so compare scores per document
+        all_scores = {doc.id: score for doc, score in exhaustive.search(query, k=200)}
+        expected = [round(score, 5) for _, score in exhaustive.search(query, k=5)]
+        found = pruned.search(query, k=5)
+        # Both fill up the k with zero-score rows, not necessarily the same ones
+        assert [round(score, 5) for _, score in found] == expected
+        assert all(abs(all_scores[doc.id] - score) < 1e-6 for doc, score in found)
+
+    # A rare term: one match, then zero-score rows, as with bm25s
+    for index in (exhaustive, pruned):
+        index.upsert(DocumentChunk(id="rare", course_id="c", content="xylophone recital"))
+    found = pruned.search("xylophone", k=3)
+    assert [doc.id for doc, _ in found][:1] == ["rare"]
+    assert [score > 0 for _, score in found] == [score > 0 for _, score in exhaustive.search("xylophone", k=3)]
+    assert [score > 0 for _, score in found] == [True, False, False]
@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+
+from app import index as index_module
+from app.index import BM25Index
+from app.models import DocumentChunk
+from app.quantize import QuantizedScores, decode_varints, encode_varints
+
+
+def _corpus(num_docs=400, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}x" for i in range(500)]
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    docs = [
+        DocumentChunk(id=f"d{i}", course_id="c", content=" ".join(rng.choices(vocab, weights, k=rng.randint(5, 60))))
+        for i in range(num_docs)
+    ]
+    queries = [" ".join(rng.sample(vocab[:200], rng.randint(2, 6))) for _ in range(50)]
+    return docs, queries
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2**21, 2**28 + 5, 2**34])
+    encoded = encode_varints(values)
+    assert len(encoded) == 1 + 1 + 1 + 2 + 2 + 3 + 4 + 5 + 5
+    assert decode_varints(encoded).tolist() == values.tolist()
+
+
+def test_quantized_matrix_keeps_rows_and_bounds_score_error():
+    docs, _ = _corpus()
+    idx = BM25Index(positional=False, score_bits=0)
+    idx.upsert_many(docs)
+    original = idx.bm25.scores
+    postings = len(original["data"])
+
+    for bits, max_bytes in ((8, 3.0), (16, 4.0)):
+        quantized = QuantizedScores.from_scores(original, bits)
+        restored = quantized.to_scores()
+        assert np.array_equal(restored["indices"], original["indices"])
+        terms = np.repeat(np.arange(len(original["indptr"]) - 1), np.diff(original["indptr"]))
+        # Within half a quantization step of the term's maximum
+        assert np.all(np.abs(restored["data"] - original["data"]) <= quantized.scales[terms] * 0.5 + 1e-6)
+        assert quantized.nbytes() / postings < max_bytes
+        assert sum(original[key].nbytes for key in ("data", "indices", "indptr")) / postings >= 8
+
+
+def test_quantized_ranking_stays_close_to_float32(tmp_path, monkeypatch):
+    docs, queries = _corpus()
+    exact = BM25Index(positional=False, score_bits=0)
+    exact.upsert_many(docs)
+
+    indexes = {}
+    for bits, min_overlap in ((8, 0.9), (16, 0.99)):
+        quantized = indexes[bits] = BM25Index(positional=False, score_bits=bits)
+        quantized.upsert_many(docs)
+        assert quantized.memory_bytes() < exact.memory_bytes()
+
+        overlaps = []
+        for query in queries:
+            expected = {doc.id for doc, _ in exact.search(query, k=10)}
+            found = {doc.id for doc, _ in quantized.search(query, k=10)}
+            overlaps.append(len(expected & found) / 10)
+        assert np.mean(overlaps) >= min_overlap
+
+    # Snapshots keep the bm25s layout and are quantized again on restore
+    monkeypatch.setattr(index_module.settings, "INDEX_SCORE_BITS", 8)
+    monkeypatch.setattr(index_module.settings, "INDEX_POSITIONS", False)
+    path = str(tmp_path / "course")
+    indexes[8].save_snapshot(path)
+    restored = BM25Index.load_snapshot(path)
+    assert np.array_equal(restored.quantized.impacts, indexes[8].quantized.impacts)
+    assert np.allclose(restored.quantized.scales, indexes[8].quantized.scales, rtol=1e-6)
+    for query in queries[:10]:
+        expected = [score for _, score in indexes[8].search(query, k=5)]
+        assert np.allclose([score for _, score in restored.search(query, k=5)], expected, rtol=1e-5)
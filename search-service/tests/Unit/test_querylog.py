@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+
+from app.index import BM25Index
+from app.models import DocumentChunk
+from app.querylog import LOG_FILE, PopularQueryWarmer, QueryLog
+
+
+def test_records_flush_to_rotating_files_and_counts(tmp_path):
+    log = QueryLog(str(tmp_path), capacity=1000, max_bytes=400, backups=2)
+
+    threads = [
+        threading.Thread(target=lambda: [log.record("cs101", "Gradient  Descent", 3) for _ in range(50)])
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log.record("cs101", "recursion", 1)
+    log.record("cs102", "b-trees", 0)
+
+    assert log.flush() == 202
+    assert log.flush() == 0
+    assert log.top_queries("cs101") == ["gradient descent", "recursion"]
+    assert log.top_queries("unknown") == []
+    assert log.top_courses(1) == [("cs101", 201)]
+
+    # Rotated once the file passed max_bytes; at most `backups` old files kept
+    assert sorted(os.listdir(tmp_path)) == [f"{LOG_FILE}.1"]
+    log.record("cs101", "recursion", 1)
+    log.flush()
+    assert sorted(os.listdir(tmp_path)) == [LOG_FILE, f"{LOG_FILE}.1"]
+    for _ in range(3):
+        log.record("cs101", "x" * 500, 0)
+        log.flush()
+    assert sorted(os.listdir(tmp_path)) == [f"{LOG_FILE}.1", f"{LOG_FILE}.2"]
+    with open(tmp_path / f"{LOG_FILE}.1", encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert set(entry) == {"ts", "course_id", "query", "hits"}
+
+    stats = log.stats()
+    assert (stats["recorded"], stats["flushed"], stats["buffered"], stats["dropped"]) == (206, 206, 0, 0)
+
+
+def test_full_ring_drops_oldest_and_counts_are_rebuilt_from_files(tmp_path):
+    log = QueryLog(str(tmp_path), capacity=3)
+    for query in ["a1", "a2", "a3", "a4", "a5"]:
+        log.record("cs101", query, 1)
+    assert log.stats()["dropped"] == 2
+    log.flush()
+    assert sorted(log.top_queries("cs101")) == ["a3", "a4", "a5"]
+
+    restarted = QueryLog(str(tmp_path))
+    assert restarted.load() == 3
+    assert sorted(restarted.top_queries("cs101")) == ["a3", "a4", "a5"]
+
+    disabled = QueryLog(None)
+    disabled.record("cs101", "ignored", 0)
+    assert disabled.flush() == 0 and disabled.stats()["recorded"] == 0
+
+
+def test_warmer_runs_top_queries_once_per_index_generation(tmp_path):
+    log = QueryLog(str(tmp_path))
+    for query in ["stack frames", "stack frames", "recursion"]:
+        log.record("cs101", query, 1)
+    log.flush()
+
+    index = BM25Index()
+    index.upsert(DocumentChunk(id="d1", course_id="cs101", content="recursion uses stack frames"))
+    searched = []
+    original = index.search
+    index.search = lambda query, k=10: searched.append(query) or original(query, k)
+    warmer = PopularQueryWarmer(log, {"cs101": index}.get, top_n=5)
+
+    assert warmer.warm("cs101") == 2
+    assert searched == ["stack frames", "recursion"]
+    assert warmer.warm("cs101") == 0  # same generation
+
+    index.upsert(DocumentChunk(id="d2", course_id="cs101", content="base case"))
+    assert warmer.warm("cs101") == 2
+    assert warmer.warm("cs102") == 0
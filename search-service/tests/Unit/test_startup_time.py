@@ -0,0 +1,20 @@
+import os
+
+from scripts.importtime import loaded_modules, measure
+
+# Cold `import app.main` budget; override on slow machines with IMPORT_TIME_BUDGET_MS
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1000))
+
+# Loaded on first use, never at import time
+LAZY_MODULES = ["firebase_admin", "google", "bm25s", "Stemmer", "scipy", "psutil"]
+
+
+def test_heavy_dependencies_are_not_imported_at_startup():
+    loaded = loaded_modules("app.main")
+    assert [m for m in LAZY_MODULES if m in loaded] == []
+
+
+def test_cold_import_stays_within_budget():
+    # Best of three runs, to keep scheduler noise out of the comparison
+    import_ms = min(measure("app.main")["app.main"][1] for _ in range(3)) / 1000
+    assert import_ms <= IMPORT_TIME_BUDGET_MS, f"import app.main took {import_ms:.0f} ms"
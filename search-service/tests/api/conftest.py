@@ -15,6 +15,8 @@ def client():
 
     # Clear in-memory indices between tests
     main_module.course_indices.clear()
+    main_module.store.clear()
+    main_module.search_admission.reset()
 
     with TestClient(app) as c:
         yield c
@@ -158,3 +158,348 @@ def test_patch_then_delete_document(client):
     )
     assert r_search.status_code == 200
     assert r_search.json()["results"] == []
+
+
+def test_rag_search_expand_returns_deduplicated_neighbors(client):
+    course_id = "cs101"
+
+    contents = ["intro material", "backpropagation target", "chain rule", "backpropagation again", "summary"]
+    docs = [
+        _make_model_instance(
+            DocumentChunk, id=f"c{i}", source="lecture.pdf", chunk_index=i, content=text
+        )
+        for i, text in enumerate(contents)
+    ]
+    batch = _make_model_instance(BatchCreateRequest, documents=docs)
+    client.post(
+        f"/v1/courses/{course_id}/documents:batchCreate",
+        json=batch.model_dump(by_alias=True),
+    )
+
+    r = client.post(
+        f"/v1/courses/{course_id}/documents:ragSearch",
+        json={"query": "backpropagation", "page_size": 2, "mode": "lexical", "expand": 1},
+    )
+    assert r.status_code == 200
+    body = r.json()
+    assert {h["id"] for h in body["results"]} == {"c1", "c3"}
+    # c2 neighbours both hits but is returned once; hits are never repeated
+    neighbor_ids = [n["id"] for n in body["neighbors"]]
+    assert sorted(neighbor_ids) == ["c0", "c2", "c4"]
+    assert all(n["neighbor_of"] in ("c1", "c3") for n in body["neighbors"])
+
+
+def test_search_honors_deadline_header(client):
+    course_id = "cs101"
+    req = {"query": "attention", "page_size": 5, "mode": "lexical"}
+
+    r_ok = client.post(
+        f"/v1/courses/{course_id}/documents:ragSearch", json=req, headers={"X-Request-Deadline-Ms": "5000"}
+    )
+    assert r_ok.status_code == 200
+    assert r_ok.json()["partial"] is False
+
+    r_expired = client.post(
+        f"/v1/courses/{course_id}/documents:search", json=req, headers={"X-Request-Deadline-Ms": "0"}
+    )
+    assert r_expired.status_code == 504
+
+    r_bad = client.post(
+        f"/v1/courses/{course_id}/documents:search", json=req, headers={"X-Request-Deadline-Ms": "soon"}
+    )
+    assert r_bad.status_code == 400
+
+
+def test_deadline_spent_during_the_search_marks_results_partial(client, monkeypatch):
+    import time
+
+    from app.index import BM25Index
+
+    docs = [
+        {"id": f"c{i}", "course_id": "cs101", "source": "notes.pdf", "chunk_index": i, "content": f"attention part {i}"}
+        for i in range(3)
+    ]
+    client.post("/v1/courses/cs101/documents:batchCreate", json={"documents": docs})
+
+    search = BM25Index.search
+
+    def slow_search(self, *args, **kwargs):
+        time.sleep(0.2)
+        return search(self, *args, **kwargs)
+
+    monkeypatch.setattr(BM25Index, "search", slow_search)
+    req = {"query": "attention", "page_size": 2, "mode": "lexical", "expand": 1}
+    headers = {"X-Request-Deadline-Ms": "100"}
+
+    r = client.post("/v1/courses/cs101/documents:search", json=req, headers=headers)
+    assert r.status_code == 200
+    assert r.json()["partial"] is True and len(r.json()["results"]) == 2
+
+    # Hits are still returned, but no neighbours are expanded for them
+    r = client.post("/v1/courses/cs101/documents:ragSearch", json=req, headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["partial"] is True and len(body["results"]) == 2 and body["neighbors"] == []
+
+    r = client.post("/v1/courses/cs101/documents:search", json=req, headers={"X-Request-Deadline-Ms": "5000"})
+    assert r.json()["partial"] is False
+
+
+def test_batch_create_async_job_reports_progress(client):
+    import time
+
+    course_id = "cs101"
+    docs = [
+        _make_model_instance(DocumentChunk, id=f"j{i}", content=f"async ingestion chunk {i}")
+        for i in range(5)
+    ]
+    batch = _make_model_instance(BatchCreateRequest, documents=docs)
+    r = client.post(
+        f"/v1/courses/{course_id}/documents:batchCreateAsync",
+        json=batch.model_dump(by_alias=True),
+    )
+    assert r.status_code == 202
+    job = r.json()
+    assert job["total"] == 5
+
+    for _ in range(100):
+        job = client.get(f"/v1/jobs/{job['id']}").json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.05)
+
+    assert job["status"] == "succeeded"
+    assert job["processed"] == 5
+    assert job["errors"] == []
+
+    r_search = client.post(
+        f"/v1/courses/{course_id}/documents:search",
+        json={"query": "ingestion", "page_size": 10, "mode": "lexical"},
+    )
+    assert len(r_search.json()["results"]) == 5
+
+    assert client.get("/v1/jobs/does-not-exist").status_code == 404
+
+
+def test_batch_delete_by_source_and_ids(client):
+    course_id = "cs101"
+    docs = [
+        _make_model_instance(DocumentChunk, id=f"old{i}", source="lecture-2019.pdf", chunk_index=i, content="recursion base case")
+        for i in range(3)
+    ] + [
+        _make_model_instance(DocumentChunk, id="new0", source="lecture-2024.pdf", chunk_index=0, content="recursion base case"),
+        _make_model_instance(DocumentChunk, id="new1", source="lecture-2024.pdf", chunk_index=1, content="recursion stack"),
+    ]
+    batch = _make_model_instance(BatchCreateRequest, documents=docs)
+    client.post(f"/v1/courses/{course_id}/documents:batchCreate", json=batch.model_dump(by_alias=True))
+
+    r = client.post(
+        f"/v1/courses/{course_id}/documents:batchDelete",
+        json={"source": "lecture-2019.pdf", "ids": ["new1", "unknown"]},
+    )
+    assert r.status_code == 200
+    assert sorted(r.json()["deleted_ids"]) == ["new1", "old0", "old1", "old2"]
+
+    r_search = client.post(
+        f"/v1/courses/{course_id}/documents:search",
+        json={"query": "recursion", "page_size": 10, "mode": "lexical"},
+    )
+    assert [h["id"] for h in r_search.json()["results"]] == ["new0"]
+
+    assert client.post(f"/v1/courses/{course_id}/documents:batchDelete", json={}).status_code == 400
+
+
+def test_warmup_restores_snapshots_before_ready(client, tmp_path, monkeypatch):
+    from app import main as main_module
+    from app.index import BM25Index, snapshot_path
+    from app.warmup import WarmupState, warmup_state
+
+    # The app's own warmup (no snapshot dir configured) finishes right away
+    assert warmup_state.wait(timeout=5)
+    assert client.get("/health/ready").status_code == 200
+    assert client.get("/health").json() == {"status": "healthy"}
+
+    snapshot = BM25Index()
+    snapshot.upsert(_make_model_instance(DocumentChunk, id="w1", course_id="cs303", content="warm restored chunk"))
+    snapshot.save_snapshot(snapshot_path(str(tmp_path), "cs303"))
+    monkeypatch.setattr(main_module.settings, "SEARCH_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(main_module.course_indices, "snapshot_dir", str(tmp_path))
+
+    state = WarmupState()
+    state.start(main_module.run_warmup)
+    assert state.wait(timeout=5)
+    assert state.courses_restored == 1
+    assert "cs303" in main_module.course_indices
+
+    r = client.post(
+        "/v1/courses/cs303/documents:search",
+        json={"query": "restored", "page_size": 5, "mode": "lexical"},
+    )
+    assert [h["id"] for h in r.json()["results"]] == ["w1"]
+
+
+def test_search_request_caps_are_enforced(client):
+    course_id = "cs101"
+    r_big = client.post(
+        f"/v1/courses/{course_id}/documents:search",
+        json={"query": "attention", "page_size": 100000, "mode": "lexical"},
+    )
+    assert r_big.status_code == 422
+
+    r_long = client.post(
+        f"/v1/courses/{course_id}/documents:search",
+        json={"query": "a" * 20000, "page_size": 5, "mode": "lexical"},
+    )
+    assert r_long.status_code == 422
+
+    # Whole chat turns are fine
+    r_turn = client.post(
+        f"/v1/courses/{course_id}/documents:search",
+        json={"query": "why does attention scale " * 200, "page_size": 5, "mode": "lexical"},
+    )
+    assert r_turn.status_code == 200
+
+    assert "admission" in client.get("/health/json").json()
+
+
+def test_profiled_request_is_listed_and_downloadable(client, monkeypatch):
+    from app import profiling
+
+    monkeypatch.setattr(profiling.settings, "PROFILING_ADMIN_TOKEN", "s3cret")
+    admin = {"X-Profile-Token": "s3cret"}
+
+    r = client.post(
+        "/v1/courses/cs101/documents:search",
+        json={"query": "attention", "page_size": 5, "mode": "lexical"},
+        headers=admin,
+    )
+    assert r.status_code == 200
+    profile_id = r.headers["X-Profile-Id"]
+
+    # Unprofiled requests and non-admins get nothing
+    r_plain = client.post("/v1/courses/cs101/documents:search", json={"query": "attention", "mode": "lexical"})
+    assert "X-Profile-Id" not in r_plain.headers
+    assert client.get("/debug/profiles").status_code == 403
+
+    listed = client.get("/debug/profiles", headers=admin).json()
+    assert listed[0]["id"] == profile_id
+    assert listed[0]["path"] == "/v1/courses/cs101/documents:search"
+
+    profile = client.get(f"/debug/profiles/{profile_id}", headers=admin).json()
+    assert profile["reason"] == "admin"
+    assert "top_functions" in profile
+    collapsed = client.get(f"/debug/profiles/{profile_id}?format=collapsed", headers=admin)
+    assert collapsed.headers["content-type"].startswith("text/plain")
+
+
+def test_suggest_returns_prefix_completions(client):
+    course_id = "cs101"
+    docs = [
+        _make_model_instance(DocumentChunk, id="s1", content="attention is all you need", title="Attention"),
+        _make_model_instance(DocumentChunk, id="s2", content="attending lectures"),
+    ]
+    batch = _make_model_instance(BatchCreateRequest, documents=docs)
+    r = client.post(f"/v1/courses/{course_id}/documents:batchCreate", json=batch.model_dump(by_alias=True))
+    assert r.status_code == 200
+
+    r = client.post(f"/v1/courses/{course_id}/documents:suggest", json={"prefix": "Att", "limit": 5})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["prefix"] == "Att"
+    assert [(s["text"], s["kind"]) for s in body["suggestions"]] == [
+        ("attending", "term"), ("attention", "term"), ("Attention", "title"),
+    ]
+
+    r = client.post(f"/v1/courses/{course_id}/documents:suggest", json={"prefix": "a", "limit": 500})
+    assert r.status_code == 422
+
+
+def test_fuzzy_search_returns_corrected_query(client):
+    course_id = "cs101"
+    doc = _make_model_instance(DocumentChunk, id="f1", content="recursion and the call stack")
+    batch = _make_model_instance(BatchCreateRequest, documents=[doc])
+    client.post(f"/v1/courses/{course_id}/documents:batchCreate", json=batch.model_dump(by_alias=True))
+
+    r = client.post(f"/v1/courses/{course_id}/documents:search", json={"query": "recurssion", "fuzzy": True})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["corrected_query"] == "recursion"
+    assert [hit["id"] for hit in body["results"]] == ["f1"]
+
+    r = client.post(f"/v1/courses/{course_id}/documents:search", json={"query": "recurssion"})
+    assert r.json()["corrected_query"] is None
+    assert all(hit["score"] == 0 for hit in r.json()["results"])
+
+
+def test_batch_create_flags_or_collapses_near_duplicates(client, monkeypatch):
+    from app import main as main_module
+
+    lecture = " ".join(f"slide{i} covers gradient descent step {i}" for i in range(12))
+    revised = lecture.replace("step 7", "step seven")
+    docs = [
+        {"id": "v2019", "course_id": "cs101", "content": lecture},
+        {"id": "v2024", "course_id": "cs101", "content": revised},
+        {"id": "other", "course_id": "cs101", "content": "recursion needs a base case"},
+    ]
+
+    monkeypatch.setattr(main_module.settings, "INGEST_DEDUP", "flag")
+    r = client.post("/v1/courses/cs101/documents:batchCreate", json={"documents": docs})
+    assert [d["metadata"].get("duplicate_of") for d in r.json()["documents"]] == [None, "v2019", None]
+    assert main_module.course_indices.get("cs101").docs["v2024"].metadata == {"duplicate_of": "v2019"}
+
+    monkeypatch.setattr(main_module.settings, "INGEST_DEDUP", "collapse")
+    r = client.post("/v1/courses/cs102/documents:batchCreate", json={"documents": docs})
+    assert r.json()["documents"][1]["metadata"] == {"duplicate_of": "v2019"}
+    r_search = client.post(
+        "/v1/courses/cs102/documents:search",
+        json={"query": "gradient descent", "page_size": 10, "mode": "lexical"},
+    )
+    assert sorted(h["id"] for h in r_search.json()["results"]) == ["other", "v2019"]
+
+
+def test_searches_are_logged_per_course(client, tmp_path, monkeypatch):
+    from app import main as main_module
+    from app.querylog import QueryLog
+
+    monkeypatch.setattr(main_module, "query_log", QueryLog(str(tmp_path)))
+    for query in ["Stack frames", "stack  frames", "recursion"]:
+        client.post("/v1/courses/cs101/documents:search", json={"query": query, "page_size": 5, "mode": "lexical"})
+    client.post("/v1/courses/cs101/documents:ragSearch", json={"query": "recursion", "page_size": 5, "mode": "lexical"})
+
+    assert main_module.query_log.flush() == 4
+    assert main_module.query_log.top_queries("cs101") == ["stack frames", "recursion"]
+
+
+def test_search_responses_negotiate_msgpack_and_compression(client, monkeypatch):
+    import msgpack
+
+    from app import main as main_module
+
+    docs = [{"id": f"c{i}", "course_id": "cs101", "content": f"gradient descent lecture part {i} " * 40} for i in range(5)]
+    client.post("/v1/courses/cs101/documents:batchCreate", json={"documents": docs})
+    body = {"query": "gradient descent", "page_size": 5, "mode": "lexical"}
+    url = "/v1/courses/cs101/documents:ragSearch"
+
+    # Small bodies stay uncompressed; the JSON shape is unchanged
+    monkeypatch.setattr(main_module.settings, "RESPONSE_COMPRESS_MIN_BYTES", 1 << 20)
+    r = client.post(url, json=body, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-type"] == "application/json"
+    assert "content-encoding" not in r.headers
+    expected = r.json()
+    assert set(expected) == {"query", "mode", "results", "neighbors", "partial", "corrected_query"}
+    assert len(expected["results"]) == 5 and expected["results"][0]["neighbor_of"] is None
+
+    r = client.post(url, json=body, headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"})
+    assert r.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(r.content) == expected
+
+    monkeypatch.setattr(main_module.settings, "RESPONSE_COMPRESS_MIN_BYTES", 1024)
+    r = client.post(url, json=body, headers={"Accept": "application/msgpack", "Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    # The client decompressed it; the wire size is in content-length
+    assert int(r.headers["content-length"]) < len(r.content) / 2
+    assert msgpack.unpackb(r.content) == expected
+
+    r = client.post(url, json=body, headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in r.headers and r.json() == expected
@@ -34,6 +34,8 @@ export const ChatPanel: React.FC<ChatPanelProps> = ({
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // rag-service keeps the conversation; later turns send only the new message
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   async function handleSend(e?: React.FormEvent) {
     if (e) e.preventDefault();
@@ -55,7 +57,8 @@ export const ChatPanel: React.FC<ChatPanelProps> = ({
     setError(null);
 
     try {
-      // Build the message history for the RAG service:
+      // Build the full message history for the RAG service (sent on the
+      // first turn, or again if the server-side session has expired):
       const ragMessages: RagMessage[] = [
         {
           role: "system",
@@ -77,8 +80,11 @@ export const ChatPanel: React.FC<ChatPanelProps> = ({
       const resp = await sendRagChat({
         courseId,
         studentId: firebaseUser.uid,
-        messages: ragMessages,
+        messages: sessionId ? [{ role: "user", content: text }] : ragMessages,
+        sessionId,
+        history: ragMessages,
       });
+      setSessionId(resp.session_id ?? null);
 
       setMessages((prev) => [
         ...prev,
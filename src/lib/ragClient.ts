@@ -20,31 +20,50 @@ export interface RagChunk {
 export interface RagChatResponse {
   answer: string;
   chunks: RagChunk[];
+  // Server-side chat session; pass it as sessionId on the next turn
+  session_id?: string;
 }
 
+/**
+ * Send one chat turn.
+ *
+ * With `sessionId`, `messages` holds only this turn's new messages; the
+ * rest of the conversation is kept by rag-service. If that session has
+ * expired there, the turn is retried with `history` (the whole
+ * conversation) and a new session is started.
+ */
 export async function sendRagChat(opts: {
   courseId: string;
   studentId: string;
   messages: ChatMessage[];
+  sessionId?: string | null;
+  history?: ChatMessage[];
 }): Promise<RagChatResponse> {
   const baseUrl = process.env.NEXT_PUBLIC_RAG_SERVICE_URL;
   if (!baseUrl) {
     throw new Error("NEXT_PUBLIC_RAG_SERVICE_URL is not set");
   }
 
-  const res = await fetch(`${baseUrl}/v1/courses/${opts.courseId}/rag:chat`, {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-      // TODO: later: add Authorization: Bearer <id-token> if we secure rag-service
-    },
-    body: JSON.stringify({
-      student_id: opts.studentId,
-      course_id: opts.courseId,
-      messages: opts.messages,
-      top_k: 6,
-    }),
-  });
+  const post = (messages: ChatMessage[], sessionId?: string | null) =>
+    fetch(`${baseUrl}/v1/courses/${opts.courseId}/rag:chat`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        // TODO: later: add Authorization: Bearer <id-token> if we secure rag-service
+      },
+      body: JSON.stringify({
+        student_id: opts.studentId,
+        course_id: opts.courseId,
+        messages,
+        top_k: 6,
+        ...(sessionId ? { session_id: sessionId } : {}),
+      }),
+    });
+
+  let res = await post(opts.messages, opts.sessionId);
+  if (res.status === 404 && opts.sessionId && opts.history) {
+    res = await post(opts.history);
+  }
 
   if (!res.ok) {
     const text = await res.text();